@@ -1,25 +1,58 @@
 """Twitchのコメントを監視してXに投稿するメインモジュール。"""
 
 # 標準ライブラリの読み込みに関するコメント
+import argparse
 import asyncio
+import base64
+import gzip
+import hashlib
+import hmac
 import json
 import logging
 import math
+import mimetypes
+import multiprocessing
 import os
+import queue
+import random
 import re
+import shutil
+import sqlite3
 import ssl
 import tempfile
+import threading
 import time
-from collections import deque
-from dataclasses import dataclass
-from datetime import datetime, timedelta
+import urllib.parse
+import unicodedata
+import uuid
+import zlib
+from array import array
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field, replace
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import Deque, Dict, List, Optional, Set, Tuple
+from typing import (
+    Awaitable,
+    Callable,
+    Deque,
+    Dict,
+    FrozenSet,
+    IO,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Set,
+    Tuple,
+    TypeVar,
+)
+from xml.etree import ElementTree
 
 # 外部ライブラリの読み込みに関するコメント
 from dotenv import load_dotenv
 import httpx
-import tweepy
 
 # Xの最大文字数を定数として定義するコメント
 MAX_TWEET_LENGTH = 280
@@ -33,13 +66,44 @@ X_REPLY_SETTINGS = {"everyone", "mentionedUsers", "following"}
 # Twitch IRCの既定サーバー設定に関するコメント
 DEFAULT_TWITCH_SERVER = "irc.chat.twitch.tv"
 DEFAULT_TWITCH_PORT_TLS = 6697
+DEFAULT_TWITCH_PORT_PLAIN = 6667
 
-# Twitch IRCの固定接続設定に関するコメント
+# Twitch IRCの既定接続設定に関するコメント
 TWITCH_SERVER = DEFAULT_TWITCH_SERVER
 TWITCH_USE_TLS = True
 TWITCH_PORT = DEFAULT_TWITCH_PORT_TLS
 TWITCH_RECONNECT_DELAY_SECONDS = 5.0
 
+# 再接続の指数バックオフの上限秒数に関するコメント
+TWITCH_RECONNECT_MAX_DELAY_SECONDS = 120.0
+
+# 重複排除のために保持するIRCメッセージIDの件数に関するコメント
+IRC_SEEN_MESSAGE_IDS = 4096
+
+# 全接続の受信行の重複排除のために保持するメッセージIDの件数に関するコメント
+IRC_RECEIVED_MESSAGE_IDS = 65536
+
+# チャット速度を集計する区間の秒数に関するコメント
+CHAT_RATE_BUCKET_SECONDS = 60
+
+# チャット速度を保持する区間数の上限に関するコメント
+CHAT_RATE_MAX_BUCKETS = 24 * 60
+
+# サマリーに載せるチャットの多かった区間数に関するコメント
+CHAT_RATE_PEAK_COUNT = 3
+
+# チャットアーカイブのセグメントを切り替える既定秒数に関するコメント
+CHAT_ARCHIVE_SEGMENT_SECONDS = 3600.0
+
+# チャットアーカイブを書き込みスレッドへ渡す間隔と行数に関するコメント
+CHAT_ARCHIVE_FLUSH_SECONDS = 1.0
+CHAT_ARCHIVE_BATCH_LINES = 2000
+
+# チャットアーカイブのファイル名に関するコメント
+CHAT_ARCHIVE_SEGMENT_PREFIX = "chat-"
+CHAT_ARCHIVE_SEGMENT_SUFFIX = ".log.gz"
+CHAT_ARCHIVE_INDEX_SUFFIX = ".idx"
+
 # Twitchのトークン更新エンドポイントに関するコメント
 TWITCH_TOKEN_ENDPOINT = "https://id.twitch.tv/oauth2/token"
 
@@ -49,15 +113,180 @@ TWITCH_USERS_ENDPOINT = "https://api.twitch.tv/helix/users"
 # Twitchの配信情報取得エンドポイントに関するコメント
 TWITCH_STREAMS_ENDPOINT = "https://api.twitch.tv/helix/streams"
 
-# YouTubeの検索エンドポイントに関するコメント
-YOUTUBE_SEARCH_ENDPOINT = "https://www.googleapis.com/youtube/v3/search"
+# Twitch EventSubのWebSocket接続先に関するコメント
+TWITCH_EVENTSUB_WS_URL = "wss://eventsub.wss.twitch.tv/ws"
+
+# Twitch EventSubの購読登録エンドポイントに関するコメント
+TWITCH_EVENTSUB_SUBSCRIPTIONS_ENDPOINT = "https://api.twitch.tv/helix/eventsub/subscriptions"
+
+# YouTubeの再生リスト項目取得エンドポイントに関するコメント
+YOUTUBE_PLAYLIST_ITEMS_ENDPOINT = "https://www.googleapis.com/youtube/v3/playlistItems"
+
+# YouTubeチャンネルの公開RSSフィードに関するコメント
+YOUTUBE_CHANNEL_FEED_URL = "https://www.youtube.com/feeds/videos.xml"
+
+# RSSフィードのXML名前空間に関するコメント
+ATOM_NAMESPACE = "http://www.w3.org/2005/Atom"
+YOUTUBE_FEED_NAMESPACE = "http://www.youtube.com/xml/schemas/2015"
 
 # YouTubeの配信詳細取得エンドポイントに関するコメント
 YOUTUBE_VIDEOS_ENDPOINT = "https://www.googleapis.com/youtube/v3/videos"
 
+# YouTube APIの一覧取得1回あたりの消費ユニットに関するコメント
+YOUTUBE_LIST_QUOTA_COST = 1
+
+# チャンネルごとに確認する動画ID候補の件数に関するコメント
+YOUTUBE_DISCOVERY_MAX_RESULTS = 10
+
+# videos.listで1回に指定できる動画IDの上限に関するコメント
+YOUTUBE_VIDEOS_BATCH_SIZE = 50
+
+# YouTube動画ID候補の取得方式を定義するコメント
+YOUTUBE_DISCOVERY_SOURCES = {"rss", "playlist"}
+
+# YouTubeクォータ記録のファイル名を定義するコメント
+YOUTUBE_QUOTA_LEDGER_FILENAME = "youtube_quota_ledger.json"
+
+# 月次配信統計の投稿要否を確認する間隔に関するコメント
+MONTHLY_STATS_CHECK_INTERVAL_SECONDS = 600.0
+
+# 監視ソースごとの1回あたりの締め切り秒数に関するコメント
+TWITCH_POLL_TIMEOUT_SECONDS = 15.0
+YOUTUBE_POLL_TIMEOUT_SECONDS = 30.0
+MONTHLY_STATS_POLL_TIMEOUT_SECONDS = 30.0
+
+# YouTube一括取得の各段階の締め切り秒数に関するコメント
+YOUTUBE_STAGE_TIMEOUT_SECONDS = 8.0
+
+# 周期ぴったりの再取得がタイマーの揺らぎで再利用にならないよう差し引く秒数に関するコメント
+YOUTUBE_SNAPSHOT_REUSE_MARGIN_SECONDS = 1.0
+
+# EventSubの再接続待機秒数に関するコメント
+EVENTSUB_RECONNECT_DELAY_SECONDS = 5.0
+
+# EventSubのキープアライブ既定値と猶予秒数に関するコメント
+EVENTSUB_DEFAULT_KEEPALIVE_SECONDS = 10.0
+EVENTSUB_KEEPALIVE_GRACE_SECONDS = 5.0
+
+# EventSubの重複通知判定に使うメッセージID件数に関するコメント
+EVENTSUB_SEEN_MESSAGE_IDS = 256
+
+# EventSub接続中のオフライン時に状態を突き合わせる間隔に関するコメント
+EVENTSUB_OFFLINE_RESYNC_INTERVAL_SECONDS = 1800.0
+
+# 配信開始が見込まれる時間帯の前後幅に関するコメント
+ADAPTIVE_START_LEAD_SECONDS = 15 * 60
+ADAPTIVE_START_TRAIL_SECONDS = 30 * 60
+
+# オフライン時に間隔を広げる速さに関するコメント
+ADAPTIVE_BACKOFF_RAMP_SECONDS = 30 * 60
+
+# 開始時刻の傾向に使う配信履歴の期間と最小件数に関するコメント
+ADAPTIVE_HISTORY_DAYS = 60
+ADAPTIVE_HISTORY_MIN_STARTS = 2
+
 # YouTube配信予定のキャッシュファイル名を定義するコメント
 YOUTUBE_UPCOMING_CACHE_FILENAME = "youtube_upcoming_cache.json"
 
+# Twitchトークンのキャッシュファイル名を定義するコメント
+TWITCH_TOKEN_CACHE_FILENAME = "twitch_token_cache.json"
+
+# X投稿キューのデータベースファイル名を定義するコメント
+X_QUEUE_DB_FILENAME = "x_post_queue.sqlite3"
+
+# 投稿待ちの画像を保存するディレクトリ名を定義するコメント
+X_QUEUE_MEDIA_DIRNAME = "x_post_media"
+
+# X投稿ジョブの状態を定義するコメント
+X_JOB_STATUS_PENDING = "pending"
+X_JOB_STATUS_IN_PROGRESS = "in_progress"
+X_JOB_STATUS_DONE = "done"
+X_JOB_STATUS_FAILED = "failed"
+
+# 完了済みジョブを削除する間隔と保持期間を定義するコメント
+X_QUEUE_COMPACT_INTERVAL_SECONDS = 3600.0
+X_QUEUE_RETENTION_SECONDS = 24 * 3600.0
+
+# X投稿のレーンと優先度を定義するコメント（値が小さいほど先に投稿する）
+X_LANE_SUMMARY = "summary"
+X_LANE_ANNOUNCEMENT = "announcement"
+X_LANE_CHAT = "chat"
+X_LANE_PRIORITIES = {
+    X_LANE_SUMMARY: 0,
+    X_LANE_ANNOUNCEMENT: 1,
+    X_LANE_CHAT: 2,
+}
+
+# 背圧を解除するチャットレーンの残数の割合を定義するコメント
+X_BACKPRESSURE_RELEASE_RATIO = 0.5
+
+# X APIの既定の接続先を定義するコメント
+X_API_BASE_URL = "https://api.x.com"
+X_UPLOAD_BASE_URL = "https://upload.twitter.com"
+
+# メディアの分割アップロードの単位と処理待ちの上限を定義するコメント
+X_MEDIA_CHUNK_BYTES = 1024 * 1024
+X_MEDIA_PROCESSING_TIMEOUT_SECONDS = 120.0
+
+# メディアIDの既定の有効期間と期限前に使わなくなる余裕を定義するコメント
+X_MEDIA_ID_TTL_SECONDS = 24 * 3600.0
+X_MEDIA_ID_EXPIRY_MARGIN_SECONDS = 600.0
+
+# 同時に行うメディアアップロードの上限を定義するコメント
+X_MEDIA_UPLOAD_CONCURRENCY = 2
+
+# X投稿の日次上限の記録ファイル名を定義するコメント
+X_POST_QUOTA_FILENAME = "x_post_quota.json"
+
+# X APIの投稿上限の集計期間を定義するコメント
+X_RATE_LIMIT_WINDOW_SECONDS = 15 * 60.0
+X_DAILY_POST_WINDOW_SECONDS = 24 * 3600.0
+
+# チャットを後回しにしている間に残数を確認し直す間隔を定義するコメント
+X_DEFERRED_RECHECK_SECONDS = 60.0
+
+# 待機中のワーカーが他のプロセスから戻されたジョブを確認する間隔を定義するコメント
+X_QUEUE_IDLE_RECHECK_SECONDS = 300.0
+
+# 投稿ワーカーで例外が起きた後に待つ秒数を定義するコメント
+X_WORKER_ERROR_BACKOFF_SECONDS = 5.0
+
+# X投稿の失敗の分類を定義するコメント
+X_ERROR_RETRYABLE = "retryable"
+X_ERROR_DUPLICATE = "duplicate"
+X_ERROR_AUTH = "auth"
+X_ERROR_RATE_LIMIT = "rate_limit"
+X_ERROR_INVALID = "invalid"
+
+# X投稿の再試行回数と待機秒数の既定値を定義するコメント
+X_POST_MAX_ATTEMPTS = 5
+X_RETRY_DELAY_SECONDS = 30.0
+X_RETRY_MAX_DELAY_SECONDS = 1800.0
+
+# 再試行を諦めた投稿を保存するファイル名を定義するコメント
+X_DEAD_LETTER_FILENAME = "x_dead_letters.jsonl"
+
+# 同じ内容の投稿を見分ける記録のファイル名を定義するコメント
+X_POST_DEDUP_FILENAME = "x_post_dedup.json"
+
+# 同じ内容の投稿を見分ける期間と記録件数の既定値を定義するコメント
+X_DEDUP_TTL_SECONDS = 24 * 3600.0
+X_DEDUP_MAX_ENTRIES = 1000
+
+# 同じ内容の投稿の記録をまとめて保存するまでの待ち秒数を定義するコメント
+X_DEDUP_SAVE_DELAY_SECONDS = 5.0
+
+# 同じ内容の投稿の扱い方を定義するコメント（dropは捨て、countは投稿待ちの本文に回数を付ける）
+X_DEDUP_POLICY_DROP = "drop"
+X_DEDUP_POLICY_COUNT = "count"
+X_DEDUP_POLICIES = {X_DEDUP_POLICY_DROP, X_DEDUP_POLICY_COUNT}
+
+# 運用指標を書き出す既定の間隔を定義するコメント
+METRICS_WRITE_INTERVAL_SECONDS = 15.0
+
+# 同接グラフの描画を待つ既定の上限秒数を定義するコメント
+GRAPH_RENDER_TIMEOUT_SECONDS = 60.0
+
 # 配信履歴のキャッシュファイル名を定義するコメント
 STREAM_HISTORY_CACHE_FILENAME = "twitch_stream_history.json"
 
@@ -76,20 +305,58 @@ TARGET_TWITCH_USER = "hikakin"
 # 大文字小文字の差を吸収するために小文字化するコメント
 TARGET_TWITCH_USER_LOWER = TARGET_TWITCH_USER.lower()
 
+# デコード前に対象ユーザーの発言を見分けるニックネームの集合に関するコメント
+TARGET_TWITCH_NICKS_BYTES = frozenset({TARGET_TWITCH_USER_LOWER.encode("ascii")})
+
+# TwitchのJOIN回数制限に関するコメント
+TWITCH_JOIN_RATE_LIMIT = 20
+TWITCH_JOIN_WINDOW_SECONDS = 10.0
+
+# IRCの1行あたりの最大バイト数に関するコメント
+IRC_MAX_LINE_BYTES = 510
+
 # 投稿時の見出しを固定するコメント
 POST_HEADER = "【新着コメント😎】"
 
+# 返信スレッドの続きの投稿に付ける見出しを定義するコメント
+POST_THREAD_CONTINUATION_HEADER = "（続き）"
+
+# チャットのまとめ投稿の待ち時間と最大件数を定義するコメント
+CHAT_COALESCE_WINDOW_SECONDS = 5.0
+CHAT_COALESCE_MAX_WINDOW_SECONDS = 30.0
+CHAT_COALESCE_MAX_COMMENTS = 20
+
 
 # トークン更新時の安全マージンに関するコメント
 TOKEN_REFRESH_MARGIN_SECONDS = 60.0
 
+# 安全マージンより前に先行更新を始める秒数に関するコメント
+TOKEN_PROACTIVE_REFRESH_SECONDS = 5 * TOKEN_REFRESH_MARGIN_SECONDS
+
+# 先行更新に失敗した場合の再試行間隔に関するコメント
+TOKEN_REFRESH_RETRY_SECONDS = 30.0
+
+# 共有HTTPクライアントのタイムアウト秒数を定義するコメント
+HTTP_TIMEOUT_SECONDS = 10.0
+
+# 共有HTTPクライアントの接続プール上限を定義するコメント
+HTTP_MAX_CONNECTIONS = 20
+HTTP_MAX_KEEPALIVE_CONNECTIONS = 10
+
+# ポーリング間隔より長くキープアライブを保持するコメント
+HTTP_KEEPALIVE_EXPIRY_SECONDS = 180.0
+
 # ロガーの設定に関するコメント
 LOGGER = logging.getLogger("twitch_to_x")
 
-# TwitchのPRIVMSGを解析する正規表現に関するコメント
-PRIVMSG_PATTERN = re.compile(
-    r"^:(?P<user>[^!]+)![^ ]+ PRIVMSG #(?P<channel>[^ ]+) :(?P<message>.*)$"
-)
+# 汎用の戻り値型に関するコメント
+T = TypeVar("T")
+
+# IRCv3タグ値のエスケープ表記を元に戻す対応表に関するコメント
+IRC_TAG_ESCAPES = {":": ";", "s": " ", "\\": "\\", "r": "\r", "n": "\n"}
+
+# タグやコマンド通知を受け取るために要求するIRCv3機能に関するコメント
+TWITCH_IRC_CAPABILITIES = "twitch.tv/tags twitch.tv/commands"
 
 
 # 設定値をまとめるデータクラスに関するコメント
@@ -103,23 +370,51 @@ class Settings:
     twitch_client_id: str
     twitch_client_secret: str
     twitch_refresh_token: str
+    twitch_chat_channels: Tuple[str, ...]
+    twitch_target_users: Tuple[str, ...]
+    twitch_irc_connections: int
+    twitch_server: str
+    twitch_port: int
+    twitch_use_tls: bool
 
     # X関連の設定値に関するコメント
     x_api_key: str
     x_api_secret: str
     x_access_token: str
     x_access_secret: str
-    x_bearer_token: Optional[str]
+    x_api_base_url: str
+    x_upload_base_url: str
     x_reply_setting: str
     x_reply_mention_users: Tuple[str, ...]
 
     # 投稿制御に関する設定値のコメント
     x_post_interval_seconds: float
     x_queue_size: int
+    x_queue_db_path: str
+    x_post_burst: int
+    x_daily_post_limit: int
+    x_daily_reserved_posts: int
+    x_post_max_attempts: int
+    x_dead_letter_path: str
+    x_dedup_enabled: bool
+    x_dedup_ttl_seconds: float
+    x_dedup_max_entries: int
+    x_dedup_merge_policy: str
+
+    # チャットのまとめ投稿に関する設定値のコメント
+    chat_coalesce_enabled: bool
+    chat_coalesce_window_seconds: float
+    chat_coalesce_max_window_seconds: float
 
     # Twitch配信監視に関する設定値のコメント
     twitch_stream_poll_interval_seconds: float
     twitch_stream_sample_max_points: int
+    twitch_adaptive_polling: bool
+    twitch_offline_max_poll_interval_seconds: float
+    twitch_hot_poll_interval_seconds: float
+    twitch_eventsub_enabled: bool
+    twitch_eventsub_ws_url: str
+    twitch_eventsub_subscriptions_endpoint: str
 
     # YouTube配信監視に関する設定値のコメント
     youtube_api_key: Optional[str]
@@ -127,6 +422,22 @@ class Settings:
     youtube_poll_interval_seconds: float
     youtube_sample_max_points: int
     youtube_upcoming_poll_interval_seconds: float
+    youtube_discovery_source: str
+    youtube_daily_quota: int
+
+    # HTTP通信に関する設定値のコメント
+    http2_enabled: bool
+
+    # 同接グラフの描画に関する設定値のコメント
+    graph_render_timeout_seconds: float
+
+    # チャットアーカイブに関する設定値のコメント
+    chat_archive_dir: Optional[str]
+    chat_archive_segment_seconds: float
+
+    # 運用指標の出力に関する設定値のコメント
+    metrics_path: Optional[str]
+    metrics_write_interval_seconds: float
 
 
 # X投稿ジョブを表すデータクラスに関するコメント
@@ -140,6 +451,31 @@ class XPostJob:
     media_path: Optional[str] = None
     # 投稿後に削除するファイルパスを保持するコメント
     cleanup_path: Optional[str] = None
+    # 永続キュー上のジョブIDを保持するコメント
+    job_id: Optional[int] = None
+    # 投稿を試みた回数を保持するコメント
+    attempts: int = 0
+    # 投稿の優先度を決めるレーンを保持するコメント
+    lane: str = X_LANE_CHAT
+    # 返信スレッドとして続けて投稿する本文を保持するコメント
+    reply_texts: Tuple[str, ...] = ()
+    # 先にアップロード済みで有効期限内のメディアIDを保持するコメント
+    media_id: Optional[str] = None
+    # 返信スレッドの途中まで投稿済みなら最後に投稿したIDを保持するコメント
+    thread_parent_id: Optional[str] = None
+
+
+# まとめ投稿前のチャットコメントを表すデータクラスに関するコメント
+@dataclass(frozen=True)
+class ChatComment:
+    """投稿前のチャットコメントと出典を保持する。"""
+
+    # 整形済みの本文を保持するコメント
+    content: str
+    # 既定以外の発言者名を保持するコメント
+    author: Optional[str] = None
+    # 既定以外のチャンネル名を保持するコメント
+    channel: Optional[str] = None
 
 
 # 同接サンプルを保持するデータクラスに関するコメント
@@ -153,6 +489,73 @@ class ViewerSample:
     viewer_count: int
 
 
+# 1分ごとのチャット数を数えるクラスに関するコメント
+class ChatRateCounter:
+    """固定長のリングバッファで1分ごとのチャット数を保持する。"""
+
+    # 属性を固定して1行ごとの処理を軽くするコメント
+    __slots__ = ("_counts", "_size", "_first_bucket", "_current_bucket")
+
+    # 初期化処理に関するコメント
+    def __init__(self, size: int = CHAT_RATE_MAX_BUCKETS) -> None:
+        # 区間ごとの件数と記録済みの範囲を保持するコメント
+        self._counts = [0] * size
+        self._size = size
+        self._first_bucket = -1
+        self._current_bucket = -1
+
+    # 1件を記録するコメント
+    def record(self, now: float) -> None:
+        """指定時刻の区間の件数を1増やす。"""
+
+        # 区間が変わった時だけ範囲を更新するコメント
+        bucket = int(now // CHAT_RATE_BUCKET_SECONDS)
+        if bucket != self._current_bucket and not self._advance(bucket):
+            return
+        self._counts[bucket % self._size] += 1
+
+    # 記録範囲を進める処理に関するコメント
+    def _advance(self, bucket: int) -> bool:
+        """新しい区間までの件数を0に戻し、記録できる区間ならTrueを返す。"""
+
+        # 初回は記録範囲を開始するコメント
+        if self._current_bucket < 0:
+            self._first_bucket = bucket
+            self._current_bucket = bucket
+            return True
+
+        # 保持範囲より古い区間は記録しないコメント
+        if bucket < self._current_bucket:
+            return bucket > self._current_bucket - self._size and bucket >= self._first_bucket
+
+        # 飛ばした区間の件数を0に戻すコメント
+        for skipped in range(self._current_bucket + 1, min(bucket, self._current_bucket + self._size) + 1):
+            self._counts[skipped % self._size] = 0
+        self._current_bucket = bucket
+        self._first_bucket = max(self._first_bucket, bucket - self._size + 1)
+        return True
+
+    # 時系列を返すコメント
+    def series(self) -> List[Tuple[float, int]]:
+        """区間の開始時刻と件数の一覧を古い順に返す。"""
+
+        # 記録がなければ空を返すコメント
+        if self._current_bucket < 0:
+            return []
+        return [
+            (float(bucket * CHAT_RATE_BUCKET_SECONDS), self._counts[bucket % self._size])
+            for bucket in range(self._first_bucket, self._current_bucket + 1)
+        ]
+
+    # 件数の多い区間を返すコメント
+    def peaks(self, count: int) -> List[Tuple[float, int]]:
+        """件数の多い区間を多い順に返す。"""
+
+        # 件数が0の区間は除くコメント
+        ranked = sorted(self.series(), key=lambda item: item[1], reverse=True)
+        return [item for item in ranked[:count] if item[1] > 0]
+
+
 # 配信セッション情報を保持するデータクラスに関するコメント
 @dataclass
 class StreamSession:
@@ -170,6 +573,8 @@ class StreamSession:
     youtube_channel_ids: Tuple[str, ...]
     # YouTubeチャンネルごとの状態を保持するコメント
     youtube_channels: Dict[str, "YouTubeChannelSession"]
+    # 1分ごとのチャット数を保持するコメント
+    chat_rate: ChatRateCounter = field(default_factory=ChatRateCounter)
 
 
 # Twitch配信情報を保持するデータクラスに関するコメント
@@ -221,6 +626,19 @@ class YouTubeUpcomingInfo:
     url: str
 
 
+# YouTubeの一括取得結果を保持するデータクラスに関するコメント
+@dataclass(frozen=True)
+class YouTubeSnapshot:
+    """全チャンネル分の配信中と配信予定の取得結果を保持する。"""
+
+    # 取得時刻のUNIX秒を保持するコメント
+    fetched_at: float
+    # チャンネルごとの配信中情報を保持するコメント
+    stream_infos: Dict[str, YouTubeStreamInfo]
+    # チャンネルごとの配信予定情報を保持するコメント
+    upcoming_infos: Dict[str, YouTubeUpcomingInfo]
+
+
 # YouTubeチャンネルごとの配信状態を保持するデータクラスに関するコメント
 @dataclass
 class YouTubeChannelSession:
@@ -297,6 +715,40 @@ def parse_float_env(name: str, default: float) -> float:
     return parsed_value
 
 
+# 真偽値の環境変数を安全に読む関数に関するコメント
+def parse_bool_env(name: str, default: bool) -> bool:
+    """真偽値の環境変数を読み込み、未設定ならデフォルトを返す。"""
+
+    # 値を取得して未設定ならデフォルトを返すコメント
+    raw_value = optional_env(name)
+    if raw_value is None:
+        return default
+
+    # 許可する表記だけを受け付けるコメント
+    lowered = raw_value.lower()
+    if lowered in {"1", "true", "yes", "on"}:
+        return True
+    if lowered in {"0", "false", "no", "off"}:
+        return False
+    raise ValueError(f"{name} は true または false で設定してください。")
+
+
+# 選択肢の環境変数を読み込む関数に関するコメント
+def parse_choice_env(name: str, default: str, choices: Set[str]) -> str:
+    """許可された値のいずれかを読み込み、未設定ならデフォルトを返す。"""
+
+    # 任意の環境変数を取得するコメント
+    raw_value = optional_env(name)
+    if not raw_value:
+        return default
+
+    # 設定値の正当性を確認するコメント
+    if raw_value not in choices:
+        raise ValueError(f"{name} は {', '.join(sorted(choices))} のいずれかで設定してください。")
+
+    return raw_value
+
+
 # Xの返信設定を読み込む関数に関するコメント
 def parse_x_reply_setting_env(name: str, default: str) -> str:
     """Xの返信設定を読み込み、未設定ならデフォルトを返す。"""
@@ -364,6 +816,19 @@ def normalize_channel_name(channel: str) -> str:
     return normalized.lower()
 
 
+# Twitchのチャンネル名やユーザー名の一覧を読み込む関数に関するコメント
+def parse_twitch_names_env(name: str, required: Tuple[str, ...] = ()) -> Tuple[str, ...]:
+    """カンマ区切りの名前を正規化し、必須の名前を先頭にして返す。"""
+
+    # 必須の名前を先頭にして重複を除くコメント
+    names: List[str] = []
+    for item in required + parse_csv_env(name):
+        normalized = normalize_channel_name(item)
+        if normalized and normalized not in names:
+            names.append(normalized)
+    return tuple(names)
+
+
 # Twitchトークンを正規化する関数に関するコメント
 def normalize_twitch_token(token: str) -> str:
     """Twitchトークンのoauth接頭辞を整える。"""
@@ -390,18 +855,63 @@ def load_settings() -> Settings:
     # Twitchの任意項目の読み込みに関するコメント
     twitch_nick = optional_env("TWITCH_NICK")
 
+    # コメントを監視するチャンネルと投稿対象ユーザーを読み込むコメント
+    twitch_chat_channels = parse_twitch_names_env("TWITCH_CHAT_CHANNELS", (twitch_channel,))
+    twitch_target_users = parse_twitch_names_env("TWITCH_TARGET_USERS") or (TARGET_TWITCH_USER_LOWER,)
+    twitch_irc_connections = parse_int_env("TWITCH_IRC_CONNECTIONS", 1)
+
+    # 検証用サーバーにも向けられるようIRCの接続先を読み込むコメント
+    twitch_server = optional_env("TWITCH_SERVER") or TWITCH_SERVER
+    twitch_use_tls = parse_bool_env("TWITCH_USE_TLS", TWITCH_USE_TLS)
+    twitch_port = parse_int_env(
+        "TWITCH_PORT",
+        TWITCH_PORT if twitch_use_tls else DEFAULT_TWITCH_PORT_PLAIN,
+    )
+
     # Xの必須項目の読み込みに関するコメント
     x_api_key = require_env("X_API_KEY")
     x_api_secret = require_env("X_API_SECRET")
     x_access_token = require_env("X_ACCESS_TOKEN")
     x_access_secret = require_env("X_ACCESS_SECRET")
-    x_bearer_token = optional_env("X_BEARER_TOKEN")
+    x_api_base_url = optional_env("X_API_BASE_URL") or X_API_BASE_URL
+    x_upload_base_url = optional_env("X_UPLOAD_BASE_URL") or X_UPLOAD_BASE_URL
     x_reply_setting = parse_x_reply_setting_env("X_REPLY_SETTING", "everyone")
     x_reply_mention_users = parse_x_reply_mentions_env("X_REPLY_MENTION_USERS")
 
     # オプション設定の読み込みに関するコメント
     x_post_interval_seconds = parse_float_env("X_POST_INTERVAL_SECONDS", 5.0)
     x_queue_size = parse_int_env("X_QUEUE_SIZE", 200)
+    x_queue_db_path = optional_env("X_QUEUE_DB_PATH") or str(
+        Path(__file__).resolve().parent / X_QUEUE_DB_FILENAME
+    )
+    x_post_burst = parse_int_env("X_POST_BURST", 1)
+    x_daily_post_limit = parse_int_env("X_DAILY_POST_LIMIT", 100)
+    x_daily_reserved_posts = parse_int_env("X_DAILY_RESERVED_POSTS", 5)
+    if x_daily_reserved_posts >= x_daily_post_limit:
+        raise ValueError("X_DAILY_RESERVED_POSTS は X_DAILY_POST_LIMIT より小さく設定してください。")
+    x_post_max_attempts = parse_int_env("X_POST_MAX_ATTEMPTS", X_POST_MAX_ATTEMPTS)
+    x_dead_letter_path = optional_env("X_DEAD_LETTER_PATH") or str(
+        Path(x_queue_db_path).resolve().parent / X_DEAD_LETTER_FILENAME
+    )
+
+    # 同じ内容の投稿をキューの手前で見分ける設定を読み込むコメント
+    x_dedup_enabled = parse_bool_env("X_DEDUP_ENABLED", True)
+    x_dedup_ttl_seconds = parse_float_env("X_DEDUP_TTL_SECONDS", X_DEDUP_TTL_SECONDS)
+    x_dedup_max_entries = parse_int_env("X_DEDUP_MAX_ENTRIES", X_DEDUP_MAX_ENTRIES)
+    x_dedup_merge_policy = optional_env("X_DEDUP_MERGE_POLICY") or X_DEDUP_POLICY_DROP
+    if x_dedup_merge_policy not in X_DEDUP_POLICIES:
+        raise ValueError(f"X_DEDUP_MERGE_POLICY は {', '.join(sorted(X_DEDUP_POLICIES))} のいずれかで設定してください。")
+
+    # チャットのまとめ投稿の設定を読み込むコメント
+    chat_coalesce_enabled = parse_bool_env("CHAT_COALESCE_ENABLED", True)
+    chat_coalesce_window_seconds = parse_float_env(
+        "CHAT_COALESCE_WINDOW_SECONDS",
+        CHAT_COALESCE_WINDOW_SECONDS,
+    )
+    chat_coalesce_max_window_seconds = max(
+        chat_coalesce_window_seconds,
+        parse_float_env("CHAT_COALESCE_MAX_WINDOW_SECONDS", CHAT_COALESCE_MAX_WINDOW_SECONDS),
+    )
 
     # Twitch配信監視の設定を読み込むコメント
     twitch_stream_poll_interval_seconds = parse_float_env(
@@ -412,6 +922,23 @@ def load_settings() -> Settings:
         "TWITCH_STREAM_SAMPLE_MAX_POINTS",
         5000,
     )
+    twitch_adaptive_polling = parse_bool_env("TWITCH_ADAPTIVE_POLLING", False)
+    twitch_offline_max_poll_interval_seconds = parse_float_env(
+        "TWITCH_OFFLINE_MAX_POLL_INTERVAL_SECONDS",
+        600.0,
+    )
+    twitch_hot_poll_interval_seconds = parse_float_env(
+        "TWITCH_HOT_POLL_INTERVAL_SECONDS",
+        20.0,
+    )
+
+    # Twitch EventSubの設定を読み込むコメント
+    twitch_eventsub_enabled = parse_bool_env("TWITCH_EVENTSUB_ENABLED", False)
+    twitch_eventsub_ws_url = optional_env("TWITCH_EVENTSUB_WS_URL") or TWITCH_EVENTSUB_WS_URL
+    twitch_eventsub_subscriptions_endpoint = (
+        optional_env("TWITCH_EVENTSUB_SUBSCRIPTIONS_ENDPOINT")
+        or TWITCH_EVENTSUB_SUBSCRIPTIONS_ENDPOINT
+    )
 
     # YouTube配信監視の設定を読み込むコメント
     youtube_api_key = optional_env("YOUTUBE_API_KEY")
@@ -429,6 +956,36 @@ def load_settings() -> Settings:
         300.0,
     )
 
+    youtube_discovery_source = parse_choice_env(
+        "YOUTUBE_DISCOVERY_SOURCE",
+        "rss",
+        YOUTUBE_DISCOVERY_SOURCES,
+    )
+    youtube_daily_quota = parse_int_env("YOUTUBE_DAILY_QUOTA", 10000)
+
+    # HTTP通信の設定を読み込むコメント
+    http2_enabled = parse_bool_env("HTTP2_ENABLED", False)
+
+    # 同接グラフの描画の設定を読み込むコメント
+    graph_render_timeout_seconds = parse_float_env(
+        "GRAPH_RENDER_TIMEOUT_SECONDS",
+        GRAPH_RENDER_TIMEOUT_SECONDS,
+    )
+
+    # チャットアーカイブの設定を読み込むコメント
+    chat_archive_dir = optional_env("CHAT_ARCHIVE_DIR")
+    chat_archive_segment_seconds = parse_float_env(
+        "CHAT_ARCHIVE_SEGMENT_SECONDS",
+        CHAT_ARCHIVE_SEGMENT_SECONDS,
+    )
+
+    # 運用指標の出力設定を読み込むコメント
+    metrics_path = optional_env("METRICS_PATH")
+    metrics_write_interval_seconds = parse_float_env(
+        "METRICS_WRITE_INTERVAL_SECONDS",
+        METRICS_WRITE_INTERVAL_SECONDS,
+    )
+
     # 設定値をまとめるコメント
     return Settings(
         twitch_channel=twitch_channel,
@@ -436,22 +993,56 @@ def load_settings() -> Settings:
         twitch_client_id=twitch_client_id,
         twitch_client_secret=twitch_client_secret,
         twitch_refresh_token=twitch_refresh_token,
+        twitch_chat_channels=twitch_chat_channels,
+        twitch_target_users=twitch_target_users,
+        twitch_irc_connections=twitch_irc_connections,
+        twitch_server=twitch_server,
+        twitch_port=twitch_port,
+        twitch_use_tls=twitch_use_tls,
         x_api_key=x_api_key,
         x_api_secret=x_api_secret,
         x_access_token=x_access_token,
         x_access_secret=x_access_secret,
-        x_bearer_token=x_bearer_token,
+        x_api_base_url=x_api_base_url,
+        x_upload_base_url=x_upload_base_url,
         x_reply_setting=x_reply_setting,
         x_reply_mention_users=x_reply_mention_users,
         x_post_interval_seconds=x_post_interval_seconds,
         x_queue_size=x_queue_size,
+        x_queue_db_path=x_queue_db_path,
+        x_post_burst=x_post_burst,
+        x_daily_post_limit=x_daily_post_limit,
+        x_daily_reserved_posts=x_daily_reserved_posts,
+        x_post_max_attempts=x_post_max_attempts,
+        x_dead_letter_path=x_dead_letter_path,
+        x_dedup_enabled=x_dedup_enabled,
+        x_dedup_ttl_seconds=x_dedup_ttl_seconds,
+        x_dedup_max_entries=x_dedup_max_entries,
+        x_dedup_merge_policy=x_dedup_merge_policy,
+        chat_coalesce_enabled=chat_coalesce_enabled,
+        chat_coalesce_window_seconds=chat_coalesce_window_seconds,
+        chat_coalesce_max_window_seconds=chat_coalesce_max_window_seconds,
         twitch_stream_poll_interval_seconds=twitch_stream_poll_interval_seconds,
         twitch_stream_sample_max_points=twitch_stream_sample_max_points,
+        twitch_adaptive_polling=twitch_adaptive_polling,
+        twitch_offline_max_poll_interval_seconds=twitch_offline_max_poll_interval_seconds,
+        twitch_hot_poll_interval_seconds=twitch_hot_poll_interval_seconds,
+        twitch_eventsub_enabled=twitch_eventsub_enabled,
+        twitch_eventsub_ws_url=twitch_eventsub_ws_url,
+        twitch_eventsub_subscriptions_endpoint=twitch_eventsub_subscriptions_endpoint,
         youtube_api_key=youtube_api_key,
         youtube_channel_ids=youtube_channel_ids,
         youtube_poll_interval_seconds=youtube_poll_interval_seconds,
         youtube_sample_max_points=youtube_sample_max_points,
         youtube_upcoming_poll_interval_seconds=youtube_upcoming_poll_interval_seconds,
+        youtube_discovery_source=youtube_discovery_source,
+        youtube_daily_quota=youtube_daily_quota,
+        http2_enabled=http2_enabled,
+        graph_render_timeout_seconds=graph_render_timeout_seconds,
+        chat_archive_dir=chat_archive_dir,
+        chat_archive_segment_seconds=chat_archive_segment_seconds,
+        metrics_path=metrics_path,
+        metrics_write_interval_seconds=metrics_write_interval_seconds,
     )
 
 
@@ -486,6 +1077,19 @@ def parse_iso_datetime(value: Optional[str]) -> Optional[float]:
     return parsed.timestamp()
 
 
+# 整数の文字列を変換する関数に関するコメント
+def parse_optional_int(value: Optional[str]) -> Optional[int]:
+    """整数の文字列を変換し、値がないか不正ならNoneを返す。"""
+
+    # 変換できない値はNoneにするコメント
+    if value is None:
+        return None
+    try:
+        return int(value.strip())
+    except ValueError:
+        return None
+
+
 # ローカル時刻の表示用文字列を作る関数に関するコメント
 def format_local_time(timestamp: float) -> str:
     """ローカルタイムゾーンの日時文字列を返す。"""
@@ -590,6 +1194,32 @@ def aggregate_youtube_counts(channels: Dict[str, "YouTubeChannelSession"]) -> Li
     return [buckets[key] for key in sorted(buckets)]
 
 
+# 配信開始が多い時間帯を分単位で求める関数に関するコメント
+def build_start_minute_profile(started_ats: List[float], now: float) -> List[bool]:
+    """過去の開始時刻から1日1440分ごとの開始見込みフラグを作る。"""
+
+    # 直近の開始時刻を分単位で数えるコメント
+    counts = [0] * 1440
+    cutoff = now - ADAPTIVE_HISTORY_DAYS * 24 * 60 * 60
+    for started_at in started_ats:
+        if started_at < cutoff:
+            continue
+        started_local = datetime.fromtimestamp(started_at)
+        counts[started_local.hour * 60 + started_local.minute] += 1
+
+    # 各分の前後幅に入る開始回数が閾値以上なら対象とするコメント
+    lead_minutes = ADAPTIVE_START_LEAD_SECONDS // 60
+    trail_minutes = ADAPTIVE_START_TRAIL_SECONDS // 60
+    profile = []
+    for minute in range(1440):
+        total = sum(
+            counts[(minute + offset) % 1440]
+            for offset in range(-trail_minutes, lead_minutes + 1)
+        )
+        profile.append(total >= ADAPTIVE_HISTORY_MIN_STARTS)
+    return profile
+
+
 # 残り時間を日本語で整形する関数に関するコメント
 def format_time_until(target_timestamp: float, base_timestamp: float) -> str:
     """指定時刻までの残り時間を日本語で返す。"""
@@ -634,33 +1264,199 @@ def setup_matplotlib_japanese_font() -> object:
     return font_prop
 
 
+# JSONを原子的に書き込む関数に関するコメント
+def write_json_atomic(path: Path, payload: object, mode: Optional[int] = None) -> None:
+    """一時ファイルに書いてから置き換え、途中状態のファイルを残さない。"""
+
+    # 同じディレクトリに一時ファイルを作るコメント
+    file_descriptor, temp_name = tempfile.mkstemp(
+        prefix=f".{path.name}.",
+        suffix=".tmp",
+        dir=str(path.parent),
+    )
+    try:
+        # 権限を設定してから内容を書き込むコメント
+        if mode is not None:
+            os.chmod(temp_name, mode)
+        with os.fdopen(file_descriptor, "w", encoding="utf-8") as file_handle:
+            json.dump(payload, file_handle, ensure_ascii=False, indent=2)
+            file_handle.write("\n")
+            file_handle.flush()
+            os.fsync(file_handle.fileno())
+
+        # 既存ファイルを置き換えるコメント
+        os.replace(temp_name, path)
+    except BaseException:
+        # 失敗時は一時ファイルを消すコメント
+        try:
+            os.remove(temp_name)
+        except OSError:
+            pass
+        raise
+
+
+# 共有HTTPクライアントを作成する関数に関するコメント
+def create_http_client(settings: Settings) -> httpx.AsyncClient:
+    """接続を使い回す長寿命のHTTPクライアントを生成する。"""
+
+    # HTTP/2は依存ライブラリがある場合のみ有効にするコメント
+    http2_enabled = settings.http2_enabled
+    if http2_enabled:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            LOGGER.warning("h2が見つからないためHTTP/1.1で通信します。")
+            http2_enabled = False
+
+    # ホストごとの接続プールとキープアライブを設定するコメント
+    limits = httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY_SECONDS,
+    )
+    return httpx.AsyncClient(
+        timeout=HTTP_TIMEOUT_SECONDS,
+        limits=limits,
+        http2=http2_enabled,
+    )
+
+
 # Twitchトークンを管理するクラスに関するコメント
 class TwitchTokenManager:
     """リフレッシュトークンからアクセストークンを取得する。"""
 
     # 初期化処理に関するコメント
-    def __init__(self, client_id: str, client_secret: str, refresh_token: str) -> None:
+    def __init__(
+        self,
+        http_client: httpx.AsyncClient,
+        client_id: str,
+        client_secret: str,
+        refresh_token: str,
+        cache_path: Optional[Path] = None,
+    ) -> None:
         # 認証情報と状態を保持するコメント
+        self._http_client = http_client
         self._client_id = client_id
         self._client_secret = client_secret
         self._refresh_token = refresh_token
+        self._seed_hash = hashlib.sha256(refresh_token.encode("utf-8")).hexdigest()
         self._access_token: Optional[str] = None
         self._expires_at = 0.0
+        self._login: Optional[str] = None
         self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task[None]] = None
+
+        # 前回起動時のトークンを復元するコメント
+        self._cache_path = cache_path
+        self._load_cache()
+
+    # 共有HTTPクライアントを公開するコメント
+    @property
+    def http_client(self) -> httpx.AsyncClient:
+        """トークン管理で使う共有HTTPクライアントを返す。"""
+
+        # 保持しているクライアントを返すコメント
+        return self._http_client
+
+    # 先行更新タスクを開始するコメント
+    def start(self) -> None:
+        """期限前にトークンを更新するバックグラウンドタスクを起動する。"""
+
+        # 二重起動を避けるコメント
+        if self._task is None:
+            self._task = asyncio.create_task(self._refresh_loop())
+
+    # 先行更新タスクを終了するコメント
+    async def close(self) -> None:
+        """バックグラウンドの更新タスクを止める。"""
+
+        # タスクがない場合は何もしないコメント
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
 
     # アクセストークンを取得する処理に関するコメント
     async def get_access_token(self) -> str:
-        """必要に応じてアクセストークンを更新して返す。"""
+        """有効なトークンはロックなしで返し、なければ更新して返す。"""
+
+        # 有効なトークンがあればそのまま返すコメント
+        access_token = self._access_token
+        if access_token and self._is_token_valid():
+            return access_token
+
+        # 期限切れの場合のみ更新を待つコメント
+        return await self._refresh(stale_token=None)
+
+    # 認証エラー時にトークンを更新する処理に関するコメント
+    async def force_refresh(self, stale_token: str) -> str:
+        """拒否されたトークンがまだ使われていれば更新して返す。"""
+
+        # 他の呼び出し元が更新済みならそれを使うコメント
+        return await self._refresh(stale_token=stale_token)
+
+    # トークン付きでAPIを呼び出す処理に関するコメント
+    async def call_with_token(self, request: Callable[[str], Awaitable[T]]) -> T:
+        """401応答の場合だけトークンを更新して一度だけ再試行する。"""
+
+        # 現在のトークンで呼び出すコメント
+        access_token = await self.get_access_token()
+        try:
+            return await request(access_token)
+        except httpx.HTTPStatusError as exc:
+            if exc.response.status_code != 401:
+                raise
+
+        # トークンを更新して再試行するコメント
+        LOGGER.info("Twitch APIが401を返したためトークンを更新して再試行します。")
+        access_token = await self.force_refresh(access_token)
+        return await request(access_token)
+
+    # 更新を一本化する処理に関するコメント
+    async def _refresh(self, stale_token: Optional[str]) -> str:
+        """同時に呼ばれても更新は1回だけ行い、最新のトークンを返す。"""
 
         # 同時更新を避けるためにロックするコメント
         async with self._lock:
-            if self._access_token and self._is_token_valid():
-                return self._access_token
-            await self._refresh_token_locked()
+            if stale_token is None:
+                needs_refresh = not (self._access_token and self._is_token_valid())
+            else:
+                needs_refresh = self._access_token == stale_token or not self._access_token
+            if needs_refresh:
+                await self._refresh_token_locked()
             if not self._access_token:
                 raise RuntimeError("Twitchアクセストークンの取得に失敗しました。")
             return self._access_token
 
+    # 期限前にトークンを更新し続ける処理に関するコメント
+    async def _refresh_loop(self) -> None:
+        """有効期限の手前でトークンを更新する。"""
+
+        # 更新ループに関するコメント
+        refreshed = False
+        while True:
+            # 次の更新時刻まで待機し、有効期間の短いトークンでも連続して更新しないコメント
+            delay = (self._expires_at - TOKEN_PROACTIVE_REFRESH_SECONDS) - time.monotonic()
+            if refreshed:
+                delay = max(delay, TOKEN_REFRESH_RETRY_SECONDS)
+            if self._access_token and delay > 0:
+                await asyncio.sleep(delay)
+            refreshed = False
+
+            # 更新に失敗しても現行トークンが有効な間は再試行するコメント
+            try:
+                async with self._lock:
+                    remaining = self._expires_at - time.monotonic()
+                    if not self._access_token or remaining <= TOKEN_PROACTIVE_REFRESH_SECONDS:
+                        await self._refresh_token_locked()
+                        refreshed = True
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                LOGGER.warning("Twitchトークンの先行更新に失敗しました: %s", exc)
+                await asyncio.sleep(TOKEN_REFRESH_RETRY_SECONDS)
+
     # トークンの有効性を確認する処理に関するコメント
     def _is_token_valid(self) -> bool:
         """期限に余裕がある場合のみ有効とみなす。"""
@@ -682,10 +1478,9 @@ class TwitchTokenManager:
 
         # HTTPリクエストを送るコメント
         try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                response = await client.post(TWITCH_TOKEN_ENDPOINT, data=payload)
-                response.raise_for_status()
-                data = response.json()
+            response = await self._http_client.post(TWITCH_TOKEN_ENDPOINT, data=payload)
+            response.raise_for_status()
+            data = response.json()
         except httpx.HTTPError as exc:
             LOGGER.exception("Twitchトークンの更新に失敗しました: %s", exc)
             raise
@@ -699,7 +1494,7 @@ class TwitchTokenManager:
         if isinstance(refresh_token, str) and refresh_token:
             if refresh_token != self._refresh_token:
                 self._refresh_token = refresh_token
-                LOGGER.info("Twitchのrefresh tokenが更新されました。環境変数も更新してください。")
+                LOGGER.info("Twitchのrefresh tokenが更新されました。トークンキャッシュに保存します。")
 
         expires_in = data.get("expires_in")
         try:
@@ -714,9 +1509,100 @@ class TwitchTokenManager:
         self._access_token = access_token
         self._expires_at = time.monotonic() + expires_in_seconds
 
+        # イベントループを止めないよう書き込みはスレッドで行うコメント
+        await asyncio.to_thread(self._save_cache)
+
+    # キャッシュ済みのログイン名を返すコメント
+    @property
+    def cached_login(self) -> Optional[str]:
+        """トークンキャッシュに保存されたログイン名を返す。"""
+
+        # 保持しているログイン名を返すコメント
+        return self._login
+
+    # ログイン名をキャッシュに保存するコメント
+    async def remember_login(self, login: str) -> None:
+        """解決したログイン名をトークンキャッシュに保存する。"""
+
+        # 値を更新してスレッドで保存するコメント
+        self._login = login
+        await asyncio.to_thread(self._save_cache)
+
+    # トークンキャッシュを読み込むコメント
+    def _load_cache(self) -> None:
+        """環境変数と同じ系列のトークンキャッシュがあれば復元する。"""
+
+        # ファイルがなければ何もしないコメント
+        if self._cache_path is None or not self._cache_path.is_file():
+            return
+
+        # JSONを読み込むコメント
+        try:
+            with self._cache_path.open("r", encoding="utf-8") as file_handle:
+                data = json.load(file_handle)
+        except (OSError, json.JSONDecodeError):
+            return
+        if not isinstance(data, dict) or data.get("client_id") != self._client_id:
+            return
+
+        # 環境変数のトークンから始まった系列か確認するコメント
+        cached_refresh_token = data.get("refresh_token")
+        if not isinstance(cached_refresh_token, str) or not cached_refresh_token:
+            return
+        seed_matches = data.get("seed_refresh_token_sha256") == self._seed_hash
+        if not seed_matches and cached_refresh_token != self._refresh_token:
+            LOGGER.info("環境変数のrefresh tokenが変更されたためトークンキャッシュを使いません。")
+            return
+        self._refresh_token = cached_refresh_token
+
+        # ログイン名を復元するコメント
+        login = data.get("login")
+        if isinstance(login, str) and login.strip():
+            self._login = login.strip()
+
+        # 期限内のアクセストークンを復元するコメント
+        access_token = data.get("access_token")
+        expires_at = data.get("expires_at")
+        if not isinstance(access_token, str) or not access_token:
+            return
+        if not isinstance(expires_at, (int, float)):
+            return
+        self._access_token = access_token
+        self._expires_at = time.monotonic() + (float(expires_at) - time.time())
+        if self._is_token_valid():
+            LOGGER.info("キャッシュ済みのTwitchアクセストークンを再利用します。")
+
+    # トークンキャッシュを書き込むコメント
+    def _save_cache(self) -> None:
+        """トークンとログイン名を原子的に保存する。"""
+
+        # 保存先がなければ何もしないコメント
+        if self._cache_path is None:
+            return
+
+        # 保存内容を組み立てるコメント
+        payload = {
+            "client_id": self._client_id,
+            "seed_refresh_token_sha256": self._seed_hash,
+            "refresh_token": self._refresh_token,
+            "access_token": self._access_token,
+            "expires_at": time.time() + (self._expires_at - time.monotonic()),
+            "login": self._login,
+        }
+
+        # 本人だけが読める権限で書き込むコメント
+        try:
+            write_json_atomic(self._cache_path, payload, mode=0o600)
+        except OSError:
+            LOGGER.warning("Twitchトークンキャッシュの保存に失敗しました。")
+
 
 # Twitchのユーザー名を取得する関数に関するコメント
-async def fetch_twitch_user_login(access_token: str, client_id: str) -> str:
+async def fetch_twitch_user_login(
+    client: httpx.AsyncClient,
+    access_token: str,
+    client_id: str,
+) -> str:
     """Twitchのアクセストークンからユーザー名を取得する。"""
 
     # リクエストヘッダーを組み立てるコメント
@@ -727,10 +1613,9 @@ async def fetch_twitch_user_login(access_token: str, client_id: str) -> str:
 
     # ユーザー情報を取得するコメント
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(TWITCH_USERS_ENDPOINT, headers=headers)
-            response.raise_for_status()
-            data = response.json()
+        response = await client.get(TWITCH_USERS_ENDPOINT, headers=headers)
+        response.raise_for_status()
+        data = response.json()
     except httpx.HTTPError as exc:
         LOGGER.exception("Twitchユーザー情報の取得に失敗しました: %s", exc)
         raise
@@ -747,82 +1632,335 @@ async def fetch_twitch_user_login(access_token: str, client_id: str) -> str:
     return login.strip()
 
 
-# YouTube配信の動画IDを取得する関数に関するコメント
-async def fetch_youtube_live_video_id(api_key: str, channel_id: str) -> Optional[str]:
-    """YouTubeの配信中動画IDを取得する。"""
+# YouTubeのAPI消費ユニットを日単位で記録するクラスに関するコメント
+class YouTubeQuotaLedger:
+    """YouTube Data APIの消費ユニットを太平洋時間の日単位で記録する。"""
 
-    # クエリパラメータを組み立てるコメント
-    params = {
-        "part": "snippet",
-        "channelId": channel_id,
-        "eventType": "live",
-        "type": "video",
-        "order": "date",
-        "maxResults": 1,
-        "key": api_key,
-    }
+    # 初期化処理に関するコメント
+    def __init__(self, cache_path: Path, daily_limit: int) -> None:
+        # 保存先と上限を保持するコメント
+        self._cache_path = cache_path
+        self._daily_limit = daily_limit
+        self._day_key = ""
+        self._spent_units = 0
+        self._units_by_endpoint: Dict[str, int] = {}
+        self._warned_day_key = ""
+        self._save_task: Optional[asyncio.Task[None]] = None
+        self._dirty = False
+        self._load()
+
+    # 残りユニット数を返すコメント
+    @property
+    def remaining_units(self) -> int:
+        """当日の残りユニット数を返す。"""
+
+        # 日付の切り替わりを反映してから計算するコメント
+        self._roll_day()
+        return max(0, self._daily_limit - self._spent_units)
+
+    # ユニットを消費できるか判定して記録するコメント
+    def try_spend(self, units: int, endpoint: str) -> bool:
+        """上限内ならユニットを記録してTrueを返す。"""
+
+        # 日付の切り替わりを反映するコメント
+        self._roll_day()
+
+        # 上限を超える場合は消費しないコメント
+        if self._spent_units + units > self._daily_limit:
+            if self._warned_day_key != self._day_key:
+                self._warned_day_key = self._day_key
+                LOGGER.warning(
+                    "YouTube APIの1日の上限(%s)に達したため本日の取得を停止します。",
+                    self._daily_limit,
+                )
+            return False
 
-    # 配信中の動画を検索するコメント
-    try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(YOUTUBE_SEARCH_ENDPOINT, params=params)
-            response.raise_for_status()
-            data = response.json()
-    except httpx.HTTPError as exc:
-        LOGGER.exception("YouTube配信検索に失敗しました: %s", exc)
-        raise
+        # 消費ユニットを記録して保存するコメント
+        self._spent_units += units
+        self._units_by_endpoint[endpoint] = self._units_by_endpoint.get(endpoint, 0) + units
+        self._save()
+        return True
 
-    # 結果がない場合はNoneを返すコメント
-    items = data.get("items")
-    if not isinstance(items, list) or not items:
-        return None
+    # API側で上限超過と判定された場合の処理に関するコメント
+    def mark_exhausted(self) -> None:
+        """当日のユニットを使い切った状態にする。"""
 
-    # 動画IDを取り出すコメント
-    item = items[0] if isinstance(items[0], dict) else {}
-    item_id = item.get("id") if isinstance(item.get("id"), dict) else {}
-    video_id = item_id.get("videoId")
-    if not isinstance(video_id, str) or not video_id.strip():
-        return None
+        # 残りを0にして保存するコメント
+        self._roll_day()
+        self._spent_units = max(self._spent_units, self._daily_limit)
+        self._save()
 
-    return video_id.strip()
+    # 現在の日付キーを計算するコメント
+    def _current_day_key(self) -> str:
+        """クォータの日付境界である太平洋時間の日付を返す。"""
 
+        # タイムゾーン情報がなければ標準時で代用するコメント
+        try:
+            from zoneinfo import ZoneInfo
 
-# YouTube配信情報を取得する関数に関するコメント
-async def fetch_youtube_stream_info(
-    api_key: str,
-    channel_id: str,
-) -> Optional[YouTubeStreamInfo]:
-    """YouTubeの配信情報を取得して整形する。"""
+            pacific = ZoneInfo("America/Los_Angeles")
+        except Exception:
+            pacific = timezone(timedelta(hours=-8))
+        return datetime.now(pacific).strftime("%Y-%m-%d")
 
-    # 配信中の動画IDを取得するコメント
-    video_id = await fetch_youtube_live_video_id(api_key, channel_id)
-    if not video_id:
-        return None
+    # 日付が変わっていれば集計をリセットするコメント
+    def _roll_day(self) -> None:
+        """日付の切り替わりで集計をリセットする。"""
+
+        # 日付キーを比較するコメント
+        day_key = self._current_day_key()
+        if day_key == self._day_key:
+            return
+        self._day_key = day_key
+        self._spent_units = 0
+        self._units_by_endpoint = {}
+
+    # 記録を読み込むコメント
+    def _load(self) -> None:
+        """保存済みの消費記録を読み込む。"""
+
+        # 当日の日付キーを確定するコメント
+        self._roll_day()
+        if not self._cache_path.is_file():
+            return
+
+        # JSONを読み込むコメント
+        try:
+            with self._cache_path.open("r", encoding="utf-8") as file_handle:
+                data = json.load(file_handle)
+        except (OSError, json.JSONDecodeError):
+            return
+
+        # 当日の記録のみ復元するコメント
+        if not isinstance(data, dict) or data.get("day") != self._day_key:
+            return
+        spent_units = data.get("spent_units")
+        if isinstance(spent_units, int) and spent_units >= 0:
+            self._spent_units = spent_units
+        units_by_endpoint = data.get("units_by_endpoint")
+        if isinstance(units_by_endpoint, dict):
+            self._units_by_endpoint = {
+                key: value
+                for key, value in units_by_endpoint.items()
+                if isinstance(key, str) and isinstance(value, int)
+            }
+
+    # 記録の保存を予約するコメント
+    def _save(self) -> None:
+        """消費記録の保存をスレッドで行うよう予約する。"""
+
+        # 書き込み中の更新は次の書き込みにまとめるコメント
+        self._dirty = True
+        if self._save_task is None:
+            self._save_task = asyncio.create_task(self._save_in_background())
+
+    # 記録を書き込む処理に関するコメント
+    async def _save_in_background(self) -> None:
+        """更新がなくなるまで消費記録をスレッドで原子的に書き込む。"""
+
+        # イベントループを止めないよう書き込みはスレッドで行うコメント
+        try:
+            while self._dirty:
+                self._dirty = False
+                payload = {
+                    "day": self._day_key,
+                    "daily_limit": self._daily_limit,
+                    "spent_units": self._spent_units,
+                    "units_by_endpoint": dict(self._units_by_endpoint),
+                }
+                try:
+                    await asyncio.to_thread(write_json_atomic, self._cache_path, payload)
+                except OSError:
+                    LOGGER.warning("YouTubeクォータ記録の保存に失敗しました。")
+        finally:
+            self._save_task = None
+
+    # 終了処理に関するコメント
+    async def close(self) -> None:
+        """書き込み中の消費記録の保存が終わるまで待つ。"""
+
+        # 書き込み中のタスクがあれば待つコメント
+        if self._save_task is not None:
+            await self._save_task
+
+
+# YouTube APIの応答を検証する関数に関するコメント
+def raise_for_youtube_status(response: httpx.Response, ledger: YouTubeQuotaLedger) -> None:
+    """クォータ超過を記録してからHTTPエラーを送出する。"""
+
+    # 正常応答なら何もしないコメント
+    if response.is_success:
+        return
+
+    # 403のエラー理由からクォータ超過を判定するコメント
+    if response.status_code == 403:
+        try:
+            errors = response.json().get("error", {}).get("errors", [])
+        except (ValueError, AttributeError):
+            errors = []
+        reasons = {item.get("reason") for item in errors if isinstance(item, dict)}
+        if reasons & {"quotaExceeded", "dailyLimitExceeded"}:
+            ledger.mark_exhausted()
+
+    response.raise_for_status()
+
+
+# チャンネルのRSSから動画ID候補を取得する関数に関するコメント
+async def fetch_youtube_feed_video_ids(
+    client: httpx.AsyncClient,
+    channel_id: str,
+    limit: int,
+) -> List[str]:
+    """公開RSSフィードから新しい順に動画IDを取得する。"""
+
+    # フィードを取得するコメント
+    try:
+        response = await client.get(YOUTUBE_CHANNEL_FEED_URL, params={"channel_id": channel_id})
+        response.raise_for_status()
+    except httpx.HTTPError as exc:
+        LOGGER.warning("YouTubeフィードの取得に失敗しました: %s", exc)
+        raise
+
+    # XMLから動画IDを取り出すコメント
+    root = ElementTree.fromstring(response.content)
+    video_ids = []
+    for entry in root.iter(f"{{{ATOM_NAMESPACE}}}entry"):
+        video_id = entry.findtext(f"{{{YOUTUBE_FEED_NAMESPACE}}}videoId")
+        if video_id and video_id.strip():
+            video_ids.append(video_id.strip())
+        if len(video_ids) >= limit:
+            break
+
+    return video_ids
+
+
+# アップロード再生リストから動画ID候補を取得する関数に関するコメント
+async def fetch_youtube_playlist_video_ids(
+    client: httpx.AsyncClient,
+    api_key: str,
+    channel_id: str,
+    ledger: YouTubeQuotaLedger,
+    limit: int,
+) -> List[str]:
+    """アップロード再生リストから新しい順に動画IDを取得する。"""
+
+    # チャンネルIDからアップロード再生リストIDを求めるコメント
+    if not channel_id.startswith("UC"):
+        LOGGER.warning("アップロード再生リストを特定できないチャンネルIDです: %s", channel_id)
+        return []
+    playlist_id = f"UU{channel_id[2:]}"
+
+    # クォータを確保できなければ取得しないコメント
+    if not ledger.try_spend(YOUTUBE_LIST_QUOTA_COST, "playlistItems.list"):
+        return []
+
+    # クエリパラメータを組み立てるコメント
+    params = {
+        "part": "contentDetails",
+        "playlistId": playlist_id,
+        "maxResults": limit,
+        "key": api_key,
+    }
+
+    # 再生リストの項目を取得するコメント
+    try:
+        response = await client.get(YOUTUBE_PLAYLIST_ITEMS_ENDPOINT, params=params)
+        raise_for_youtube_status(response, ledger)
+        data = response.json()
+    except httpx.HTTPError as exc:
+        LOGGER.exception("YouTube再生リストの取得に失敗しました: %s", exc)
+        raise
+
+    # 動画IDを取り出すコメント
+    items = data.get("items")
+    if not isinstance(items, list):
+        return []
+    video_ids = []
+    for item in items:
+        details = item.get("contentDetails") if isinstance(item, dict) else None
+        video_id = details.get("videoId") if isinstance(details, dict) else None
+        if isinstance(video_id, str) and video_id.strip():
+            video_ids.append(video_id.strip())
+
+    return video_ids
+
+
+# 設定された方式で動画ID候補を探す関数に関するコメント
+async def discover_youtube_video_ids(
+    client: httpx.AsyncClient,
+    api_key: str,
+    channel_id: str,
+    ledger: YouTubeQuotaLedger,
+    source: str,
+) -> List[str]:
+    """RSSまたはアップロード再生リストから動画ID候補を取得する。"""
+
+    # RSSはクォータを消費しないので優先するコメント
+    if source == "rss":
+        try:
+            return await fetch_youtube_feed_video_ids(
+                client,
+                channel_id,
+                YOUTUBE_DISCOVERY_MAX_RESULTS,
+            )
+        except (httpx.HTTPError, ElementTree.ParseError):
+            LOGGER.info("YouTubeフィードが使えないため再生リストで代替します: %s", channel_id)
+
+    # アップロード再生リストから取得するコメント
+    return await fetch_youtube_playlist_video_ids(
+        client,
+        api_key,
+        channel_id,
+        ledger,
+        YOUTUBE_DISCOVERY_MAX_RESULTS,
+    )
+
+
+# 動画の詳細をまとめて取得する関数に関するコメント
+async def fetch_youtube_video_items(
+    client: httpx.AsyncClient,
+    api_key: str,
+    video_ids: List[str],
+    ledger: YouTubeQuotaLedger,
+) -> List[dict]:
+    """videos.listで動画の配信詳細とスニペットを取得する。"""
+
+    # 対象がなければ取得しないコメント
+    if not video_ids:
+        return []
+
+    # クォータを確保できなければ取得しないコメント
+    if not ledger.try_spend(YOUTUBE_LIST_QUOTA_COST, "videos.list"):
+        return []
 
     # クエリパラメータを組み立てるコメント
     params = {
         "part": "liveStreamingDetails,snippet",
-        "id": video_id,
+        "id": ",".join(video_ids),
         "key": api_key,
     }
 
-    # 配信詳細を取得するコメント
+    # 動画詳細を取得するコメント
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(YOUTUBE_VIDEOS_ENDPOINT, params=params)
-            response.raise_for_status()
-            data = response.json()
+        response = await client.get(YOUTUBE_VIDEOS_ENDPOINT, params=params)
+        raise_for_youtube_status(response, ledger)
+        data = response.json()
     except httpx.HTTPError as exc:
-        LOGGER.exception("YouTube配信詳細の取得に失敗しました: %s", exc)
+        LOGGER.exception("YouTube動画詳細の取得に失敗しました: %s", exc)
         raise
 
-    # 配信情報が取得できない場合はNoneを返すコメント
+    # 辞書形式の項目だけを返すコメント
     items = data.get("items")
-    if not isinstance(items, list) or not items:
-        return None
+    if not isinstance(items, list):
+        return []
+    return [item for item in items if isinstance(item, dict)]
 
-    # 先頭の配信情報を解析するコメント
-    item = items[0] if isinstance(items[0], dict) else {}
+
+# 配信中の動画項目を整形する関数に関するコメント
+def parse_youtube_stream_item(item: dict) -> Optional[YouTubeStreamInfo]:
+    """videos.listの項目が配信中ならYouTubeStreamInfoに変換する。"""
+
+    # スニペットと配信詳細を取り出すコメント
     snippet = item.get("snippet") if isinstance(item.get("snippet"), dict) else {}
     details = (
         item.get("liveStreamingDetails")
@@ -830,6 +1968,13 @@ async def fetch_youtube_stream_info(
         else {}
     )
 
+    # 配信中でなければ対象外とするコメント
+    video_id = item.get("id")
+    if not isinstance(video_id, str) or not video_id.strip():
+        return None
+    if snippet.get("liveBroadcastContent") != "live":
+        return None
+
     # 同接数を整数化するコメント
     viewer_count = details.get("concurrentViewers")
     try:
@@ -854,7 +1999,7 @@ async def fetch_youtube_stream_info(
     channel_title = channel_title_value.strip() if isinstance(channel_title_value, str) else ""
 
     return YouTubeStreamInfo(
-        video_id=video_id,
+        video_id=video_id.strip(),
         started_at=started_at,
         viewer_count=viewer_count_int,
         title=title_text,
@@ -862,119 +2007,167 @@ async def fetch_youtube_stream_info(
     )
 
 
-# YouTube配信予定の動画IDを取得する関数に関するコメント
-async def fetch_youtube_upcoming_video_meta(
-    api_key: str,
-    channel_id: str,
-) -> Optional[Tuple[str, str, str]]:
-    """YouTube配信予定の動画IDとタイトルを取得する。"""
-
-    # クエリパラメータを組み立てるコメント
-    params = {
-        "part": "snippet",
-        "channelId": channel_id,
-        "eventType": "upcoming",
-        "type": "video",
-        "order": "date",
-        "maxResults": 1,
-        "key": api_key,
-    }
+# 配信予定の動画項目を整形する関数に関するコメント
+def parse_youtube_upcoming_item(item: dict, channel_id: str) -> Optional[YouTubeUpcomingInfo]:
+    """videos.listの項目が配信予定ならYouTubeUpcomingInfoに変換する。"""
 
-    # 配信予定の動画を検索するコメント
-    try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(YOUTUBE_SEARCH_ENDPOINT, params=params)
-            response.raise_for_status()
-            data = response.json()
-    except httpx.HTTPError as exc:
-        LOGGER.exception("YouTube配信予定検索に失敗しました: %s", exc)
-        raise
+    # スニペットと配信詳細を取り出すコメント
+    snippet = item.get("snippet") if isinstance(item.get("snippet"), dict) else {}
+    details = (
+        item.get("liveStreamingDetails")
+        if isinstance(item.get("liveStreamingDetails"), dict)
+        else {}
+    )
 
-    # 結果がない場合はNoneを返すコメント
-    items = data.get("items")
-    if not isinstance(items, list) or not items:
+    # 配信予定でなければ対象外とするコメント
+    video_id = item.get("id")
+    if not isinstance(video_id, str) or not video_id.strip():
+        return None
+    if snippet.get("liveBroadcastContent") != "upcoming":
         return None
+    video_id = video_id.strip()
 
-    # 動画IDとタイトルを取り出すコメント
-    item = items[0] if isinstance(items[0], dict) else {}
-    item_id = item.get("id") if isinstance(item.get("id"), dict) else {}
-    snippet = item.get("snippet") if isinstance(item.get("snippet"), dict) else {}
-    video_id = item_id.get("videoId")
-    if not isinstance(video_id, str) or not video_id.strip():
+    # 配信予定時刻を取得するコメント
+    scheduled_raw = details.get("scheduledStartTime")
+    scheduled_start = parse_iso_datetime(scheduled_raw if isinstance(scheduled_raw, str) else None)
+    if scheduled_start is None:
         return None
 
+    # タイトルとチャンネル名を取り出すコメント
     title_value = snippet.get("title")
     channel_title_value = snippet.get("channelTitle")
     title_text = title_value.strip() if isinstance(title_value, str) else ""
     channel_title = channel_title_value.strip() if isinstance(channel_title_value, str) else ""
-    return video_id.strip(), title_text, channel_title
 
+    # チャンネル名のフォールバックを行うコメント
+    if not channel_title:
+        channel_title = channel_id
 
-# YouTube配信予定情報を取得する関数に関するコメント
-async def fetch_youtube_upcoming_info(
-    api_key: str,
-    channel_id: str,
+    return YouTubeUpcomingInfo(
+        video_id=video_id,
+        scheduled_start=scheduled_start,
+        title=title_text,
+        channel_title=channel_title,
+        url=f"https://www.youtube.com/watch?v={video_id}",
+    )
+
+
+# 配信予定の中から告知対象を選ぶ関数に関するコメント
+def select_youtube_upcoming_info(
+    infos: List[YouTubeUpcomingInfo],
+    now: float,
 ) -> Optional[YouTubeUpcomingInfo]:
-    """YouTubeの配信予定情報を取得して整形する。"""
+    """これから始まる配信予定のうち最も早いものを返す。"""
 
-    # 配信予定の動画メタ情報を取得するコメント
-    meta = await fetch_youtube_upcoming_video_meta(api_key, channel_id)
-    if not meta:
+    # 未来の予定だけを対象にするコメント
+    future_infos = [info for info in infos if info.scheduled_start > now]
+    if not future_infos:
         return None
-    video_id, title_text, channel_title = meta
+    return min(future_infos, key=lambda info: info.scheduled_start)
 
-    # クエリパラメータを組み立てるコメント
-    params = {
-        "part": "liveStreamingDetails",
-        "id": video_id,
-        "key": api_key,
-    }
 
-    # 配信予定詳細を取得するコメント
+# 締め切り付きで並行実行する関数に関するコメント
+async def gather_with_deadline(awaitables: List[Awaitable[object]], timeout: float) -> List[object]:
+    """期限内に終わった結果を返し、間に合わなかったものはTimeoutErrorに置き換える。"""
+
+    # 対象がなければ空で返すコメント
+    tasks = [asyncio.ensure_future(awaitable) for awaitable in awaitables]
+    if not tasks:
+        return []
+
+    # 締め切りまで待ち、残りは取り消すコメント
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(YOUTUBE_VIDEOS_ENDPOINT, params=params)
-            response.raise_for_status()
-            data = response.json()
-    except httpx.HTTPError as exc:
-        LOGGER.exception("YouTube配信予定詳細の取得に失敗しました: %s", exc)
-        raise
+        _, pending = await asyncio.wait(tasks, timeout=timeout)
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+    if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    # 入力順に結果か例外を並べるコメント
+    results: List[object] = []
+    for task in tasks:
+        if task in pending:
+            results.append(asyncio.TimeoutError(f"{timeout}秒以内に完了しませんでした。"))
+            continue
+        exception = task.exception()
+        results.append(exception if exception is not None else task.result())
+    return results
 
-    # 配信情報が取得できない場合はNoneを返すコメント
-    items = data.get("items")
-    if not isinstance(items, list) or not items:
-        return None
 
-    # 配信予定時刻を取得するコメント
-    item = items[0] if isinstance(items[0], dict) else {}
-    details = (
-        item.get("liveStreamingDetails")
-        if isinstance(item.get("liveStreamingDetails"), dict)
-        else {}
+# 全チャンネルの配信状態をまとめて取得する関数に関するコメント
+async def fetch_youtube_channel_states(
+    client: httpx.AsyncClient,
+    api_key: str,
+    channel_ids: Tuple[str, ...],
+    ledger: YouTubeQuotaLedger,
+    source: str,
+    now: float,
+) -> Tuple[Dict[str, YouTubeStreamInfo], Dict[str, YouTubeUpcomingInfo]]:
+    """全チャンネルの動画ID候補を集め、videos.listを50件単位でまとめて引く。"""
+
+    # チャンネルごとの候補取得を締め切り付きで並行して行うコメント
+    discovered = await gather_with_deadline(
+        [
+            discover_youtube_video_ids(client, api_key, channel_id, ledger, source)
+            for channel_id in channel_ids
+        ],
+        YOUTUBE_STAGE_TIMEOUT_SECONDS,
     )
-    scheduled_raw = details.get("scheduledStartTime")
-    scheduled_start = parse_iso_datetime(scheduled_raw if isinstance(scheduled_raw, str) else None)
-    if scheduled_start is None:
-        return None
 
-    # URLを組み立てるコメント
-    url = f"https://www.youtube.com/watch?v={video_id}"
+    # 動画IDと所属チャンネルの対応を作るコメント
+    owner_by_video_id: Dict[str, str] = {}
+    for channel_id, result in zip(channel_ids, discovered):
+        if isinstance(result, Exception):
+            LOGGER.error("YouTube動画ID候補の取得に失敗しました: %s: %s", channel_id, result)
+            continue
+        for video_id in result:
+            owner_by_video_id.setdefault(video_id, channel_id)
+
+    # 50件ずつに分けてまとめて取得するコメント
+    video_ids = list(owner_by_video_id)
+    batches = [
+        video_ids[index : index + YOUTUBE_VIDEOS_BATCH_SIZE]
+        for index in range(0, len(video_ids), YOUTUBE_VIDEOS_BATCH_SIZE)
+    ]
+    fetched = await gather_with_deadline(
+        [fetch_youtube_video_items(client, api_key, batch, ledger) for batch in batches],
+        YOUTUBE_STAGE_TIMEOUT_SECONDS,
+    )
 
-    # チャンネル名のフォールバックを行うコメント
-    if not channel_title:
-        channel_title = channel_id
+    # 取得結果をチャンネルごとに振り分けるコメント
+    stream_infos: Dict[str, YouTubeStreamInfo] = {}
+    upcoming_candidates: Dict[str, List[YouTubeUpcomingInfo]] = {}
+    for result in fetched:
+        if isinstance(result, Exception):
+            LOGGER.error("YouTube動画詳細の取得に失敗しました: %s", result)
+            continue
+        for item in result:
+            channel_id = owner_by_video_id.get(str(item.get("id", "")).strip())
+            if channel_id is None:
+                continue
+            stream_info = parse_youtube_stream_item(item)
+            if stream_info is not None:
+                stream_infos.setdefault(channel_id, stream_info)
+                continue
+            upcoming_info = parse_youtube_upcoming_item(item, channel_id)
+            if upcoming_info is not None:
+                upcoming_candidates.setdefault(channel_id, []).append(upcoming_info)
 
-    return YouTubeUpcomingInfo(
-        video_id=video_id,
-        scheduled_start=scheduled_start,
-        title=title_text,
-        channel_title=channel_title,
-        url=url,
-    )
+    # チャンネルごとに告知対象の配信予定を選ぶコメント
+    upcoming_infos: Dict[str, YouTubeUpcomingInfo] = {}
+    for channel_id, candidates in upcoming_candidates.items():
+        selected = select_youtube_upcoming_info(candidates, now)
+        if selected is not None:
+            upcoming_infos[channel_id] = selected
+
+    return stream_infos, upcoming_infos
 
 
 # Twitchの配信情報を取得する関数に関するコメント
 async def fetch_twitch_stream_info(
+    client: httpx.AsyncClient,
     access_token: str,
     client_id: str,
     user_login: str,
@@ -994,10 +2187,9 @@ async def fetch_twitch_stream_info(
 
     # 配信情報を取得するコメント
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(TWITCH_STREAMS_ENDPOINT, headers=headers, params=params)
-            response.raise_for_status()
-            data = response.json()
+        response = await client.get(TWITCH_STREAMS_ENDPOINT, headers=headers, params=params)
+        response.raise_for_status()
+        data = response.json()
     except httpx.HTTPError as exc:
         LOGGER.exception("Twitch配信情報の取得に失敗しました: %s", exc)
         raise
@@ -1040,6 +2232,77 @@ async def fetch_twitch_stream_info(
     )
 
 
+# TwitchのユーザーIDを取得する関数に関するコメント
+async def fetch_twitch_user_id(
+    client: httpx.AsyncClient,
+    access_token: str,
+    client_id: str,
+    login: str,
+) -> str:
+    """Twitchのログイン名からユーザーIDを取得する。"""
+
+    # リクエストヘッダーを組み立てるコメント
+    headers = {
+        "Authorization": f"Bearer {access_token}",
+        "Client-Id": client_id,
+    }
+
+    # ユーザー情報を取得するコメント
+    try:
+        response = await client.get(TWITCH_USERS_ENDPOINT, headers=headers, params={"login": login})
+        response.raise_for_status()
+        data = response.json()
+    except httpx.HTTPError as exc:
+        LOGGER.exception("TwitchユーザーIDの取得に失敗しました: %s", exc)
+        raise
+
+    # レスポンスからユーザーIDを取り出すコメント
+    users = data.get("data")
+    if not isinstance(users, list) or not users:
+        raise ValueError(f"Twitchユーザーが見つかりませんでした: {login}")
+
+    user_id = users[0].get("id") if isinstance(users[0], dict) else None
+    if not isinstance(user_id, str) or not user_id.strip():
+        raise ValueError("TwitchユーザーIDの取得に失敗しました。")
+
+    return user_id.strip()
+
+
+# EventSubの購読を作成する関数に関するコメント
+async def create_twitch_eventsub_subscription(
+    client: httpx.AsyncClient,
+    access_token: str,
+    client_id: str,
+    endpoint: str,
+    session_id: str,
+    event_type: str,
+    broadcaster_user_id: str,
+) -> None:
+    """WebSocketセッションに指定イベントの購読を登録する。"""
+
+    # リクエストヘッダーを組み立てるコメント
+    headers = {
+        "Authorization": f"Bearer {access_token}",
+        "Client-Id": client_id,
+    }
+
+    # 購読内容を組み立てるコメント
+    payload = {
+        "type": event_type,
+        "version": "1",
+        "condition": {"broadcaster_user_id": broadcaster_user_id},
+        "transport": {"method": "websocket", "session_id": session_id},
+    }
+
+    # 購読を登録するコメント
+    try:
+        response = await client.post(endpoint, headers=headers, json=payload)
+        response.raise_for_status()
+    except httpx.HTTPError as exc:
+        LOGGER.exception("EventSubの購読登録に失敗しました: %s", exc)
+        raise
+
+
 # Twitchのユーザー名を解決する関数に関するコメント
 async def resolve_twitch_nick(settings: Settings, token_manager: TwitchTokenManager) -> str:
     """環境変数またはAPIからTwitchユーザー名を解決する。"""
@@ -1048,10 +2311,21 @@ async def resolve_twitch_nick(settings: Settings, token_manager: TwitchTokenMana
     if settings.twitch_nick:
         return settings.twitch_nick
 
+    # 前回起動時に解決済みならそれを使うコメント
+    if token_manager.cached_login:
+        LOGGER.info("キャッシュ済みのTwitchユーザー名を使います: %s", token_manager.cached_login)
+        return token_manager.cached_login
+
     # アクセストークンを使ってユーザー名を取得するコメント
-    access_token = await token_manager.get_access_token()
-    login = await fetch_twitch_user_login(access_token, settings.twitch_client_id)
+    login = await token_manager.call_with_token(
+        lambda access_token: fetch_twitch_user_login(
+            token_manager.http_client,
+            access_token,
+            settings.twitch_client_id,
+        )
+    )
     LOGGER.info("Twitchユーザー名を自動取得しました: %s", login)
+    await token_manager.remember_login(login)
     return login
 
 
@@ -1099,12 +2373,69 @@ def append_hashtag(text: str, hashtag: str, max_length: int) -> str:
 
 
 # ツイート本文を構築する関数に関するコメント
-def build_tweet(message: str) -> str:
+def build_tweet(message: str, author: Optional[str] = None, channel: Optional[str] = None) -> str:
     """投稿用のテキストを組み立てる。"""
 
-    # 指定フォーマットで本文を構成するコメント
-    base_text = f"{POST_HEADER}\n\n{message}"
-    return truncate_for_x(base_text, MAX_TWEET_LENGTH)
+    # 既定以外の発言者とチャンネルは本文に明記するコメント
+    if author:
+        message = f"{author}: {message}"
+    footer = f"\n\n（{channel} さんのチャットより）" if channel else ""
+
+    # 出典を残したまま本文を切り詰めるコメント
+    header = f"{POST_HEADER}\n\n"
+    body = truncate_for_x(message, MAX_TWEET_LENGTH - len(header) - len(footer))
+    return f"{header}{body}{footer}"
+
+
+# 複数のコメントをまとめた投稿文を組み立てる関数に関するコメント
+def build_coalesced_tweets(comments: List[ChatComment]) -> List[str]:
+    """コメントを1件の投稿に詰め、入りきらない分は返信用の投稿に分けて返す。"""
+
+    # 1件だけなら通常の投稿文にするコメント
+    if len(comments) == 1:
+        comment = comments[0]
+        return [build_tweet(comment.content, comment.author, comment.channel)]
+
+    # 投稿時に付くハッシュタグの分を空けて行単位で詰めるコメント
+    limit = MAX_TWEET_LENGTH - len(f"\n\n{POST_HASHTAG}")
+    posts: List[str] = []
+    header = f"{POST_HEADER}\n\n"
+    lines: List[str] = []
+    for comment in comments:
+        line = f"{comment.author}: {comment.content}" if comment.author else comment.content
+        if comment.channel:
+            line = f"{line}（{comment.channel}）"
+
+        # 入りきらなければ次の投稿に送るコメント
+        if lines and len(header) + len("\n".join(lines)) + 1 + len(line) > limit:
+            posts.append(header + "\n".join(lines))
+            header = f"{POST_THREAD_CONTINUATION_HEADER}\n\n"
+            lines = []
+        lines.append(truncate_for_x(line, limit - len(header)))
+    posts.append(header + "\n".join(lines))
+    return posts
+
+
+# 同じ内容の投稿を見分けるキーを作る関数に関するコメント
+def build_dedup_key(text: str, reply_texts: Tuple[str, ...] = ()) -> str:
+    """全角半角と空白の違いを揃えた本文と続きのハッシュ値を返す。"""
+
+    # 表記揺れを正規化してから連結するコメント
+    normalized = "\n".join(
+        re.sub(r"\s+", " ", unicodedata.normalize("NFKC", part)).strip() for part in (text, *reply_texts)
+    )
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+# 重複回数を本文に付ける関数に関するコメント
+def format_duplicate_count(text: str, count: int) -> str:
+    """前回付けた回数を外し、新しい回数を「×N」として末尾に付けた本文を返す。"""
+
+    # 投稿時に付くハッシュタグの分を空けて回数を付けるコメント
+    base = re.sub(r" ×\d+$", "", text)
+    suffix = f" ×{count}"
+    limit = MAX_TWEET_LENGTH - len(f"\n\n{POST_HASHTAG}") - len(suffix)
+    return f"{truncate_for_x(base, limit)}{suffix}"
 
 
 # 返信対象のメンションを先頭に追加する関数に関するコメント
@@ -1166,6 +2497,15 @@ def build_stream_summary_tweet(session: StreamSession, ended_at: float) -> str:
             ]
         )
 
+    # チャットの多かった時間帯を追加するコメント
+    chat_peaks = session.chat_rate.peaks(CHAT_RATE_PEAK_COUNT)
+    if chat_peaks:
+        peak_texts = [
+            f"{datetime.fromtimestamp(started_at).strftime('%H:%M')}({count:,}件)"
+            for started_at, count in chat_peaks
+        ]
+        summary_lines.extend(["", f"チャット最多（1分間）：{' '.join(peak_texts)}"])
+
     summary_text = "\n".join(summary_lines)
     return truncate_for_x(summary_text, MAX_TWEET_LENGTH)
 
@@ -1190,13 +2530,52 @@ def build_youtube_upcoming_tweet(info: YouTubeUpcomingInfo, now: float) -> str:
     return truncate_for_x(message, MAX_TWEET_LENGTH)
 
 
+# グラフの系列を表すデータクラスに関するコメント
+@dataclass(frozen=True)
+class GraphSeries:
+    """系列名と時刻と値を数値配列で保持し、描画プロセスに小さく受け渡す。"""
+
+    # 凡例に表示する系列名を保持するコメント
+    label: str
+    # 時刻のUNIX秒を保持するコメント
+    timestamps: "array[float]"
+    # 時刻ごとの値を保持するコメント
+    values: "array[int]"
+
+
+# 同接サンプルをグラフの系列に変換する関数に関するコメント
+def build_graph_series(label: str, points: Iterable[Tuple[float, int]]) -> GraphSeries:
+    """時刻と値の組を数値配列の系列にする。"""
+
+    # 時刻と値を別々の配列に詰めるコメント
+    timestamps = array("d")
+    values = array("q")
+    for timestamp, value in points:
+        timestamps.append(timestamp)
+        values.append(value)
+    return GraphSeries(label=label, timestamps=timestamps, values=values)
+
+
+# 描画プロセスを準備する関数に関するコメント
+def prepare_graph_worker() -> None:
+    """描画プロセスでmatplotlibの読み込みとフォント登録を先に済ませる。"""
+
+    # 最初の描画で時間がかからないよう読み込んでおくコメント
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot  # noqa: F401
+
+    setup_matplotlib_japanese_font()
+
+
 # 同接グラフを生成する関数に関するコメント
 def generate_viewer_graph(
-    samples: Deque[ViewerSample],
+    twitch_series: Optional[GraphSeries],
     output_path: str,
     title: str,
-    youtube_series: Optional[List[Tuple[str, Deque[ViewerSample]]]] = None,
-    twitch_label: str = "Twitch",
+    youtube_series: Optional[List[GraphSeries]] = None,
+    chat_rate_series: Optional[GraphSeries] = None,
 ) -> None:
     """同接推移のPNGグラフを生成する。"""
 
@@ -1215,7 +2594,7 @@ def generate_viewer_graph(
     font_prop = setup_matplotlib_japanese_font()
 
     # サンプルの有無を判定するコメント
-    has_twitch_samples = bool(samples)
+    has_twitch_samples = twitch_series is not None and bool(twitch_series.timestamps)
     has_youtube_samples = bool(youtube_series)
 
     # サンプルがない場合は空のグラフを作るコメント
@@ -1233,25 +2612,23 @@ def generate_viewer_graph(
     fig, ax = plt.subplots(figsize=(12, 5), dpi=160)
 
     # Twitchの系列を描画するコメント
-    if has_twitch_samples:
-        times = [datetime.fromtimestamp(sample.timestamp) for sample in samples]
-        counts = [sample.viewer_count for sample in samples]
-        label_text = twitch_label if twitch_label else "Twitch"
+    if has_twitch_samples and twitch_series is not None:
+        times = [datetime.fromtimestamp(timestamp) for timestamp in twitch_series.timestamps]
+        counts = list(twitch_series.values)
+        label_text = twitch_series.label if twitch_series.label else "Twitch"
         ax.plot(times, counts, color="#e56b6f", linewidth=2, label=label_text)
         ax.fill_between(times, counts, color="#e56b6f", alpha=0.18)
 
     # YouTubeの系列を描画するコメント
     if has_youtube_samples and youtube_series is not None:
         youtube_colors = ["#2a9d8f", "#1f7a70", "#5fb3a7", "#3d8b80"]
-        for index, (label, series_samples) in enumerate(youtube_series):
-            if not series_samples:
+        for index, series in enumerate(youtube_series):
+            if not series.timestamps:
                 continue
-            youtube_times = [
-                datetime.fromtimestamp(sample.timestamp) for sample in series_samples
-            ]
-            youtube_counts = [sample.viewer_count for sample in series_samples]
+            youtube_times = [datetime.fromtimestamp(timestamp) for timestamp in series.timestamps]
+            youtube_counts = list(series.values)
             color = youtube_colors[index % len(youtube_colors)]
-            ax.plot(youtube_times, youtube_counts, color=color, linewidth=2, label=label)
+            ax.plot(youtube_times, youtube_counts, color=color, linewidth=2, label=series.label)
 
     # 日本語ラベルを設定するコメント
     ax.set_title("同接推移", fontproperties=font_prop)
@@ -1280,9 +2657,34 @@ def generate_viewer_graph(
     ax.yaxis.set_major_formatter(axis_formatter)
     ax.grid(True, linestyle="--", alpha=0.3)
 
+    # チャット速度を第2軸に描画するコメント
+    legend_handles, legend_labels = ax.get_legend_handles_labels()
+    if chat_rate_series is not None and chat_rate_series.timestamps:
+        chat_ax = ax.twinx()
+        chat_times = [datetime.fromtimestamp(started_at) for started_at in chat_rate_series.timestamps]
+        chat_counts = list(chat_rate_series.values)
+        chat_ax.bar(
+            chat_times,
+            chat_counts,
+            width=CHAT_RATE_BUCKET_SECONDS / 86400,
+            align="edge",
+            color="#6c757d",
+            alpha=0.3,
+            label=chat_rate_series.label,
+        )
+        chat_ax.set_ylabel("チャット数/分", fontproperties=font_prop)
+        chat_ax.yaxis.set_major_locator(mticker.MaxNLocator(integer=True))
+
+        # 同接の線を棒グラフより手前に表示するコメント
+        ax.set_zorder(chat_ax.get_zorder() + 1)
+        ax.patch.set_visible(False)
+        chat_handles, chat_labels = chat_ax.get_legend_handles_labels()
+        legend_handles += chat_handles
+        legend_labels += chat_labels
+
     # 凡例を表示するコメント
-    if has_twitch_samples or has_youtube_samples:
-        ax.legend(prop=font_prop)
+    if legend_handles:
+        ax.legend(legend_handles, legend_labels, prop=font_prop)
 
     # レイアウトを調整して保存するコメント
     fig.autofmt_xdate()
@@ -1291,142 +2693,1846 @@ def generate_viewer_graph(
     plt.close(fig)
 
 
-# X投稿を順番に処理するクラスに関するコメント
-class XPoster:
-    """Xへの投稿をキューで順次実行するクラス。"""
+# 同接グラフを別プロセスで描画するクラスに関するコメント
+class GraphRenderer:
+    """spawn方式のプロセスプールで同接グラフを描画し、イベントループを止めないようにする。"""
 
     # 初期化処理に関するコメント
-    def __init__(
-        self,
-        client: tweepy.Client,
-        media_client: tweepy.API,
-        interval_seconds: float,
-        queue_size: int,
-        reply_setting: str,
-        reply_mentions: Tuple[str, ...],
-    ) -> None:
-        # クライアントと制御用の値を保持するコメント
-        self._client = client
-        self._media_client = media_client
-        self._interval_seconds = interval_seconds
-        self._queue: asyncio.Queue[Optional[XPostJob]] = asyncio.Queue(maxsize=queue_size)
-        self._task: Optional[asyncio.Task[None]] = None
-        self._last_post_time = 0.0
-        self._reply_setting = reply_setting
-        self._reply_mentions = reply_mentions
+    def __init__(self, timeout_seconds: float) -> None:
+        # 描画を待つ上限とプロセスプールを保持するコメント
+        self._timeout_seconds = timeout_seconds
+        self._executor: Optional[ProcessPoolExecutor] = None
 
-    # ワーカー開始のためのコメント
+    # 描画プロセスの起動に関するコメント
     def start(self) -> None:
-        """投稿ワーカーを起動する。"""
+        """描画プロセスを起動し、matplotlibの読み込みを先に済ませておく。"""
 
         # 二重起動を避けるコメント
-        if self._task is None:
-            self._task = asyncio.create_task(self._worker())
+        if self._executor is not None:
+            return
+
+        # 親プロセスのスレッドやソケットを引き継がないようspawn方式で起動するコメント
+        self._executor = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+        future = asyncio.get_running_loop().run_in_executor(self._executor, prepare_graph_worker)
+        future.add_done_callback(self._log_prepare_result)
+
+    # 描画処理に関するコメント
+    async def render(
+        self,
+        twitch_series: Optional[GraphSeries],
+        output_path: str,
+        title: str,
+        youtube_series: Optional[List[GraphSeries]] = None,
+        chat_rate_series: Optional[GraphSeries] = None,
+    ) -> bool:
+        """別プロセスでグラフを描画し、上限時間内に保存できたかを返す。"""
+
+        # 停止済みや異常終了後はプロセスを起動し直すコメント
+        if self._executor is None:
+            self.start()
+        assert self._executor is not None
+        future = asyncio.get_running_loop().run_in_executor(
+            self._executor,
+            generate_viewer_graph,
+            twitch_series,
+            output_path,
+            title,
+            youtube_series,
+            chat_rate_series,
+        )
+
+        # 時間切れや失敗の場合は画像なしで続けられるようFalseを返すコメント
+        try:
+            await asyncio.wait_for(future, timeout=self._timeout_seconds)
+        except asyncio.TimeoutError:
+            LOGGER.warning("同接グラフの描画が%.0f秒以内に終わりませんでした。", self._timeout_seconds)
+            self._discard_executor()
+            return False
+        except asyncio.CancelledError:
+            # 描画中のプロセスが残って次の描画を待たせないよう捨ててから中断するコメント
+            self._discard_executor()
+            raise
+        except Exception as exc:
+            LOGGER.exception("同接グラフの描画に失敗しました: %s", exc)
+            if self._executor is not None and getattr(self._executor, "_broken", False):
+                self._discard_executor()
+            return False
+        return True
+
+    # 終了処理に関するコメント
+    async def close(self) -> None:
+        """描画プロセスを終了する。"""
+
+        # プロセスがなければ何もしないコメント
+        executor = self._executor
+        if executor is None:
+            return
+        self._executor = None
+
+        # 終了待ちでイベントループを止めないよう別スレッドで待つコメント
+        await asyncio.to_thread(executor.shutdown, True, cancel_futures=True)
+
+    # 応答しなくなったプロセスプールを捨てる処理に関するコメント
+    def _discard_executor(self) -> None:
+        """描画中のプロセスを強制終了し、次の描画で起動し直すようにする。"""
+
+        # 実行中の描画は終了を待たずに止めるコメント
+        executor = self._executor
+        self._executor = None
+        if executor is None:
+            return
+        processes = list((getattr(executor, "_processes", None) or {}).values())
+        executor.shutdown(wait=False, cancel_futures=True)
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+
+    # 事前準備の結果を記録する処理に関するコメント
+    @staticmethod
+    def _log_prepare_result(future: "asyncio.Future[None]") -> None:
+        """描画プロセスの事前準備に失敗していればログに残す。"""
+
+        # 失敗しても描画時にもう一度読み込むため警告に留めるコメント
+        if future.cancelled():
+            return
+        exc = future.exception()
+        if exc is not None:
+            LOGGER.warning("同接グラフの描画プロセスの準備に失敗しました: %s", exc)
+
+
+# X APIの失敗応答を表す例外に関するコメント
+class XAPIError(RuntimeError):
+    """X APIが失敗応答を返したことを表し、ステータスと応答ヘッダーを保持する。"""
+
+    # 初期化処理に関するコメント
+    def __init__(self, status_code: int, detail: str, headers: Mapping[str, str]) -> None:
+        # 上限判定に使う値を保持するコメント
+        super().__init__(f"X APIがエラーを返しました: {status_code} {detail}")
+        self.status_code = status_code
+        self.detail = detail
+        self.headers = headers
+
+
+# アップロード済みメディアを表すデータクラスに関するコメント
+@dataclass(frozen=True)
+class XMediaUpload:
+    """メディアIDとその有効期限を保持する。"""
+
+    # メディアIDを保持するコメント
+    media_id: str
+    # 有効期限のUNIX秒を保持するコメント
+    expires_at: float
+
+
+# X投稿の結果を表すデータクラスに関するコメント
+@dataclass(frozen=True)
+class XPostResult:
+    """作成した投稿のIDと応答ヘッダーを保持する。"""
+
+    # 投稿IDを保持するコメント
+    tweet_id: str
+    # 上限判定に使う応答ヘッダーを保持するコメント
+    headers: Mapping[str, str]
+
+
+# X投稿の失敗を分類する関数に関するコメント
+def classify_x_error(exc: BaseException) -> str:
+    """例外を再試行可能、重複、認証、上限超過、内容不備のいずれかに分類する。"""
+
+    # APIの応答はステータスと本文で見分けるコメント
+    if isinstance(exc, XAPIError):
+        if exc.status_code == 429:
+            return X_ERROR_RATE_LIMIT
+        if exc.status_code == 403 and "duplicate" in exc.detail.lower():
+            return X_ERROR_DUPLICATE
+        if exc.status_code in (401, 403):
+            return X_ERROR_AUTH
+        if exc.status_code == 408 or exc.status_code >= 500:
+            return X_ERROR_RETRYABLE
+        return X_ERROR_INVALID
+
+    # 画像が消えている場合は何度試しても投稿できないコメント
+    if isinstance(exc, FileNotFoundError):
+        return X_ERROR_INVALID
+
+    # 通信エラーやその他の想定外の失敗は再試行するコメント
+    return X_ERROR_RETRYABLE
+
+
+# X投稿の再試行までの待機秒数を計算する関数に関するコメント
+def compute_x_retry_delay(attempt: int) -> float:
+    """ジッター付きの指数バックオフで再試行までの待機秒数を返す。"""
+
+    # 試行回数に応じて上限付きで倍増させるコメント
+    ceiling = min(
+        X_RETRY_MAX_DELAY_SECONDS,
+        X_RETRY_DELAY_SECONDS * (2 ** min(max(attempt - 1, 0), 16)),
+    )
+
+    # 同時に失敗したジョブが揃って再試行しないよう揺らぎを加えるコメント
+    return ceiling / 2 + random.uniform(0.0, ceiling / 2)
+
+
+# OAuth 1.0a用に文字列をエンコードする関数に関するコメント
+def oauth1_quote(value: str) -> str:
+    """OAuth 1.0aの規定どおりに文字列をパーセントエンコードする。"""
+
+    # 非予約文字以外を全てエンコードするコメント
+    return urllib.parse.quote(value, safe="~")
+
+
+# OAuth 1.0aの署名を計算する関数に関するコメント
+def build_oauth1_signature(
+    method: str,
+    url: str,
+    params: Mapping[str, str],
+    consumer_secret: str,
+    token_secret: str,
+) -> str:
+    """HMAC-SHA1で署名ベース文字列に署名してBase64で返す。"""
+
+    # パラメーターをエンコードしてから並べ替えるコメント
+    encoded_params = sorted((oauth1_quote(key), oauth1_quote(value)) for key, value in params.items())
+    normalized_params = "&".join(f"{key}={value}" for key, value in encoded_params)
+    base_string = "&".join(
+        (method.upper(), oauth1_quote(url), oauth1_quote(normalized_params))
+    )
+
+    # 鍵を組み立てて署名するコメント
+    signing_key = f"{oauth1_quote(consumer_secret)}&{oauth1_quote(token_secret)}"
+    digest = hmac.new(signing_key.encode("utf-8"), base_string.encode("utf-8"), hashlib.sha1).digest()
+    return base64.b64encode(digest).decode("ascii")
+
+
+# OAuth 1.0aの認証ヘッダーを作る関数に関するコメント
+def build_oauth1_header(
+    method: str,
+    url: str,
+    params: Mapping[str, str],
+    consumer_key: str,
+    consumer_secret: str,
+    token: str,
+    token_secret: str,
+) -> str:
+    """クエリとフォームの値を含めて署名したAuthorizationヘッダーの値を返す。"""
+
+    # OAuthのパラメーターを用意するコメント
+    oauth_params = {
+        "oauth_consumer_key": consumer_key,
+        "oauth_nonce": uuid.uuid4().hex,
+        "oauth_signature_method": "HMAC-SHA1",
+        "oauth_timestamp": str(int(time.time())),
+        "oauth_token": token,
+        "oauth_version": "1.0",
+    }
+
+    # 署名を付けてヘッダーの値にするコメント
+    oauth_params["oauth_signature"] = build_oauth1_signature(
+        method,
+        url,
+        {**params, **oauth_params},
+        consumer_secret,
+        token_secret,
+    )
+    return "OAuth " + ", ".join(
+        f'{oauth1_quote(key)}="{oauth1_quote(value)}"' for key, value in sorted(oauth_params.items())
+    )
+
+
+# Xに非同期で投稿するクライアントに関するコメント
+class AsyncXClient:
+    """共有のHTTPクライアントでX APIにOAuth 1.0a署名付きで投稿する。"""
+
+    # 初期化処理に関するコメント
+    def __init__(
+        self,
+        http_client: httpx.AsyncClient,
+        consumer_key: str,
+        consumer_secret: str,
+        access_token: str,
+        access_secret: str,
+        api_base_url: str = X_API_BASE_URL,
+        upload_base_url: str = X_UPLOAD_BASE_URL,
+    ) -> None:
+        # 認証情報と接続先を保持するコメント
+        self._http_client = http_client
+        self._consumer_key = consumer_key
+        self._consumer_secret = consumer_secret
+        self._access_token = access_token
+        self._access_secret = access_secret
+        self._tweets_url = f"{api_base_url.rstrip('/')}/2/tweets"
+        self._upload_url = f"{upload_base_url.rstrip('/')}/1.1/media/upload.json"
+
+    # 投稿を作成するコメント
+    async def create_tweet(
+        self,
+        text: str,
+        media_ids: Optional[List[str]] = None,
+        reply_settings: Optional[str] = None,
+        in_reply_to_tweet_id: Optional[str] = None,
+    ) -> XPostResult:
+        """投稿を作成し、投稿IDと応答ヘッダーを返す。"""
+
+        # 指定された項目だけ本文に含めるコメント
+        payload: Dict[str, object] = {"text": text}
+        if media_ids:
+            payload["media"] = {"media_ids": media_ids}
+        if in_reply_to_tweet_id:
+            payload["reply"] = {"in_reply_to_tweet_id": in_reply_to_tweet_id}
+        if reply_settings and reply_settings != "everyone":
+            payload["reply_settings"] = reply_settings
+
+        # JSON本文は署名に含めずに送るコメント
+        response = await self._request("POST", self._tweets_url, json_body=payload)
+        data = response.json().get("data")
+        if not isinstance(data, dict) or not data.get("id"):
+            raise XAPIError(response.status_code, "投稿IDが応答に含まれていません。", response.headers)
+        return XPostResult(tweet_id=str(data["id"]), headers=response.headers)
+
+    # メディアをアップロードするコメント
+    async def upload_media(self, media_path: str) -> XMediaUpload:
+        """画像をアップロードしてメディアIDと有効期限を返す。大きいファイルや動画は分割して送る。"""
+
+        # ファイルの読み込みはスレッドで行うコメント
+        content = await asyncio.to_thread(Path(media_path).read_bytes)
+        media_type = mimetypes.guess_type(media_path)[0] or "application/octet-stream"
+
+        # 小さい静止画は1回で送るコメント
+        if media_type.startswith("image/") and media_type != "image/gif" and len(content) <= X_MEDIA_CHUNK_BYTES:
+            response = await self._request(
+                "POST",
+                self._upload_url,
+                files={"media": (Path(media_path).name, content, media_type)},
+            )
+            return self._media_upload_from(response)
+        return await self._upload_chunked(content, media_type)
+
+    # 分割アップロードに関するコメント
+    async def _upload_chunked(self, content: bytes, media_type: str) -> XMediaUpload:
+        """INIT、APPEND、FINALIZEの順にメディアを分割して送る。"""
+
+        # 種類に応じた用途を指定して開始するコメント
+        if media_type == "image/gif":
+            media_category = "tweet_gif"
+        elif media_type.startswith("video/"):
+            media_category = "tweet_video"
+        else:
+            media_category = "tweet_image"
+        response = await self._request(
+            "POST",
+            self._upload_url,
+            form={
+                "command": "INIT",
+                "total_bytes": str(len(content)),
+                "media_type": media_type,
+                "media_category": media_category,
+            },
+        )
+        media_id = self._media_upload_from(response).media_id
+
+        # 分割したデータを順に送るコメント
+        for segment_index, offset in enumerate(range(0, len(content), X_MEDIA_CHUNK_BYTES)):
+            await self._request(
+                "POST",
+                self._upload_url,
+                data={"command": "APPEND", "media_id": media_id, "segment_index": str(segment_index)},
+                files={"media": ("chunk", content[offset : offset + X_MEDIA_CHUNK_BYTES], "application/octet-stream")},
+            )
+
+        # 完了を通知し、処理待ちがあれば終わるまで待つコメント
+        response = await self._request(
+            "POST",
+            self._upload_url,
+            form={"command": "FINALIZE", "media_id": media_id},
+        )
+        upload = self._media_upload_from(response)
+        await self._wait_for_processing(media_id, response.json().get("processing_info"))
+        return upload
+
+    # メディアの処理完了を待つコメント
+    async def _wait_for_processing(self, media_id: str, processing_info: object) -> None:
+        """サーバー側の処理が終わるまでSTATUSを確認する。"""
+
+        # 処理情報がなくなるか成功するまで繰り返すコメント
+        deadline = time.monotonic() + X_MEDIA_PROCESSING_TIMEOUT_SECONDS
+        while isinstance(processing_info, dict):
+            state = processing_info.get("state")
+            if state == "succeeded":
+                return
+            if state == "failed":
+                raise XAPIError(400, f"メディアの処理に失敗しました: {processing_info.get('error')}", {})
+            if time.monotonic() >= deadline:
+                raise XAPIError(408, "メディアの処理が時間内に終わりませんでした。", {})
+
+            # 指定された秒数だけ待って確認するコメント
+            await asyncio.sleep(float(processing_info.get("check_after_secs") or 1))
+            response = await self._request(
+                "GET",
+                self._upload_url,
+                params={"command": "STATUS", "media_id": media_id},
+            )
+            processing_info = response.json().get("processing_info")
+
+    # メディアIDと有効期限を取り出すコメント
+    def _media_upload_from(self, response: httpx.Response) -> XMediaUpload:
+        """アップロードの応答からメディアIDと有効期限を取り出す。"""
+
+        # 文字列のIDを優先するコメント
+        body = response.json()
+        media_id = body.get("media_id_string") or body.get("media_id")
+        if not media_id:
+            raise XAPIError(response.status_code, "メディアIDが応答に含まれていません。", response.headers)
+
+        # 有効期間がなければ既定の期間を使うコメント
+        expires_after = body.get("expires_after_secs")
+        if not isinstance(expires_after, (int, float)) or expires_after <= 0:
+            expires_after = X_MEDIA_ID_TTL_SECONDS
+        return XMediaUpload(media_id=str(media_id), expires_at=time.time() + float(expires_after))
+
+    # 署名付きでリクエストを送るコメント
+    async def _request(
+        self,
+        method: str,
+        url: str,
+        *,
+        params: Optional[Dict[str, str]] = None,
+        form: Optional[Dict[str, str]] = None,
+        data: Optional[Dict[str, str]] = None,
+        files: Optional[Dict[str, Tuple[str, bytes, str]]] = None,
+        json_body: Optional[Dict[str, object]] = None,
+    ) -> httpx.Response:
+        """クエリとフォームの値だけを署名に含めて送り、失敗応答なら例外を送出する。"""
+
+        # 署名対象はクエリとURLエンコードのフォームに限るコメント
+        authorization = build_oauth1_header(
+            method,
+            url,
+            {**(params or {}), **(form or {})},
+            self._consumer_key,
+            self._consumer_secret,
+            self._access_token,
+            self._access_secret,
+        )
+        response = await self._http_client.request(
+            method,
+            url,
+            params=params,
+            data=form if form is not None else data,
+            files=files,
+            json=json_body,
+            headers={"Authorization": authorization},
+        )
+
+        # 失敗応答は理由とヘッダーを付けて送出するコメント
+        if response.is_error:
+            raise XAPIError(response.status_code, response.text[:200], response.headers)
+        return response
+
+
+# 運用指標を集計するクラスに関するコメント
+class MetricsRegistry:
+    """運用指標を名前付きの数値として保持し、JSONに定期的に書き出す。"""
+
+    # 初期化処理に関するコメント
+    def __init__(self, path: Optional[Path], interval_seconds: float = METRICS_WRITE_INTERVAL_SECONDS) -> None:
+        # 値と書き出し先を保持するコメント
+        self._path = path
+        self._interval_seconds = interval_seconds
+        self._values: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task[None]] = None
+
+    # 現在値を設定するコメント
+    def set_gauge(self, name: str, value: float) -> None:
+        """指定した指標を現在値で上書きする。"""
+
+        # ロック内で更新するコメント
+        with self._lock:
+            self._values[name] = value
+
+    # 累計値を増やすコメント
+    def increment(self, name: str, amount: float = 1) -> None:
+        """指定した指標を累計値として加算する。"""
+
+        # ロック内で更新するコメント
+        with self._lock:
+            self._values[name] = self._values.get(name, 0) + amount
+
+    # 全指標の写しを返すコメント
+    def snapshot(self) -> Dict[str, float]:
+        """全指標の現在値を名前順の辞書で返す。"""
+
+        # ロック内で写しを作るコメント
+        with self._lock:
+            return dict(sorted(self._values.items()))
+
+    # ファイルに書き出すコメント
+    def write(self) -> None:
+        """書き出し先があれば全指標をJSONで原子的に書き出す。"""
+
+        # 書き出し先がなければ何もしないコメント
+        if self._path is None:
+            return
+        payload = {"updated_at": int(time.time()), "metrics": self.snapshot()}
+        try:
+            write_json_atomic(self._path, payload)
+        except OSError as exc:
+            LOGGER.warning("運用指標の書き出しに失敗しました: %s", exc)
+
+    # 定期書き出しを開始するコメント
+    def start(self) -> None:
+        """書き出し先があれば定期書き出しを開始する。"""
+
+        # 二重起動と書き出し先なしを避けるコメント
+        if self._path is not None and self._task is None:
+            self._task = asyncio.create_task(self._write_loop())
+
+    # 定期書き出しを終了するコメント
+    async def close(self) -> None:
+        """定期書き出しを止めて最後の値を書き出す。"""
+
+        # タスクを止めてから書き出すコメント
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self.write()
+
+    # 定期書き出しのループに関するコメント
+    async def _write_loop(self) -> None:
+        """一定間隔で全指標を書き出す。"""
+
+        # 書き込みはスレッドで行うコメント
+        while True:
+            await asyncio.sleep(self._interval_seconds)
+            await asyncio.to_thread(self.write)
+
+
+# X投稿ジョブを永続化するキューに関するコメント
+class XPostJobStore:
+    """SQLiteのWALモードで投稿ジョブを状態と試行回数付きで保存する。"""
+
+    # 初期化処理に関するコメント
+    def __init__(self, db_path: Path) -> None:
+        # 接続を開いてスキーマを用意するコメント
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(str(db_path), check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS x_post_jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                text TEXT NOT NULL,
+                media_path TEXT,
+                cleanup_path TEXT,
+                lane TEXT NOT NULL DEFAULT 'chat',
+                priority INTEGER NOT NULL DEFAULT 2,
+                reply_texts TEXT,
+                media_id TEXT,
+                media_expires_at REAL,
+                thread_parent_id TEXT,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL DEFAULT 0,
+                last_error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+
+        # 後から増えた列がない古いデータベースに列を追加するコメント
+        columns = {row[1] for row in self._connection.execute("PRAGMA table_info(x_post_jobs)")}
+        added_columns = {
+            "lane": f"TEXT NOT NULL DEFAULT '{X_LANE_CHAT}'",
+            "priority": f"INTEGER NOT NULL DEFAULT {X_LANE_PRIORITIES[X_LANE_CHAT]}",
+            "reply_texts": "TEXT",
+            "media_id": "TEXT",
+            "media_expires_at": "REAL",
+            "thread_parent_id": "TEXT",
+            "next_attempt_at": "REAL NOT NULL DEFAULT 0",
+        }
+        for name, definition in added_columns.items():
+            if name not in columns:
+                self._connection.execute(f"ALTER TABLE x_post_jobs ADD COLUMN {name} {definition}")
+
+        # 優先度順の取り出しに使う索引を用意するコメント
+        self._connection.execute("DROP INDEX IF EXISTS x_post_jobs_status")
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS x_post_jobs_claim ON x_post_jobs (status, priority, id)"
+        )
+
+    # ジョブを追加するコメント
+    def add(self, job: XPostJob) -> XPostJob:
+        """ジョブを投稿待ちとして保存し、IDを付けて返す。"""
+
+        # 追加した行のIDを返すコメント
+        now = time.time()
+        with self._lock:
+            cursor = self._connection.execute(
+                "INSERT INTO x_post_jobs "
+                "(text, media_path, cleanup_path, lane, priority, reply_texts, thread_parent_id, "
+                "status, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    job.text,
+                    job.media_path,
+                    job.cleanup_path,
+                    job.lane,
+                    X_LANE_PRIORITIES[job.lane],
+                    json.dumps(list(job.reply_texts), ensure_ascii=False) if job.reply_texts else None,
+                    job.thread_parent_id,
+                    X_JOB_STATUS_PENDING,
+                    now,
+                    now,
+                ),
+            )
+        return XPostJob(
+            text=job.text,
+            media_path=job.media_path,
+            cleanup_path=job.cleanup_path,
+            job_id=cursor.lastrowid,
+            lane=job.lane,
+            reply_texts=job.reply_texts,
+            thread_parent_id=job.thread_parent_id,
+        )
+
+    # 次のジョブを取り出すコメント
+    def claim_next(self, lanes: Tuple[str, ...] = tuple(X_LANE_PRIORITIES)) -> Optional[XPostJob]:
+        """指定レーンのうち最も優先度の高いレーンの最も古い投稿待ちジョブを処理中にして返す。"""
+
+        # 再試行の時刻が来ていないジョブは除いて取り出すコメント
+        placeholders = ", ".join("?" for _ in lanes)
+        now = time.time()
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._connection.execute(
+                    "SELECT id, text, media_path, cleanup_path, attempts, lane, reply_texts, "
+                    "media_id, media_expires_at, thread_parent_id FROM x_post_jobs "
+                    f"WHERE status = ? AND lane IN ({placeholders}) AND next_attempt_at <= ? "
+                    "ORDER BY priority, id LIMIT 1",
+                    (X_JOB_STATUS_PENDING, *lanes, now),
+                ).fetchone()
+                if row is not None:
+                    self._connection.execute(
+                        "UPDATE x_post_jobs SET status = ?, attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                        (X_JOB_STATUS_IN_PROGRESS, now, row[0]),
+                    )
+                self._connection.execute("COMMIT")
+            except sqlite3.Error:
+                self._connection.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+
+        # 期限の近いメディアIDは使わずにアップロードし直すコメント
+        media_id = row[7]
+        if media_id and (row[8] or 0) <= now + X_MEDIA_ID_EXPIRY_MARGIN_SECONDS:
+            media_id = None
+        return XPostJob(
+            text=row[1],
+            media_path=row[2],
+            cleanup_path=row[3],
+            job_id=row[0],
+            attempts=row[4] + 1,
+            lane=row[5],
+            reply_texts=tuple(json.loads(row[6])) if row[6] else (),
+            media_id=media_id,
+            thread_parent_id=row[9],
+        )
+
+    # 先にアップロードしたメディアIDを保存するコメント
+    def set_media_id(self, job_id: int, upload: XMediaUpload) -> None:
+        """ジョブにメディアIDと有効期限を記録する。"""
+
+        # 投稿時に使えるよう保存するコメント
+        with self._lock:
+            self._connection.execute(
+                "UPDATE x_post_jobs SET media_id = ?, media_expires_at = ?, updated_at = ? WHERE id = ?",
+                (upload.media_id, upload.expires_at, time.time(), job_id),
+            )
+
+    # メディアIDのない投稿待ちジョブを返すコメント
+    def pending_media_jobs(self) -> List[XPostJob]:
+        """有効なメディアIDがまだない投稿待ちの画像付きジョブを古い順に返す。"""
+
+        # 期限の近いメディアIDは持っていないものとみなすコメント
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT id, text, media_path, lane FROM x_post_jobs "
+                "WHERE status = ? AND media_path IS NOT NULL "
+                "AND (media_id IS NULL OR media_expires_at <= ?) ORDER BY priority, id",
+                (X_JOB_STATUS_PENDING, time.time() + X_MEDIA_ID_EXPIRY_MARGIN_SECONDS),
+            ).fetchall()
+        return [XPostJob(text=row[1], media_path=row[2], job_id=row[0], lane=row[3]) for row in rows]
+
+    # ジョブの状態を更新するコメント
+    def mark(self, job_id: int, status: str, error: Optional[str] = None) -> None:
+        """ジョブを指定した状態に更新する。"""
+
+        # 状態とエラー内容を記録するコメント
+        with self._lock:
+            self._connection.execute(
+                "UPDATE x_post_jobs SET status = ?, last_error = ?, updated_at = ? WHERE id = ?",
+                (status, error, time.time(), job_id),
+            )
+
+    # 重複回数を本文に反映するコメント
+    def set_duplicate_count(self, job_id: int, count: int) -> bool:
+        """投稿待ちのジョブの本文に重複回数を付け、更新できたかを返す。"""
+
+        # 取り出されていないジョブだけ書き換えるコメント
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT text FROM x_post_jobs WHERE id = ? AND status = ?",
+                (job_id, X_JOB_STATUS_PENDING),
+            ).fetchone()
+            if row is None:
+                return False
+            self._connection.execute(
+                "UPDATE x_post_jobs SET text = ?, updated_at = ? WHERE id = ?",
+                (format_duplicate_count(row[0], count), time.time(), job_id),
+            )
+        return True
+
+    # 再試行を予約するコメント
+    def schedule_retry(self, job_id: int, next_attempt_at: float, error: str) -> None:
+        """ジョブを投稿待ちに戻し、指定時刻まで取り出さないようにする。"""
+
+        # 失敗内容と次の試行時刻を記録するコメント
+        with self._lock:
+            self._connection.execute(
+                "UPDATE x_post_jobs SET status = ?, next_attempt_at = ?, last_error = ?, updated_at = ? "
+                "WHERE id = ?",
+                (X_JOB_STATUS_PENDING, next_attempt_at, error, time.time(), job_id),
+            )
+
+    # 上限超過で見送ったジョブを戻すコメント
+    def defer(self, job_id: int) -> None:
+        """ジョブを投稿待ちに戻し、今回の取り出しを試行回数に数えないようにする。"""
+
+        # 上限の更新待ちで再試行回数を使い切らないようにするコメント
+        with self._lock:
+            self._connection.execute(
+                "UPDATE x_post_jobs SET status = ?, attempts = MAX(attempts - 1, 0), updated_at = ? WHERE id = ?",
+                (X_JOB_STATUS_PENDING, time.time(), job_id),
+            )
+
+    # 返信スレッドの進み具合を保存するコメント
+    def record_thread_progress(self, job_id: int, thread_parent_id: str, reply_texts: Tuple[str, ...]) -> None:
+        """投稿済みの最後のIDと未投稿の続きを保存し、再試行時に先頭から投稿し直さないようにする。"""
+
+        # 残りの本文だけを保存するコメント
+        with self._lock:
+            self._connection.execute(
+                "UPDATE x_post_jobs SET thread_parent_id = ?, reply_texts = ?, updated_at = ? WHERE id = ?",
+                (
+                    thread_parent_id,
+                    json.dumps(list(reply_texts), ensure_ascii=False) if reply_texts else None,
+                    time.time(),
+                    job_id,
+                ),
+            )
+
+    # 次に再試行できる時刻を返すコメント
+    def next_retry_at(self) -> Optional[float]:
+        """再試行を待っている投稿待ちジョブのうち最も早い試行時刻を返す。"""
+
+        # 時刻が来ていないジョブだけを対象にするコメント
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT MIN(next_attempt_at) FROM x_post_jobs WHERE status = ? AND next_attempt_at > ?",
+                (X_JOB_STATUS_PENDING, time.time()),
+            ).fetchone()
+        return row[0] if row else None
+
+    # 中断したジョブを戻すコメント
+    def recover(self) -> int:
+        """前回の実行中に処理中のまま残ったジョブを投稿待ちに戻す。"""
+
+        # 戻した件数を返すコメント
+        with self._lock:
+            cursor = self._connection.execute(
+                "UPDATE x_post_jobs SET status = ?, updated_at = ? WHERE status = ?",
+                (X_JOB_STATUS_PENDING, time.time(), X_JOB_STATUS_IN_PROGRESS),
+            )
+        return cursor.rowcount
+
+    # 投稿待ちの件数を数えるコメント
+    def count_pending_by_lane(self) -> Dict[str, int]:
+        """投稿待ちと処理中のジョブ数をレーンごとに返す。"""
+
+        # 全レーンを0件で用意してから数えるコメント
+        depths = {lane: 0 for lane in X_LANE_PRIORITIES}
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT lane, COUNT(*) FROM x_post_jobs WHERE status IN (?, ?) GROUP BY lane",
+                (X_JOB_STATUS_PENDING, X_JOB_STATUS_IN_PROGRESS),
+            ).fetchall()
+        for lane, count in rows:
+            depths[lane] = int(count)
+        return depths
+
+    # 完了済みの行を削除するコメント
+    def compact(self, older_than: float) -> int:
+        """指定時刻より前に完了または失敗した行を削除してWALを縮める。"""
+
+        # 削除後にWALをチェックポイントするコメント
+        with self._lock:
+            cursor = self._connection.execute(
+                "DELETE FROM x_post_jobs WHERE status IN (?, ?) AND updated_at < ?",
+                (X_JOB_STATUS_DONE, X_JOB_STATUS_FAILED, older_than),
+            )
+            self._connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return cursor.rowcount
+
+    # 接続を閉じるコメント
+    def close(self) -> None:
+        """データベース接続を閉じる。"""
+
+        # ロック内で閉じるコメント
+        with self._lock:
+            self._connection.close()
+
+
+# X投稿の送信時期を決めるクラスに関するコメント
+class XPostRateLimiter:
+    """投稿間隔のトークンバケットとX APIの残数を合わせて送信時期を決める。"""
+
+    # 初期化処理に関するコメント
+    def __init__(
+        self,
+        interval_seconds: float,
+        burst: int,
+        daily_limit: int,
+        daily_reserved: int,
+        cache_path: Path,
+        metrics: MetricsRegistry,
+    ) -> None:
+        # トークンバケットの状態を保持するコメント
+        self._refill_seconds = interval_seconds
+        self._capacity = float(burst)
+        self._tokens = float(burst)
+        self._refilled_at = time.monotonic()
+
+        # 応答ヘッダーから読んだ15分枠の残数を保持するコメント
+        self._window_remaining: Optional[int] = None
+        self._window_reset_at = 0.0
+
+        # 24時間の投稿上限と応答ヘッダーの残数を保持するコメント
+        self._daily_limit = daily_limit
+        self._daily_reserved = daily_reserved
+        self._daily_remaining_header: Optional[int] = None
+        self._daily_reset_at = 0.0
+        self._post_times: Deque[float] = deque()
+
+        # 保存先と指標を保持して記録を読み込むコメント
+        self._cache_path = cache_path
+        self._metrics = metrics
+        self._save_task: Optional[asyncio.Task[None]] = None
+        self._dirty = False
+        self._load()
+        self._publish_metrics()
+
+    # 24時間枠の残数を返すコメント
+    def daily_remaining(self) -> int:
+        """自前の記録と応答ヘッダーのうち少ない方の残数を返す。"""
+
+        # 期間外の記録を捨ててから数えるコメント
+        now = time.time()
+        self._prune_post_times(now)
+        remaining = self._daily_limit - len(self._post_times)
+        if self._daily_remaining_header is not None and now < self._daily_reset_at:
+            remaining = min(remaining, self._daily_remaining_header)
+        return max(0, remaining)
+
+    # 投稿できるレーンを返すコメント
+    def allowed_lanes(self) -> Tuple[str, ...]:
+        """残数が予約分まで減ったらチャットを後回しにしたレーンの一覧を返す。"""
+
+        # 予約分は要約と告知のために残すコメント
+        if self.daily_remaining() <= self._daily_reserved:
+            return tuple(lane for lane in X_LANE_PRIORITIES if lane != X_LANE_CHAT)
+        return tuple(X_LANE_PRIORITIES)
+
+    # 上限に近いか判定するコメント
+    def is_constrained(self) -> bool:
+        """15分枠か24時間枠の残りが少なければTrueを返す。"""
+
+        # 15分枠の残りが1件以下か、24時間枠が予約分まで減っていれば逼迫とみなすコメント
+        window_low = (
+            self._window_remaining is not None
+            and self._window_remaining <= 1
+            and time.time() < self._window_reset_at
+        )
+        return window_low or self.daily_remaining() <= self._daily_reserved
+
+    # 送信までの待ち時間を返すコメント
+    def delay_for(self, cost: int) -> float:
+        """指定件数を投稿できるまでの秒数を返す。"""
+
+        # トークンの補充を反映するコメント
+        self._refill()
+        now = time.time()
+        cost = min(cost, self._daily_limit)
+        delay = 0.0
+
+        # トークンが1つ貯まるまで待つコメント
+        if self._tokens < 1:
+            delay = (1 - self._tokens) * self._refill_seconds
+
+        # 15分枠が足りなければ枠の更新まで待つコメント
+        if self._window_remaining is not None and self._window_remaining < cost and now < self._window_reset_at:
+            delay = max(delay, self._window_reset_at - now)
+
+        # 24時間枠が足りなければ空きが出るまで待つコメント
+        if self.daily_remaining() < cost:
+            delay = max(delay, self._daily_recovery_at(cost) - now)
+        return delay
+
+    # 投稿の成功を記録するコメント
+    def record_post(self, headers: Optional[Mapping[str, str]] = None) -> None:
+        """トークンと残数を1件分減らし、応答ヘッダーがあれば反映する。"""
+
+        # 自前の記録を減らしてからヘッダーで上書きするコメント
+        self._refill()
+        self._tokens -= 1
+        self._post_times.append(time.time())
+        if self._window_remaining is not None:
+            self._window_remaining = max(0, self._window_remaining - 1)
+        if headers is not None:
+            self._update_from_headers(headers)
+        self._save()
+        self._publish_metrics()
+
+    # 上限超過の応答を記録するコメント
+    def record_rate_limited(self, headers: Optional[Mapping[str, str]]) -> None:
+        """上限超過の応答を受けたら枠の更新まで投稿を止める。"""
+
+        # ヘッダーがなければ15分枠の長さだけ止めるコメント
+        self._window_remaining = 0
+        self._window_reset_at = time.time() + X_RATE_LIMIT_WINDOW_SECONDS
+        if headers is not None:
+            self._update_from_headers(headers)
+        LOGGER.warning(
+            "Xの投稿上限に達したため%.0f秒後まで投稿を止めます。",
+            max(0.0, self._window_reset_at - time.time()),
+        )
+        self._publish_metrics()
+
+    # 応答ヘッダーを反映するコメント
+    def _update_from_headers(self, headers: Mapping[str, str]) -> None:
+        """15分枠と24時間枠の残数と更新時刻を応答ヘッダーから読み取る。"""
+
+        # 15分枠の値を読むコメント
+        remaining = parse_optional_int(headers.get("x-rate-limit-remaining"))
+        reset_at = parse_optional_int(headers.get("x-rate-limit-reset"))
+        if remaining is not None:
+            self._window_remaining = remaining
+        if reset_at is not None:
+            self._window_reset_at = float(reset_at)
+
+        # 24時間枠の値を読むコメント
+        daily_remaining = parse_optional_int(headers.get("x-user-limit-24hour-remaining"))
+        daily_reset_at = parse_optional_int(headers.get("x-user-limit-24hour-reset"))
+        if daily_remaining is not None:
+            self._daily_remaining_header = daily_remaining
+        if daily_reset_at is not None:
+            self._daily_reset_at = float(daily_reset_at)
+
+    # トークンを補充するコメント
+    def _refill(self) -> None:
+        """経過時間に応じてトークンを上限まで補充する。"""
+
+        # 補充量を計算するコメント
+        now = time.monotonic()
+        self._tokens = min(self._capacity, self._tokens + (now - self._refilled_at) / self._refill_seconds)
+        self._refilled_at = now
+
+    # 24時間枠に空きが出る時刻を返すコメント
+    def _daily_recovery_at(self, cost: int) -> float:
+        """指定件数を投稿できるだけ24時間枠が空くUNIX秒を返す。"""
+
+        # ヘッダーで使い切っていればその更新時刻を使うコメント
+        now = time.time()
+        if self._daily_remaining_header is not None and now < self._daily_reset_at:
+            if self._daily_remaining_header < cost:
+                return self._daily_reset_at
+
+        # 自前の記録では古い投稿が期間外になる時刻を使うコメント
+        over = len(self._post_times) + cost - self._daily_limit
+        if over <= 0:
+            return now
+        return self._post_times[over - 1] + X_DAILY_POST_WINDOW_SECONDS
+
+    # 期間外の投稿記録を捨てるコメント
+    def _prune_post_times(self, now: float) -> None:
+        """24時間より前の投稿記録を捨てる。"""
+
+        # 古い順に捨てるコメント
+        while self._post_times and self._post_times[0] <= now - X_DAILY_POST_WINDOW_SECONDS:
+            self._post_times.popleft()
+
+    # 指標に反映するコメント
+    def _publish_metrics(self) -> None:
+        """現在の残数とトークン数を指標に反映する。"""
+
+        # 分かっている値だけ反映するコメント
+        self._refill()
+        self._metrics.set_gauge("x_post_tokens", round(self._tokens, 3))
+        self._metrics.set_gauge("x_daily_posts_remaining", self.daily_remaining())
+        if self._window_remaining is not None:
+            self._metrics.set_gauge("x_rate_limit_remaining", self._window_remaining)
+            self._metrics.set_gauge("x_rate_limit_reset_at", int(self._window_reset_at))
+
+    # 記録を読み込むコメント
+    def _load(self) -> None:
+        """保存済みの投稿時刻を読み込む。"""
+
+        # ファイルがなければ何もしないコメント
+        if not self._cache_path.is_file():
+            return
+        try:
+            with self._cache_path.open("r", encoding="utf-8") as file_handle:
+                data = json.load(file_handle)
+        except (OSError, json.JSONDecodeError):
+            return
+
+        # 数値の時刻だけ復元するコメント
+        post_times = data.get("post_times") if isinstance(data, dict) else None
+        if isinstance(post_times, list):
+            self._post_times = deque(
+                sorted(float(value) for value in post_times if isinstance(value, (int, float)))
+            )
+        self._prune_post_times(time.time())
+
+    # 記録の保存を予約するコメント
+    def _save(self) -> None:
+        """24時間以内の投稿時刻の保存をスレッドで行うよう予約する。"""
+
+        # 書き込み中の更新は次の書き込みにまとめるコメント
+        self._dirty = True
+        if self._save_task is None:
+            self._save_task = asyncio.create_task(self._save_in_background())
+
+    # 記録を書き込む処理に関するコメント
+    async def _save_in_background(self) -> None:
+        """更新がなくなるまで投稿時刻をスレッドで原子的に書き込む。"""
+
+        # イベントループを止めないよう書き込みはスレッドで行うコメント
+        try:
+            while self._dirty:
+                self._dirty = False
+                payload = {"post_times": list(self._post_times)}
+                try:
+                    await asyncio.to_thread(write_json_atomic, self._cache_path, payload)
+                except OSError:
+                    LOGGER.warning("X投稿の上限記録の保存に失敗しました。")
+        finally:
+            self._save_task = None
+
+    # 終了処理に関するコメント
+    async def close(self) -> None:
+        """書き込み中の記録の保存が終わるまで待つ。"""
+
+        # 書き込み中のタスクがあれば待つコメント
+        if self._save_task is not None:
+            await self._save_task
+
+
+# 同じ内容の投稿の記録を表すデータクラスに関するコメント
+@dataclass(frozen=True)
+class XPostDedupEntry:
+    """最初の投稿ジョブと見た回数を保持する。"""
+
+    # 最初に追加したジョブのIDを保持するコメント
+    job_id: Optional[int]
+    # 有効期間内に見た回数を保持するコメント
+    count: int
+    # 最初に見たUNIX秒を保持するコメント
+    first_seen_at: float
+
+
+# 同じ内容の投稿を見分けるクラスに関するコメント
+class XPostDedupCache:
+    """正規化した本文のハッシュを有効期間と件数の上限付きで保持し、再起動後も引き継ぐ。"""
+
+    # 初期化処理に関するコメント
+    def __init__(self, cache_path: Path, ttl_seconds: float, max_entries: int) -> None:
+        # 最近使った順に並ぶ辞書で記録を保持するコメント
+        self._cache_path = cache_path
+        self._ttl_seconds = ttl_seconds
+        self._max_entries = max_entries
+        self._entries: "OrderedDict[str, XPostDedupEntry]" = OrderedDict()
+        self._save_task: Optional[asyncio.Task[None]] = None
+        self._dirty = False
+        self._load()
+
+    # 既に見た本文か確認するコメント
+    def seen(self, key: str) -> Optional[XPostDedupEntry]:
+        """有効期間内に見た本文なら回数を1増やした記録を返し、そうでなければNoneを返す。"""
+
+        # 期限切れの記録は初めて見たものとして扱うコメント
+        entry = self._entries.get(key)
+        if entry is None or entry.first_seen_at <= time.time() - self._ttl_seconds:
+            return None
+
+        # 回数を増やして最近使ったものとして末尾に移すコメント
+        entry = replace(entry, count=entry.count + 1)
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        self._schedule_save()
+        return entry
+
+    # 本文を記録するコメント
+    def remember(self, key: str, job_id: Optional[int]) -> None:
+        """初めて見た本文を記録する。ジョブIDが決まる前はNoneで予約しておく。"""
+
+        # 上限を超えた分と期限切れの記録を捨ててから保存を予約するコメント
+        self._entries[key] = XPostDedupEntry(job_id=job_id, count=1, first_seen_at=time.time())
+        self._entries.move_to_end(key)
+        self._prune()
+        self._schedule_save()
+
+    # 予約した記録にジョブIDを付けるコメント
+    def assign_job(self, key: str, job_id: Optional[int]) -> int:
+        """予約した記録にジョブIDを付け、予約中に見た回数を含む回数を返す。"""
+
+        # 予約後に捨てられていれば記録し直すコメント
+        entry = self._entries.get(key)
+        if entry is None:
+            self.remember(key, job_id)
+            return 1
+        self._entries[key] = replace(entry, job_id=job_id)
+        self._schedule_save()
+        return entry.count
+
+    # 記録を取り消すコメント
+    def forget(self, key: str) -> None:
+        """キューに追加できなかった本文の予約を取り消す。"""
+
+        # 記録があれば消して保存を予約するコメント
+        if self._entries.pop(key, None) is not None:
+            self._schedule_save()
+
+    # ジョブの記録を取り消すコメント
+    def forget_job(self, job_id: int) -> None:
+        """投稿できずに退避したジョブの記録を取り消し、同じ内容を再び受け付けるようにする。"""
+
+        # 重複の回数で本文が変わっていても見つかるようジョブIDで探すコメント
+        keys = [key for key, entry in self._entries.items() if entry.job_id == job_id]
+        for key in keys:
+            del self._entries[key]
+        if keys:
+            self._schedule_save()
+
+    # 終了処理に関するコメント
+    async def close(self) -> None:
+        """保存待ちの記録を書き出す。"""
+
+        # 待機中の保存を止めてから最後に書き出すコメント
+        if self._save_task is not None:
+            self._save_task.cancel()
+            await asyncio.gather(self._save_task, return_exceptions=True)
+            self._save_task = None
+        if self._dirty:
+            await asyncio.to_thread(self._write, self._snapshot())
+
+    # 保存を予約するコメント
+    def _schedule_save(self) -> None:
+        """連続した更新をまとめて後で保存する。"""
+
+        # 保存待ちのタスクがなければ起動するコメント
+        self._dirty = True
+        if self._save_task is None:
+            self._save_task = asyncio.create_task(self._save_later())
+
+    # まとめて保存する処理に関するコメント
+    async def _save_later(self) -> None:
+        """少し待ってから記録をスレッドで書き出す。"""
+
+        # イベントループを止めないよう書き込みはスレッドで行うコメント
+        try:
+            await asyncio.sleep(X_DEDUP_SAVE_DELAY_SECONDS)
+            self._dirty = False
+            await asyncio.to_thread(self._write, self._snapshot())
+        finally:
+            self._save_task = None
+
+    # 古い記録を捨てるコメント
+    def _prune(self) -> None:
+        """期限切れの記録と、上限を超えた分の最も長く使っていない記録を捨てる。"""
+
+        # 期限切れを捨ててから古い順に減らすコメント
+        expires_before = time.time() - self._ttl_seconds
+        for key in [key for key, entry in self._entries.items() if entry.first_seen_at <= expires_before]:
+            del self._entries[key]
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+    # 記録を読み込むコメント
+    def _load(self) -> None:
+        """保存済みの記録を使った順のまま読み込む。"""
+
+        # ファイルがなければ何もしないコメント
+        if not self._cache_path.is_file():
+            return
+        try:
+            with self._cache_path.open("r", encoding="utf-8") as file_handle:
+                data = json.load(file_handle)
+        except (OSError, json.JSONDecodeError):
+            return
+
+        # 形式の正しい記録だけ復元するコメント
+        entries = data.get("entries") if isinstance(data, dict) else None
+        if not isinstance(entries, list):
+            return
+        for item in entries:
+            try:
+                key, job_id, count, first_seen_at = item
+                self._entries[str(key)] = XPostDedupEntry(
+                    job_id=int(job_id) if job_id is not None else None,
+                    count=int(count),
+                    first_seen_at=float(first_seen_at),
+                )
+            except (TypeError, ValueError):
+                continue
+        self._prune()
+
+    # 保存する内容を作るコメント
+    def _snapshot(self) -> Dict[str, List[list]]:
+        """使った順に並べた記録を保存用の形にする。"""
+
+        # 別スレッドで書き出す間に変更されないよう写しを作るコメント
+        return {
+            "entries": [
+                [key, entry.job_id, entry.count, entry.first_seen_at] for key, entry in self._entries.items()
+            ]
+        }
+
+    # 記録を書き込むコメント
+    def _write(self, payload: Dict[str, List[list]]) -> None:
+        """保存用の記録を原子的に書き込む。"""
+
+        # 失敗しても投稿は続けるコメント
+        try:
+            write_json_atomic(self._cache_path, payload)
+        except OSError:
+            LOGGER.warning("重複投稿の記録の保存に失敗しました。")
+
+
+# X投稿を順番に処理するクラスに関するコメント
+class XPoster:
+    """Xへの投稿をキューで順次実行するクラス。"""
+
+    # 初期化処理に関するコメント
+    def __init__(
+        self,
+        client: AsyncXClient,
+        rate_limiter: XPostRateLimiter,
+        queue_size: int,
+        reply_setting: str,
+        reply_mentions: Tuple[str, ...],
+        store: XPostJobStore,
+        media_dir: Path,
+        metrics: MetricsRegistry,
+        max_attempts: int,
+        dead_letter_path: Path,
+        dedup: Optional[XPostDedupCache] = None,
+        dedup_merge_policy: str = X_DEDUP_POLICY_DROP,
+    ) -> None:
+        # クライアントと制御用の値を保持するコメント
+        self._client = client
+        self._rate_limiter = rate_limiter
+        self._queue_size = queue_size
+        self._max_attempts = max_attempts
+        self._dead_letter_path = dead_letter_path
+
+        # 同じ内容の投稿をキューに入れる前に見分ける記録を保持するコメント
+        self._dedup = dedup
+        self._dedup_merge_policy = dedup_merge_policy
+        self._task: Optional[asyncio.Task[None]] = None
+        self._reply_setting = reply_setting
+        self._reply_mentions = reply_mentions
+
+        # ジョブはメモリに持たず永続キューから1件ずつ取り出すコメント
+        self._store = store
+        self._media_dir = media_dir
+        self._wake_event = asyncio.Event()
+        self._closing = False
+        self._last_compacted_at = time.monotonic()
+
+        # レーンごとの残数と背圧の状態を保持するコメント
+        self._metrics = metrics
+        self._lane_depths = {lane: 0 for lane in X_LANE_PRIORITIES}
+        self._backpressured = False
+        self._backpressure_callbacks: List[Callable[[bool], None]] = []
+
+        # 投稿前に始めたメディアアップロードをジョブごとに保持するコメント
+        self._upload_semaphore = asyncio.Semaphore(X_MEDIA_UPLOAD_CONCURRENCY)
+        self._uploads: Dict[int, asyncio.Task[Optional[str]]] = {}
+
+    # 背圧の状態を返すコメント
+    @property
+    def backpressured(self) -> bool:
+        """チャットレーンの残数が上限に達していればTrueを返す。"""
+
+        # 現在の状態を返すコメント
+        return self._backpressured
+
+    # 投稿上限の逼迫状態を返すコメント
+    @property
+    def rate_limited(self) -> bool:
+        """X APIの残数が少なく投稿を絞っていればTrueを返す。"""
+
+        # 送信時期の判定に任せるコメント
+        return self._rate_limiter.is_constrained()
+
+    # レーンごとの残数を返すコメント
+    def lane_depths(self) -> Dict[str, int]:
+        """投稿待ちと処理中のジョブ数をレーンごとに返す。"""
+
+        # 内部の値を書き換えられないよう写しを返すコメント
+        return dict(self._lane_depths)
+
+    # 背圧の通知先を登録するコメント
+    def add_backpressure_callback(self, callback: Callable[[bool], None]) -> None:
+        """背圧の開始と解除を受け取る関数を登録する。"""
+
+        # 登録順に通知するため末尾に追加するコメント
+        self._backpressure_callbacks.append(callback)
+
+    # ワーカー開始のためのコメント
+    def start(self) -> None:
+        """中断したジョブを戻してから投稿ワーカーを起動する。"""
+
+        # 二重起動を避けるコメント
+        if self._task is not None:
+            return
+
+        # 前回の実行で処理中のまま残ったジョブを再開するコメント
+        recovered = self._store.recover()
+        self._lane_depths = self._store.count_pending_by_lane()
+        pending = sum(self._lane_depths.values())
+        if pending:
+            LOGGER.info("未投稿のジョブを再開します: %s件 (処理中から復帰: %s件)", pending, recovered)
+        self._update_lane_depth(X_LANE_CHAT, 0)
+
+        # 画像付きの投稿待ちは投稿間隔を待つ間にアップロードしておくコメント
+        for job in self._store.pending_media_jobs():
+            self._start_upload(job)
+        self._task = asyncio.create_task(self._worker())
 
     # キューに投稿を追加するためのコメント
-    async def enqueue_text(self, text: str) -> None:
-        """テキスト投稿をキューに追加する。"""
+    async def enqueue_text(
+        self,
+        text: str,
+        lane: str = X_LANE_CHAT,
+        reply_texts: Tuple[str, ...] = (),
+    ) -> None:
+        """テキスト投稿を指定したレーンのキューに追加し、続きがあれば返信スレッドにする。"""
 
         # 空文字は無視するコメント
         if not text:
             return
-        await self._enqueue_job(XPostJob(text=text))
+        await self._enqueue_job(XPostJob(text=text, lane=lane, reply_texts=reply_texts))
 
     # 画像付き投稿を追加するコメント
-    async def enqueue_media(self, text: str, media_path: str, cleanup_path: Optional[str]) -> None:
-        """画像付き投稿をキューに追加する。"""
+    async def enqueue_media(
+        self,
+        text: str,
+        media_path: str,
+        cleanup_path: Optional[str],
+        lane: str = X_LANE_SUMMARY,
+    ) -> None:
+        """画像付き投稿を指定したレーンのキューに追加する。"""
 
         # 投稿条件を簡易チェックするコメント
         if not text or not media_path:
             return
-        await self._enqueue_job(XPostJob(text=text, media_path=media_path, cleanup_path=cleanup_path))
+
+        # 投稿後に削除する一時画像は再起動後も残る場所に移すコメント
+        if cleanup_path and cleanup_path == media_path:
+            media_path = await asyncio.to_thread(self._persist_media, media_path)
+            cleanup_path = media_path
+        await self._enqueue_job(
+            XPostJob(text=text, media_path=media_path, cleanup_path=cleanup_path, lane=lane)
+        )
 
     # 共通のキュー追加処理に関するコメント
     async def _enqueue_job(self, job: XPostJob) -> None:
-        """投稿ジョブをキューに追加する。"""
+        """同じ内容の投稿でなければ、投稿ジョブを破棄せず永続キューに追加する。"""
+
+        # 有効期間内に同じ内容を受け付けていればAPIを呼ばずに済ませるコメント
+        dedup_key = build_dedup_key(job.text, job.reply_texts)
+        if self._dedup is not None:
+            entry = self._dedup.seen(dedup_key)
+            if entry is not None:
+                await self._merge_duplicate(job, entry)
+                return
 
-        # キューが満杯の場合に落とすコメント
+            # 追加が終わるまでに届いた同じ内容も見分けられるよう先に予約するコメント
+            self._dedup.remember(dedup_key, None)
+
+        # 上限を超えても破棄せずディスクに積み、背圧で知らせるコメント
         try:
-            self._queue.put_nowait(job)
-        except asyncio.QueueFull:
-            LOGGER.info("投稿キューが満杯のためメッセージを破棄しました。")
+            job = await asyncio.to_thread(self._store.add, job)
+        except Exception:
+            if self._dedup is not None:
+                self._dedup.forget(dedup_key)
+            raise
+        self._metrics.increment(f"x_jobs_enqueued.{job.lane}")
+
+        # 予約中に届いた同じ内容の回数を本文に反映するコメント
+        if self._dedup is not None:
+            count = self._dedup.assign_job(dedup_key, job.job_id)
+            if count > 1 and self._dedup_merge_policy == X_DEDUP_POLICY_COUNT and job.job_id is not None:
+                await asyncio.to_thread(self._store.set_duplicate_count, job.job_id, count)
+
+        # 画像は投稿の順番を待たずにアップロードを始めるコメント
+        if job.media_path:
+            self._start_upload(job)
+        self._update_lane_depth(job.lane, 1)
+        self._wake_event.set()
+
+    # 同じ内容の投稿をまとめる処理に関するコメント
+    async def _merge_duplicate(self, job: XPostJob, entry: XPostDedupEntry) -> None:
+        """重複した投稿を捨て、設定に応じて投稿待ちの元のジョブに回数を付ける。"""
+
+        # 元のジョブがまだ投稿待ちなら本文の回数を更新するコメント
+        merged = False
+        if self._dedup_merge_policy == X_DEDUP_POLICY_COUNT and entry.job_id is not None:
+            merged = await asyncio.to_thread(self._store.set_duplicate_count, entry.job_id, entry.count)
+        self._metrics.increment("x_jobs_deduplicated")
+        if merged:
+            LOGGER.info("同じ内容の投稿を投稿待ちの投稿にまとめました: %s回目", entry.count)
+        else:
+            LOGGER.info("同じ内容の投稿を省略しました: %s回目", entry.count)
+
+        # 捨てた投稿の画像を削除するコメント
+        if job.cleanup_path:
+            self._remove_cleanup_file(job.cleanup_path)
+
+    # レーンの残数を更新する処理に関するコメント
+    def _update_lane_depth(self, lane: str, delta: int) -> None:
+        """レーンの残数を増減し、指標と背圧の状態に反映する。"""
+
+        # 残数を指標に反映するコメント
+        self._lane_depths[lane] = max(0, self._lane_depths.get(lane, 0) + delta)
+        for name, depth in self._lane_depths.items():
+            self._metrics.set_gauge(f"x_queue_depth.{name}", depth)
+
+        # 上限で背圧を開始し、半分まで減ったら解除するコメント
+        chat_depth = self._lane_depths[X_LANE_CHAT]
+        if not self._backpressured and chat_depth >= self._queue_size:
+            self._set_backpressure(True)
+        elif self._backpressured and chat_depth <= self._queue_size * X_BACKPRESSURE_RELEASE_RATIO:
+            self._set_backpressure(False)
+
+    # 背圧の状態を切り替える処理に関するコメント
+    def _set_backpressure(self, active: bool) -> None:
+        """背圧の状態を切り替えて登録先に通知する。"""
+
+        # 状態を記録してログに残すコメント
+        self._backpressured = active
+        self._metrics.set_gauge("x_queue_backpressure", 1 if active else 0)
+        if active:
+            LOGGER.warning(
+                "投稿キューのチャット残数が上限に達したため背圧を開始します: %s件",
+                self._lane_depths[X_LANE_CHAT],
+            )
+        else:
+            LOGGER.info("投稿キューのチャット残数が減ったため背圧を解除します。")
+
+        # 通知先の失敗で投稿処理を止めないコメント
+        for callback in self._backpressure_callbacks:
+            try:
+                callback(active)
+            except Exception as exc:
+                LOGGER.exception("背圧の通知に失敗しました: %s", exc)
+
+    # 先行アップロードを始める処理に関するコメント
+    def _start_upload(self, job: XPostJob) -> None:
+        """ジョブの画像のアップロードをバックグラウンドで始める。"""
+
+        # IDのあるジョブだけ重複なく始めるコメント
+        if job.job_id is None or not job.media_path or job.job_id in self._uploads:
+            return
+        self._uploads[job.job_id] = asyncio.create_task(self._upload_ahead(job.job_id, job.media_path))
+
+    # 先行アップロードの処理に関するコメント
+    async def _upload_ahead(self, job_id: int, media_path: str) -> Optional[str]:
+        """同時実行数を抑えて画像をアップロードし、メディアIDを保存して返す。"""
+
+        # 失敗しても投稿時にアップロードし直せるようNoneを返すコメント
+        async with self._upload_semaphore:
+            try:
+                upload = await self._client.upload_media(media_path)
+            except Exception as exc:
+                LOGGER.warning("画像の先行アップロードに失敗しました: %s", exc)
+                self._metrics.increment("x_media_upload_ahead_failures")
+                return None
+
+        # 再起動後も使えるよう期限付きで保存するコメント
+        await asyncio.to_thread(self._store.set_media_id, job_id, upload)
+        self._metrics.increment("x_media_uploaded_ahead")
+        return upload.media_id
+
+    # 投稿に使うメディアIDを用意する処理に関するコメント
+    async def _resolve_media_id(self, job: XPostJob) -> str:
+        """保存済みか先行アップロード中のメディアIDを使い、なければその場でアップロードする。"""
+
+        # 保存済みの有効なIDを優先するコメント
+        task = self._uploads.pop(job.job_id, None) if job.job_id is not None else None
+        if job.media_id:
+            if task is not None:
+                task.cancel()
+            return job.media_id
+
+        # 先行アップロードの結果を待つコメント
+        if task is not None:
+            media_id = await task
+            if media_id:
+                return media_id
+
+        # 先行アップロードがなければ投稿前にアップロードするコメント
+        upload = await self._client.upload_media(job.media_path or "")
+        if job.job_id is not None:
+            await asyncio.to_thread(self._store.set_media_id, job.job_id, upload)
+        return upload.media_id
+
+    # 画像を永続キュー用のディレクトリに移す関数に関するコメント
+    def _persist_media(self, media_path: str) -> str:
+        """一時画像を投稿待ち画像のディレクトリに移動して新しいパスを返す。"""
+
+        # 衝突しない名前で移動するコメント
+        self._media_dir.mkdir(parents=True, exist_ok=True)
+        destination = self._media_dir / f"{uuid.uuid4().hex}{Path(media_path).suffix}"
+        shutil.move(media_path, destination)
+        return str(destination)
 
     # ワーカーの終了処理に関するコメント
     async def close(self) -> None:
-        """投稿ワーカーを終了する。"""
+        """すぐに投稿できるジョブを処理し、投稿枠を待つジョブは次回起動時に回してワーカーを終了する。"""
+
+        # 保存待ちの重複投稿の記録を書き出すコメント
+        if self._dedup is not None:
+            await self._dedup.close()
 
         # タスクがない場合は何もしないコメント
         if self._task is None:
             return
-        await self._queue.put(None)
+        self._closing = True
+        self._wake_event.set()
         await self._task
 
-    # 投稿間隔を守るためのコメント
-    async def _wait_for_interval(self) -> None:
-        """設定された投稿間隔を満たすまで待機する。"""
+        # 後回しになったジョブの先行アップロードを止めるコメント
+        for task in self._uploads.values():
+            task.cancel()
+        await asyncio.gather(*self._uploads.values(), return_exceptions=True)
+        self._uploads.clear()
+        await self._rate_limiter.close()
+        self._store.close()
 
-        # 前回投稿時刻との差分を計算するコメント
-        elapsed = time.monotonic() - self._last_post_time
-        remaining = self._interval_seconds - elapsed
-        if remaining > 0:
-            await asyncio.sleep(remaining)
+    # 投稿間隔を守るためのコメント
+    async def _wait_for_budget(self, cost: int) -> bool:
+        """指定件数を投稿できるまで待機し、終了要求で打ち切った場合はFalseを返す。"""
+
+        # 上限の更新を待つ間は指標で分かるよう記録するコメント
+        delay = self._rate_limiter.delay_for(cost)
+        if delay <= 0:
+            return True
+        self._metrics.set_gauge("x_post_wait_seconds", round(delay, 3))
+        try:
+            # ジョブは永続化されているため終了時は枠の更新を待たずに戻るコメント
+            while delay > 0:
+                if self._closing:
+                    return False
+                try:
+                    await asyncio.wait_for(self._wake_event.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake_event.clear()
+                delay = self._rate_limiter.delay_for(cost)
+            return True
+        finally:
+            self._metrics.set_gauge("x_post_wait_seconds", 0)
 
     # 実際にXに投稿する処理に関するコメント
-    async def _post_to_x(self, job: XPostJob) -> None:
-        """XのAPIで投稿を行う。"""
-
-        # 投稿前の間隔調整に関するコメント
-        await self._wait_for_interval()
+    async def _post_to_x(self, job: XPostJob) -> str:
+        """XのAPIで投稿を行い、ジョブの次の状態を返す。"""
+
+        # スレッドの残り全体を投稿できる残数を待ち、終了時は次回起動時に回すコメント
+        if not await self._wait_for_budget((0 if job.thread_parent_id else 1) + len(job.reply_texts)):
+            if job.job_id is not None:
+                await asyncio.to_thread(self._store.defer, job.job_id)
+            return X_JOB_STATUS_PENDING
+        status = X_JOB_STATUS_FAILED
+        parent_id = job.thread_parent_id
+        remaining = job.reply_texts
         try:
-            # 返信対象のメンションを付けるコメント
-            post_text = job.text
-            if self._reply_setting == "mentionedUsers":
-                post_text = apply_reply_mentions(post_text, self._reply_mentions)
-            # ハッシュタグを付けるコメント
-            post_text = append_hashtag(post_text, POST_HASHTAG, MAX_TWEET_LENGTH)
-
-            if job.media_path:
-                # メディアをアップロードするコメント
-                media = await asyncio.to_thread(self._media_client.media_upload, job.media_path)
-                media_id = getattr(media, "media_id_string", None) or str(media.media_id)
-                await asyncio.to_thread(
-                    self._client.create_tweet,
+            # 先頭の投稿が済んでいなければ投稿するコメント
+            if parent_id is None:
+                # 返信対象のメンションを付けるコメント
+                post_text = job.text
+                if self._reply_setting == "mentionedUsers":
+                    post_text = apply_reply_mentions(post_text, self._reply_mentions)
+                # ハッシュタグを付けるコメント
+                post_text = append_hashtag(post_text, POST_HASHTAG, MAX_TWEET_LENGTH)
+
+                # 画像は先行アップロード済みのメディアIDを使うコメント
+                media_ids = [await self._resolve_media_id(job)] if job.media_path else None
+                result = await self._client.create_tweet(
                     text=post_text,
-                    media_ids=[media_id],
+                    media_ids=media_ids,
                     reply_settings=self._reply_setting,
                 )
-            else:
-                # テキストのみ投稿するコメント
-                await asyncio.to_thread(
-                    self._client.create_tweet,
-                    text=post_text,
+                self._rate_limiter.record_post(result.headers)
+                parent_id = result.tweet_id
+
+            # 続きの本文を直前の投稿への返信として繋げるコメント
+            while remaining:
+                reply = await self._client.create_tweet(
+                    text=remaining[0],
                     reply_settings=self._reply_setting,
+                    in_reply_to_tweet_id=parent_id,
                 )
-            self._last_post_time = time.monotonic()
+                self._rate_limiter.record_post(reply.headers)
+                parent_id = reply.tweet_id
+                remaining = remaining[1:]
             LOGGER.info("Xに投稿しました。")
+            status = X_JOB_STATUS_DONE
         except Exception as exc:
-            LOGGER.exception("Xへの投稿に失敗しました: %s", exc)
+            # 途中まで投稿したスレッドは続きからやり直せるよう進み具合を残すコメント
+            if parent_id is not None and parent_id != job.thread_parent_id:
+                job = replace(job, thread_parent_id=parent_id, reply_texts=remaining)
+                if job.job_id is not None:
+                    await asyncio.to_thread(
+                        self._store.record_thread_progress, job.job_id, parent_id, remaining
+                    )
+            status = await self._handle_failure(job, exc)
         finally:
-            # 後始末が必要なファイルを削除するコメント
-            if job.cleanup_path:
-                try:
-                    os.remove(job.cleanup_path)
-                except OSError:
-                    LOGGER.warning("投稿後のファイル削除に失敗しました: %s", job.cleanup_path)
+            # 投稿を終えたジョブの後始末が必要なファイルを削除するコメント
+            if job.cleanup_path and status == X_JOB_STATUS_DONE:
+                self._remove_cleanup_file(job.cleanup_path)
+        return status
+
+    # 投稿の失敗を処理する関数に関するコメント
+    async def _handle_failure(self, job: XPostJob, exc: Exception) -> str:
+        """失敗を分類して再試行か見送りか退避かを決め、ジョブの次の状態を返す。"""
+
+        # 上限超過はジョブを戻して枠の更新を待つコメント
+        category = classify_x_error(exc)
+        if category == X_ERROR_RATE_LIMIT and isinstance(exc, XAPIError):
+            self._rate_limiter.record_rate_limited(exc.headers)
+            if job.job_id is not None:
+                await asyncio.to_thread(self._store.defer, job.job_id)
+            self._metrics.increment("x_jobs_deferred")
+            return X_JOB_STATUS_PENDING
+
+        # 同じ内容が既に投稿されていれば完了として扱うコメント
+        if category == X_ERROR_DUPLICATE:
+            LOGGER.warning("同じ内容が投稿済みのため完了として扱います: %s", exc)
+            self._metrics.increment("x_jobs_duplicate")
+            return X_JOB_STATUS_DONE
+
+        # 一時的な失敗は上限回数まで間隔を空けて再試行するコメント
+        if category == X_ERROR_RETRYABLE and job.attempts < self._max_attempts and job.job_id is not None:
+            delay = compute_x_retry_delay(job.attempts)
+            LOGGER.warning(
+                "Xへの投稿に失敗したため%.0f秒後に再試行します (%s/%s回目): %s",
+                delay,
+                job.attempts,
+                self._max_attempts,
+                exc,
+            )
+            await asyncio.to_thread(self._store.schedule_retry, job.job_id, time.time() + delay, str(exc))
+            self._metrics.increment("x_jobs_retried")
+            self._metrics.increment(f"x_jobs_retried.{category}")
+            return X_JOB_STATUS_PENDING
+
+        # 再試行しても投稿できないジョブは画像を残したまま退避するコメント
+        if category == X_ERROR_AUTH:
+            LOGGER.error("Xの認証に失敗しました。APIキーとアクセストークンを確認してください: %s", exc)
+        else:
+            LOGGER.error("Xへの投稿を諦めて退避します (%s回試行): %s", job.attempts, exc)
+        try:
+            await asyncio.to_thread(self._write_dead_letter, job, category, str(exc))
+        except OSError:
+            LOGGER.exception("退避した投稿の保存に失敗しました: %s", self._dead_letter_path)
+        if job.job_id is not None:
+            await asyncio.to_thread(self._store.mark, job.job_id, X_JOB_STATUS_FAILED, str(exc))
+
+            # 投稿されなかった内容を有効期間中ずっと省略しないよう重複の記録を消すコメント
+            if self._dedup is not None:
+                self._dedup.forget_job(job.job_id)
+        self._metrics.increment("x_jobs_dead_lettered")
+        self._metrics.increment(f"x_jobs_dead_lettered.{category}")
+        return X_JOB_STATUS_FAILED
+
+    # 退避した投稿を書き出す関数に関するコメント
+    def _write_dead_letter(self, job: XPostJob, category: str, error: str) -> None:
+        """再投入に必要な内容と失敗理由を退避ファイルに1行追記する。"""
+
+        # 1行1件のJSONで追記するコメント
+        record = {
+            "text": job.text,
+            "media_path": job.media_path,
+            "cleanup_path": job.cleanup_path,
+            "lane": job.lane,
+            "reply_texts": list(job.reply_texts),
+            "thread_parent_id": job.thread_parent_id,
+            "attempts": job.attempts,
+            "category": category,
+            "error": error,
+            "failed_at": datetime.now(timezone.utc).isoformat(),
+        }
+        self._dead_letter_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._dead_letter_path.open("a", encoding="utf-8") as file_handle:
+            file_handle.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    # 後始末のファイルを削除する関数に関するコメント
+    def _remove_cleanup_file(self, cleanup_path: str) -> None:
+        """投稿に使ったファイルを削除する。"""
+
+        # 削除に失敗しても処理は続けるコメント
+        try:
+            os.remove(cleanup_path)
+        except OSError:
+            LOGGER.warning("投稿後のファイル削除に失敗しました: %s", cleanup_path)
 
     # キューから順に投稿するワーカーに関するコメント
     async def _worker(self) -> None:
-        """キューの内容を順次Xに投稿する。"""
+        """永続キューの内容を古い順にXに投稿する。"""
 
         # キューの受信ループに関するコメント
         while True:
-            job = await self._queue.get()
+            # データベースやファイルの失敗で投稿が止まったままにならないよう待ってから続けるコメント
             try:
-                if job is None:
+                if not await self._process_next_job():
                     return
-                await self._post_to_x(job)
-            finally:
-                self._queue.task_done()
+            except Exception as exc:
+                LOGGER.exception("投稿ワーカーで例外が発生しました: %s", exc)
+                self._metrics.increment("x_worker_errors")
+                if self._closing:
+                    return
+                await asyncio.sleep(X_WORKER_ERROR_BACKOFF_SECONDS)
+
+    # ジョブを1件処理する関数に関するコメント
+    async def _process_next_job(self) -> bool:
+        """次のジョブを1件投稿するか新しいジョブを待ち、終了するときはFalseを返す。"""
+
+        # 定期的に完了済みの行を削除するコメント
+        await self._compact_if_due()
+
+        # 次の1件を送れるまで待ち、終了時に枠がなければ取り出さずに終えるコメント
+        if not await self._wait_for_budget(1):
+            return False
+
+        # 残数が少なければチャットを後回しにして次のジョブを取り出すコメント
+        self._wake_event.clear()
+        lanes = self._rate_limiter.allowed_lanes()
+        job = await asyncio.to_thread(self._store.claim_next, lanes)
+        if job is None:
+            # 後回しのチャットや再試行待ちが残っている間は終了時も待たないコメント
+            deferred = len(lanes) < len(X_LANE_PRIORITIES)
+            next_retry_at = await asyncio.to_thread(self._store.next_retry_at)
+            if self._closing:
+                if deferred and self._lane_depths[X_LANE_CHAT]:
+                    LOGGER.info("後回しのチャット%s件は次回起動時に投稿します。", self._lane_depths[X_LANE_CHAT])
+                if next_retry_at is not None:
+                    LOGGER.info("再試行待ちのジョブは次回起動時に投稿します。")
+                return False
+            timeout = X_DEFERRED_RECHECK_SECONDS if deferred else X_QUEUE_IDLE_RECHECK_SECONDS
+            if next_retry_at is not None:
+                timeout = min(timeout, max(next_retry_at - time.time(), 0.0))
+            try:
+                await asyncio.wait_for(self._wake_event.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                # 退避から戻されたジョブも数えるよう残数を読み直すコメント
+                self._lane_depths = await asyncio.to_thread(self._store.count_pending_by_lane)
+                self._update_lane_depth(X_LANE_CHAT, 0)
+            return True
+
+        # 投稿結果を記録するコメント
+        status = await self._post_to_x(job)
+        if status == X_JOB_STATUS_PENDING:
+            # 終了時は戻したジョブを取り出し直さないコメント
+            return not self._closing
+        if status == X_JOB_STATUS_DONE:
+            if job.job_id is not None:
+                await asyncio.to_thread(self._store.mark, job.job_id, status)
+            self._metrics.increment("x_jobs_posted")
+        self._update_lane_depth(job.lane, -1)
+        return True
+
+    # 完了済みの行を定期的に削除する処理に関するコメント
+    async def _compact_if_due(self) -> None:
+        """前回から一定時間が経っていれば古い完了済みの行を削除する。"""
+
+        # 間隔に満たなければ何もしないコメント
+        if time.monotonic() - self._last_compacted_at < X_QUEUE_COMPACT_INTERVAL_SECONDS:
+            return
+        self._last_compacted_at = time.monotonic()
+
+        # 保持期間を過ぎた行を削除するコメント
+        try:
+            removed = await asyncio.to_thread(self._store.compact, time.time() - X_QUEUE_RETENTION_SECONDS)
+        except sqlite3.Error as exc:
+            LOGGER.exception("投稿キューの整理に失敗しました: %s", exc)
+            return
+        if removed:
+            LOGGER.info("投稿キューから完了済みのジョブを削除しました: %s件", removed)
+
+
+# 退避した投稿を投稿キューに戻す関数に関するコメント
+def redrive_dead_letters(store: XPostJobStore, dead_letter_path: Path) -> int:
+    """退避ファイルの投稿を投稿待ちとしてキューに戻し、戻した件数を返す。"""
+
+    # 稼働中のBotが追記する分と混ざらないよう別名に移してから読むコメント
+    redrive_path = dead_letter_path.with_name(dead_letter_path.name + ".redrive")
+    if not redrive_path.exists():
+        if not dead_letter_path.exists():
+            return 0
+        os.replace(dead_letter_path, redrive_path)
+
+    # 画像が残っている投稿だけを戻し、戻せないものは退避ファイルに残すコメント
+    redriven = 0
+    kept: List[str] = []
+    with redrive_path.open("r", encoding="utf-8") as file_handle:
+        for line in file_handle:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                job = XPostJob(
+                    text=str(record["text"]),
+                    media_path=record.get("media_path"),
+                    cleanup_path=record.get("cleanup_path"),
+                    lane=record.get("lane") if record.get("lane") in X_LANE_PRIORITIES else X_LANE_CHAT,
+                    reply_texts=tuple(str(text) for text in record.get("reply_texts") or ()),
+                    thread_parent_id=record.get("thread_parent_id"),
+                )
+            except (ValueError, KeyError, TypeError, AttributeError):
+                LOGGER.warning("退避ファイルの読み込めない行を残します: %s", line.strip()[:200])
+                kept.append(line)
+                continue
+            if job.media_path and not Path(job.media_path).is_file():
+                LOGGER.warning("画像が見つからない投稿を退避ファイルに残します: %s", job.media_path)
+                kept.append(line)
+                continue
+            store.add(job)
+            redriven += 1
+
+    # 戻せなかった行を退避ファイルに追記し直すコメント
+    if kept:
+        with dead_letter_path.open("a", encoding="utf-8") as file_handle:
+            file_handle.writelines(line if line.endswith("\n") else line + "\n" for line in kept)
+    redrive_path.unlink()
+    return redriven
 
 
 # Twitch IRCの接続情報を組み立てる関数に関するコメント
@@ -1442,28 +4548,535 @@ async def build_twitch_credentials(
     return normalize_twitch_token(access_token), nick
 
 
-# Twitch IRCのタグを除去する関数に関するコメント
-def strip_irc_tags(line: str) -> str:
-    """IRCメッセージ先頭のタグ情報を除去する。"""
+# デコード前のIRC行を絞り込む関数に関するコメント
+def is_candidate_irc_line(
+    raw_line: bytes,
+    target_nicks: FrozenSet[bytes] = TARGET_TWITCH_NICKS_BYTES,
+) -> bool:
+    """対象ユーザー以外のPRIVMSGをデコードせずに除外する。"""
+
+    # タグがある場合はプレフィックスの開始位置まで進めるコメント
+    prefix_start = 0
+    if raw_line.startswith(b"@"):
+        prefix_start = raw_line.find(b" ") + 1
+        if prefix_start == 0:
+            return False
+
+    # PRIVMSG以外の制御行は常に後段で処理するコメント
+    prefix_end = raw_line.find(b" ", prefix_start)
+    if prefix_end < 0 or not raw_line.startswith(b"PRIVMSG ", prefix_end + 1):
+        return True
+
+    # プレフィックスのニックネームを集合で照合するコメント
+    nick_end = raw_line.find(b"!", prefix_start, prefix_end)
+    return nick_end > 0 and raw_line[prefix_start + 1:nick_end] in target_nicks
+
+
+# 受信行のメッセージIDを取り出す関数に関するコメント
+def extract_irc_message_id(raw_line: bytes) -> Optional[bytes]:
+    """受信行をデコードせずにタグのidの値を返す。"""
+
+    # タグのない行はIDを持たないコメント
+    if not raw_line.startswith(b"@"):
+        return None
+    tags_end = raw_line.find(b" ")
+    if tags_end < 0:
+        return None
 
-    # タグがない場合はそのまま返すコメント
-    if not line.startswith("@"):
-        return line
+    # 先頭か区切りの直後にあるidのタグを探すコメント
+    if raw_line.startswith(b"@id=", 0, tags_end):
+        value_start = 4
+    else:
+        value_start = raw_line.find(b";id=", 0, tags_end)
+        if value_start < 0:
+            return None
+        value_start += 4
+    value_end = raw_line.find(b";", value_start, tags_end)
+    message_id = raw_line[value_start:value_end if value_end >= 0 else tags_end]
+    return message_id or None
+
+
+# IRCv3タグ値のエスケープを戻す関数に関するコメント
+def unescape_irc_tag_value(value: str) -> str:
+    """IRCv3のタグ値に含まれるエスケープ表記を元の文字に戻す。"""
+
+    # エスケープがなければそのまま返すコメント
+    if "\\" not in value:
+        return value
+
+    # 1文字ずつ読み進めて置き換えるコメント
+    characters: List[str] = []
+    index = 0
+    length = len(value)
+    while index < length:
+        character = value[index]
+        if character == "\\":
+            index += 1
+            if index < length:
+                characters.append(IRC_TAG_ESCAPES.get(value[index], value[index]))
+        else:
+            characters.append(character)
+        index += 1
+    return "".join(characters)
 
-    # 最初の空白までをタグとして除去するコメント
-    parts = line.split(" ", 1)
-    return parts[1] if len(parts) == 2 else ""
 
+# IRCv3メッセージを表すクラスに関するコメント
+class IRCMessage:
+    """タグとプレフィックスとコマンドと引数を保持する軽量なメッセージ。"""
 
-# PRIVMSGを解析する関数に関するコメント
-def parse_privmsg(line: str) -> Optional[Tuple[str, str, str]]:
-    """IRCのPRIVMSGからユーザー名とチャンネルと本文を取り出す。"""
+    # 属性を固定してインスタンスを軽くするコメント
+    __slots__ = ("line", "tags_end", "prefix", "command", "params", "_tags")
 
-    # 正規表現でメッセージを解析するコメント
-    match = PRIVMSG_PATTERN.match(line)
-    if not match:
+    # 初期化処理に関するコメント
+    def __init__(
+        self,
+        line: str,
+        tags_end: int,
+        prefix: Optional[str],
+        command: str,
+        params: List[str],
+    ) -> None:
+        # 元の行とタグの終端位置を保持してタグの複製を避けるコメント
+        self.line = line
+        self.tags_end = tags_end
+        self.prefix = prefix
+        self.command = command
+        self.params = params
+        self._tags: Optional[Dict[str, str]] = None
+
+    # タグ部分の文字列を返すコメント
+    @property
+    def raw_tags(self) -> Optional[str]:
+        """先頭の@を除いたタグ部分を返す。"""
+
+        # タグがなければNoneを返すコメント
+        if not self.tags_end:
+            return None
+        return self.line[1:self.tags_end]
+
+    # タグを必要になった時点で解析するコメント
+    @property
+    def tags(self) -> Dict[str, str]:
+        """IRCv3タグを辞書として返す。"""
+
+        # 初回アクセス時だけ解析するコメント
+        if self._tags is None:
+            tags: Dict[str, str] = {}
+            raw_tags = self.raw_tags
+            if raw_tags:
+                for item in raw_tags.split(";"):
+                    key, _, value = item.partition("=")
+                    tags[key] = unescape_irc_tag_value(value)
+            self._tags = tags
+        return self._tags
+
+    # 単一のタグを取得するコメント
+    def tag(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        """指定したタグの値を返す。"""
+
+        # 解析済みならその結果を使うコメント
+        if self._tags is not None:
+            value = self._tags.get(key)
+            return value if value else default
+        if not self.tags_end:
+            return default
+
+        # 全体を解析せずに元の行から該当するタグだけを探すコメント
+        line = self.line
+        needle = f"{key}="
+        if line.startswith(needle, 1):
+            start = 1
+        else:
+            start = line.find(f";{needle}", 1, self.tags_end) + 1
+            if start == 0:
+                return default
+        start += len(needle)
+        end = line.find(";", start, self.tags_end)
+        value = line[start:self.tags_end if end < 0 else end]
+
+        # 空文字は未設定として扱うコメント
+        return unescape_irc_tag_value(value) if value else default
+
+    # 送信者のニックネームを返すコメント
+    @property
+    def nick(self) -> Optional[str]:
+        """プレフィックスからニックネームを取り出す。"""
+
+        # サーバー発のメッセージはそのまま返すコメント
+        prefix = self.prefix
+        if prefix is None:
+            return None
+        end = prefix.find("!")
+        return prefix if end < 0 else prefix[:end]
+
+    # 宛先チャンネルを返すコメント
+    @property
+    def channel(self) -> Optional[str]:
+        """先頭の引数が#から始まる場合にチャンネル名を返す。"""
+
+        # チャンネル宛てでなければNoneを返すコメント
+        if not self.params or not self.params[0].startswith("#"):
+            return None
+        return self.params[0][1:]
+
+    # 末尾の引数を返すコメント
+    @property
+    def trailing(self) -> str:
+        """最後の引数を本文として返す。"""
+
+        # 引数がなければ空文字を返すコメント
+        return self.params[-1] if self.params else ""
+
+
+# IRCv3メッセージを解析する関数に関するコメント
+def parse_irc_message(line: str) -> Optional[IRCMessage]:
+    """1行のIRCメッセージを分割してIRCMessageを返す。"""
+
+    # タグは終端位置だけを記録して複製しないコメント
+    position = 0
+    tags_end = 0
+    if line.startswith("@"):
+        tags_end = line.find(" ")
+        if tags_end < 0:
+            return None
+        position = tags_end + 1
+
+    # プレフィックスを切り出すコメント
+    prefix: Optional[str] = None
+    if line.startswith(":", position):
+        end = line.find(" ", position)
+        if end < 0:
+            return None
+        prefix = line[position + 1:end]
+        position = end + 1
+
+    # 末尾引数の手前までを中間引数として分割するコメント
+    trailing_start = line.find(" :", position)
+    if trailing_start < 0:
+        params = line[position:].split()
+    else:
+        params = line[position:trailing_start].split()
+    if not params or params[0].startswith(":"):
         return None
-    return match.group("user"), match.group("channel"), match.group("message")
+    command = params.pop(0)
+
+    # 末尾引数を追加するコメント
+    if trailing_start >= 0:
+        params.append(line[trailing_start + 2:])
+    return IRCMessage(line, tags_end, prefix, command, params)
+
+
+# 件数を制限したメッセージIDの集合に関するコメント
+class RecentIdSet:
+    """最近見たIDを上限件数まで保持し、古いものから忘れる。"""
+
+    # 初期化処理に関するコメント
+    def __init__(self, max_size: int) -> None:
+        # 挿入順を保つ辞書で最近のIDを保持するコメント
+        self._max_size = max_size
+        self._ids: "OrderedDict[str, None]" = OrderedDict()
+
+    # IDを登録する関数に関するコメント
+    def add(self, item_id: str) -> bool:
+        """初めて見たIDならTrueを返して登録する。"""
+
+        # 既出のIDは最近使ったものとして末尾に移すコメント
+        if item_id in self._ids:
+            self._ids.move_to_end(item_id)
+            return False
+
+        # 上限を超えたら最も古いIDを捨てるコメント
+        self._ids[item_id] = None
+        if len(self._ids) > self._max_size:
+            self._ids.popitem(last=False)
+        return True
+
+
+# 再接続までの待機秒数を計算する関数に関するコメント
+def compute_reconnect_delay(attempt: int) -> float:
+    """ジッター付きの指数バックオフで待機秒数を返す。"""
+
+    # 試行回数に応じて上限付きで倍増させるコメント
+    ceiling = min(
+        TWITCH_RECONNECT_MAX_DELAY_SECONDS,
+        TWITCH_RECONNECT_DELAY_SECONDS * (2 ** min(attempt, 16)),
+    )
+
+    # 同時に切断された接続が揃って再接続しないよう揺らぎを加えるコメント
+    return ceiling / 2 + random.uniform(0.0, ceiling / 2)
+
+
+# チャットの受信行を圧縮して保存するクラスに関するコメント
+class ChatArchiver:
+    """受信した全行を受信時刻付きで圧縮セグメントに追記する。"""
+
+    # 初期化処理に関するコメント
+    def __init__(self, archive_dir: Path, segment_seconds: float = CHAT_ARCHIVE_SEGMENT_SECONDS) -> None:
+        # 保存先と書き出し待ちの行を保持するコメント
+        self._archive_dir = archive_dir
+        self._segment_seconds = segment_seconds
+        self._pending: List[bytes] = []
+        self._batches: "queue.SimpleQueue[Optional[List[bytes]]]" = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._flush_task: Optional[asyncio.Task[None]] = None
+
+        # 書き込みスレッドだけが扱うセグメントの状態を保持するコメント
+        self._segment_file: Optional[IO[bytes]] = None
+        self._index_file: Optional[IO[str]] = None
+        self._segment_started_ms = 0
+
+    # 書き込みスレッドを起動するコメント
+    def start(self) -> None:
+        """保存先を作成して書き込みスレッドと定期書き出しを起動する。"""
+
+        # 二重起動を避けるコメント
+        if self._thread is not None:
+            return
+        self._archive_dir.mkdir(parents=True, exist_ok=True)
+        self._thread = threading.Thread(target=self._writer_loop, name="chat-archiver", daemon=True)
+        self._thread.start()
+        self._flush_task = asyncio.create_task(self._flush_loop())
+
+    # 受信行を追加するコメント
+    def append(self, raw_line: bytes) -> None:
+        """受信時刻のミリ秒を先頭に付けて書き出し待ちに加える。"""
+
+        # イベントループ上ではリストへの追加だけを行うコメント
+        self._pending.append(b"%d %s" % (time.time_ns() // 1_000_000, raw_line))
+        if len(self._pending) >= CHAT_ARCHIVE_BATCH_LINES:
+            self._hand_off()
+
+    # 終了処理に関するコメント
+    async def close(self) -> None:
+        """残りの行を書き出して書き込みスレッドを終了する。"""
+
+        # 定期書き出しを止めるコメント
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+            self._flush_task = None
+
+        # 残りを渡してスレッドの終了を待つコメント
+        if self._thread is None:
+            return
+        self._hand_off()
+        self._batches.put(None)
+        await asyncio.to_thread(self._thread.join)
+        self._thread = None
+
+    # 書き出し待ちの行をスレッドに渡すコメント
+    def _hand_off(self) -> None:
+        """溜まった行を1つのまとまりとして書き込みスレッドに渡す。"""
+
+        # 空なら何もしないコメント
+        if not self._pending:
+            return
+        self._batches.put(self._pending)
+        self._pending = []
+
+    # 定期的に書き出す処理に関するコメント
+    async def _flush_loop(self) -> None:
+        """一定間隔で書き出し待ちの行をスレッドに渡す。"""
+
+        # 停止まで繰り返すコメント
+        while True:
+            await asyncio.sleep(CHAT_ARCHIVE_FLUSH_SECONDS)
+            self._hand_off()
+
+    # 書き込みスレッドの本体に関するコメント
+    def _writer_loop(self) -> None:
+        """受け取ったまとまりを順にセグメントへ書き込む。"""
+
+        # 終了指示まで書き込みを続けるコメント
+        try:
+            while True:
+                batch = self._batches.get()
+                if batch is None:
+                    return
+                try:
+                    self._write_batch(batch)
+                except OSError as exc:
+                    LOGGER.exception("チャットアーカイブの書き込みに失敗しました: %s", exc)
+        finally:
+            self._close_segment()
+
+    # 1まとまりを書き込む処理に関するコメント
+    def _write_batch(self, batch: List[bytes]) -> None:
+        """まとまりを1つのgzipメンバーとして追記し索引に位置を記録する。"""
+
+        # 必要に応じてセグメントを切り替えるコメント
+        first_ms = int(batch[0].split(b" ", 1)[0])
+        if (
+            self._segment_file is None
+            or first_ms - self._segment_started_ms >= self._segment_seconds * 1000
+        ):
+            self._open_segment(first_ms)
+
+        # 圧縮したメンバーを追記してから索引を書くコメント
+        if self._segment_file is None or self._index_file is None:
+            return
+        offset = self._segment_file.tell()
+        self._segment_file.write(gzip.compress(b"".join(batch)))
+        self._segment_file.flush()
+        self._index_file.write(f"{first_ms} {offset}\n")
+        self._index_file.flush()
+
+    # セグメントを開く処理に関するコメント
+    def _open_segment(self, first_ms: int) -> None:
+        """最初の行の受信時刻を名前にしたセグメントと索引を開く。"""
+
+        # 前のセグメントを閉じるコメント
+        self._close_segment()
+        started_at = datetime.fromtimestamp(first_ms / 1000, tz=timezone.utc)
+        stem = f"{CHAT_ARCHIVE_SEGMENT_PREFIX}{started_at.strftime('%Y%m%dT%H%M%SZ')}"
+        self._segment_file = (self._archive_dir / f"{stem}{CHAT_ARCHIVE_SEGMENT_SUFFIX}").open("ab")
+        self._index_file = (self._archive_dir / f"{stem}{CHAT_ARCHIVE_INDEX_SUFFIX}").open("a", encoding="utf-8")
+        self._segment_started_ms = first_ms
+        LOGGER.info("チャットアーカイブの新しいセグメントを開きました: %s", stem)
+
+    # セグメントを閉じる処理に関するコメント
+    def _close_segment(self) -> None:
+        """開いているセグメントと索引を閉じる。"""
+
+        # 開いているファイルだけを閉じるコメント
+        for handle in (self._segment_file, self._index_file):
+            if handle is not None:
+                handle.close()
+        self._segment_file = None
+        self._index_file = None
+
+
+# セグメントの索引を読み込む関数に関するコメント
+def load_chat_archive_index(index_path: Path) -> List[Tuple[int, int]]:
+    """索引から各gzipメンバーの最初の受信時刻と開始位置を読み込む。"""
+
+    # 書き込み途中の行は読み飛ばすコメント
+    entries: List[Tuple[int, int]] = []
+    if not index_path.exists():
+        return entries
+    with index_path.open("r", encoding="utf-8") as file_handle:
+        for line in file_handle:
+            parts = line.split()
+            if len(parts) == 2 and parts[0].isdigit() and parts[1].isdigit():
+                entries.append((int(parts[0]), int(parts[1])))
+    return entries
+
+
+# アーカイブから期間内の行を読み出す関数に関するコメント
+def scan_chat_archive(archive_dir: Path, start_ms: int, end_ms: int) -> Iterator[Tuple[int, bytes]]:
+    """索引で範囲外のメンバーを読み飛ばし、期間内の受信行だけを返す。"""
+
+    # セグメントを時刻順に処理するコメント
+    for segment_path in sorted(archive_dir.glob(f"{CHAT_ARCHIVE_SEGMENT_PREFIX}*{CHAT_ARCHIVE_SEGMENT_SUFFIX}")):
+        stem = segment_path.name[: -len(CHAT_ARCHIVE_SEGMENT_SUFFIX)]
+        entries = load_chat_archive_index(segment_path.with_name(f"{stem}{CHAT_ARCHIVE_INDEX_SUFFIX}"))
+        if not entries:
+            continue
+
+        # 期間と重なるメンバーだけを展開するコメント
+        segment_size = segment_path.stat().st_size
+        with segment_path.open("rb") as file_handle:
+            for position, (first_ms, offset) in enumerate(entries):
+                if first_ms > end_ms:
+                    return
+                has_next = position + 1 < len(entries)
+                if has_next and entries[position + 1][0] < start_ms:
+                    continue
+
+                # 1メンバー分だけを読み込んで展開するコメント
+                end_offset = entries[position + 1][1] if has_next else segment_size
+                file_handle.seek(offset)
+                decompressor = zlib.decompressobj(wbits=31)
+                try:
+                    data = decompressor.decompress(file_handle.read(end_offset - offset))
+                except zlib.error:
+                    LOGGER.warning("チャットアーカイブの破損したメンバーを読み飛ばしました: %s@%s", segment_path, offset)
+                    continue
+
+                # 期間内の行だけを返すコメント
+                for line in data.splitlines():
+                    received_ms, _, raw_line = line.partition(b" ")
+                    if received_ms.isdigit() and start_ms <= int(received_ms) <= end_ms:
+                        yield int(received_ms), raw_line
+
+
+# 連続したチャットをまとめて投稿するクラスに関するコメント
+class ChatBurstCoalescer:
+    """短時間に続いたコメントを1件の投稿か返信スレッドにまとめて投稿キューに渡す。"""
+
+    # 初期化処理に関するコメント
+    def __init__(
+        self,
+        poster: XPoster,
+        window_seconds: float,
+        max_window_seconds: float,
+        max_comments: int = CHAT_COALESCE_MAX_COMMENTS,
+    ) -> None:
+        # 投稿先と待ち時間を保持するコメント
+        self._poster = poster
+        self._window_seconds = window_seconds
+        self._max_window_seconds = max_window_seconds
+        self._max_comments = max_comments
+
+        # まとめ待ちのコメントと送り出しのタスクを保持するコメント
+        self._pending: List[ChatComment] = []
+        self._flush_task: Optional[asyncio.Task[None]] = None
+
+    # コメントを追加するコメント
+    async def add(self, comment: ChatComment) -> None:
+        """コメントをまとめ待ちに加え、最初の1件から待ち時間を数え始める。"""
+
+        # 追加して上限に達したらすぐ送り出すコメント
+        self._pending.append(comment)
+        if len(self._pending) >= self._max_comments:
+            self._cancel_flush_task()
+            await self.flush()
+            return
+
+        # 最初の1件で送り出しを予約し、背圧中や上限の逼迫中は待ち時間を広げるコメント
+        if self._flush_task is None:
+            constrained = self._poster.backpressured or self._poster.rate_limited
+            window = self._max_window_seconds if constrained else self._window_seconds
+            self._flush_task = asyncio.create_task(self._flush_later(window))
+
+    # まとめ待ちのコメントを送り出すコメント
+    async def flush(self) -> None:
+        """まとめ待ちのコメントを投稿文にしてチャットのレーンに追加する。"""
+
+        # 送り出す分を先に取り出すコメント
+        comments, self._pending = self._pending, []
+        if not comments:
+            return
+        tweets = build_coalesced_tweets(comments)
+        if len(comments) > 1:
+            LOGGER.info("チャット%s件を%s件の投稿にまとめました。", len(comments), len(tweets))
+        await self._poster.enqueue_text(tweets[0], X_LANE_CHAT, tuple(tweets[1:]))
+
+    # 終了処理に関するコメント
+    async def close(self) -> None:
+        """予約を取り消して残りのコメントを送り出す。"""
+
+        # 予約を止めてから送り出すコメント
+        self._cancel_flush_task()
+        await self.flush()
+
+    # 待ち時間後に送り出す処理に関するコメント
+    async def _flush_later(self, window: float) -> None:
+        """待ち時間が過ぎたらまとめ待ちのコメントを送り出す。"""
+
+        # 待機後は予約を外してから送り出すコメント
+        await asyncio.sleep(window)
+        self._flush_task = None
+        await self.flush()
+
+    # 予約を取り消す処理に関するコメント
+    def _cancel_flush_task(self) -> None:
+        """送り出しの予約があれば取り消す。"""
+
+        # タスクを止めて予約を外すコメント
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
 
 
 # Twitch IRCのメッセージ監視クラスに関するコメント
@@ -1477,14 +5090,59 @@ class TwitchIRCListener:
         poster: XPoster,
         token_manager: TwitchTokenManager,
         nick: str,
+        archiver: Optional[ChatArchiver] = None,
+        chat_rate_provider: Optional[Callable[[], Optional[ChatRateCounter]]] = None,
     ) -> None:
         # 設定値とポスターを保持するコメント
         self._settings = settings
         self._poster = poster
         self._token_manager = token_manager
         self._nick = nick
+        self._archiver = archiver
+        self._chat_rate_provider = chat_rate_provider
+
+        # メインチャンネル宛てのPRIVMSGをデコード前に見分ける目印を保持するコメント
+        self._main_privmsg_marker = f" PRIVMSG #{settings.twitch_channel} :".encode("utf-8")
         self._stop_event = asyncio.Event()
 
+        # 振り分け用のチャンネルと対象ユーザーを集合で保持するコメント
+        self._channels = frozenset(settings.twitch_chat_channels)
+        self._target_users = frozenset(settings.twitch_target_users)
+        self._target_nicks_bytes = frozenset(user.encode("utf-8") for user in settings.twitch_target_users)
+
+        # 再接続をまたいでJOINの送信時刻を保持するコメント
+        self._join_times: Deque[float] = deque()
+
+        # 複数接続で重複して届いたコメントを排除するコメント
+        self._seen_message_ids = RecentIdSet(IRC_SEEN_MESSAGE_IDS)
+
+        # 全接続の受信行を一度だけ保存して数えるためにIDを保持するコメント
+        self._received_message_ids = RecentIdSet(IRC_RECEIVED_MESSAGE_IDS)
+
+        # 連続したコメントをまとめる段を用意するコメント
+        self._coalescer: Optional[ChatBurstCoalescer] = None
+        if settings.chat_coalesce_enabled:
+            self._coalescer = ChatBurstCoalescer(
+                poster,
+                settings.chat_coalesce_window_seconds,
+                settings.chat_coalesce_max_window_seconds,
+            )
+
+        # 投稿キューの背圧を受け取るコメント
+        self._backpressured = poster.backpressured
+        self._backpressured_posts = 0
+        poster.add_backpressure_callback(self._on_backpressure)
+
+    # 背圧の通知を受け取る処理に関するコメント
+    def _on_backpressure(self, active: bool) -> None:
+        """背圧の開始と解除を記録する。"""
+
+        # 解除時は背圧中に積んだ件数を残すコメント
+        if not active and self._backpressured:
+            LOGGER.info("背圧中にチャットのコメントを%s件受け付けました。", self._backpressured_posts)
+        self._backpressured = active
+        self._backpressured_posts = 0
+
     # 停止指示を出すためのコメント
     def stop(self) -> None:
         """監視ループを停止する。"""
@@ -1492,27 +5150,59 @@ class TwitchIRCListener:
         # 停止イベントを設定するコメント
         self._stop_event.set()
 
-    # IRC接続と監視を行うためのコメント
-    async def run(self) -> None:
-        """接続が切れても再接続しながら監視を続ける。"""
+    # IRC接続と監視を行うためのコメント
+    async def run(self) -> None:
+        """設定された本数の接続を並行して維持しながら監視を続ける。"""
+
+        # 接続ごとに再接続ループを起動するコメント
+        try:
+            await asyncio.gather(
+                *(
+                    self._run_connection(connection_id)
+                    for connection_id in range(self._settings.twitch_irc_connections)
+                )
+            )
+        finally:
+            # まとめ待ちのコメントを投稿キューに渡すコメント
+            if self._coalescer is not None:
+                await self._coalescer.close()
+
+    # 1本の接続を維持する処理に関するコメント
+    async def _run_connection(self, connection_id: int) -> None:
+        """接続が切れてもバックオフしながら再接続を続ける。"""
 
         # 再接続ループに関するコメント
+        attempt = 0
         while not self._stop_event.is_set():
+            reconnect_requested = False
+            welcomed = asyncio.Event()
             try:
-                await self._connect_and_listen()
+                reconnect_requested = await self._connect_and_listen(connection_id, welcomed)
             except asyncio.CancelledError:
                 # キャンセル時はそのまま伝播させるコメント
                 raise
             except Exception as exc:
-                LOGGER.exception("Twitch接続中に例外が発生しました: %s", exc)
+                LOGGER.exception("Twitch接続中に例外が発生しました(接続%s): %s", connection_id, exc)
 
-            # 再接続まで待機するコメント
-            if not self._stop_event.is_set():
-                await asyncio.sleep(TWITCH_RECONNECT_DELAY_SECONDS)
+            # ログインできた接続の切断なら試行回数を戻すコメント
+            if welcomed.is_set():
+                attempt = 0
+            if self._stop_event.is_set():
+                return
+
+            # ログイン済みの接続への再接続要求には待たずに応じるコメント
+            if reconnect_requested and welcomed.is_set():
+                continue
+
+            # ジッター付きの指数バックオフで待機するコメント
+            delay = compute_reconnect_delay(attempt)
+            attempt += 1
+            LOGGER.info("Twitch IRCへ%.1f秒後に再接続します(接続%s)。", delay, connection_id)
+            await asyncio.sleep(delay)
 
     # 実際の接続と受信処理に関するコメント
-    async def _connect_and_listen(self) -> None:
-        """Twitch IRCに接続してメッセージを受信する。"""
+    async def _connect_and_listen(self, connection_id: int, welcomed: asyncio.Event) -> bool:
+        """Twitch IRCに接続してメッセージを受信し、再接続要求があればTrueを返す。"""
 
         # 認証情報を組み立てるコメント
         pass_value, nick = await build_twitch_credentials(
@@ -1520,88 +5210,420 @@ class TwitchIRCListener:
             self._token_manager,
             self._nick,
         )
-        channel = self._settings.twitch_channel
 
         # SSL設定を必要に応じて作成するコメント
-        ssl_context = ssl.create_default_context() if TWITCH_USE_TLS else None
+        ssl_context = ssl.create_default_context() if self._settings.twitch_use_tls else None
 
         # IRCサーバーへ接続するコメント
-        LOGGER.info("Twitch IRCへ接続します。サーバー: %s", TWITCH_SERVER)
+        LOGGER.info(
+            "Twitch IRCへ接続します。サーバー: %s:%s (接続%s)",
+            self._settings.twitch_server,
+            self._settings.twitch_port,
+            connection_id,
+        )
         reader, writer = await asyncio.open_connection(
-            TWITCH_SERVER,
-            TWITCH_PORT,
+            self._settings.twitch_server,
+            self._settings.twitch_port,
             ssl=ssl_context,
         )
 
         # 接続後の後始末を確実に行うコメント
+        join_task: Optional[asyncio.Task] = None
         try:
-            # ログイン情報を送信するコメント
+            # タグとコマンド通知を要求してからログイン情報を送信するコメント
+            writer.write(f"CAP REQ :{TWITCH_IRC_CAPABILITIES}\r\n".encode("utf-8"))
             writer.write(f"PASS {pass_value}\r\n".encode("utf-8"))
             writer.write(f"NICK {nick}\r\n".encode("utf-8"))
-            writer.write(f"JOIN #{channel}\r\n".encode("utf-8"))
             await writer.drain()
 
+            # 回数制限に従うJOINは受信と並行して送るコメント
+            join_task = asyncio.create_task(self._join_channels(writer))
+
             # 接続完了ログを出すコメント
-            LOGGER.info("認証モードでTwitchコメント監視を開始します。ログイン名: %s", nick)
+            LOGGER.info(
+                "認証モードでTwitchコメント監視を開始します。ログイン名: %s / チャンネル数: %s",
+                nick,
+                len(self._settings.twitch_chat_channels),
+            )
+
+            # 受信行の保存先を用意するコメント
+            archive = self._archiver.append if self._archiver is not None else None
+            chat_rate_provider = self._chat_rate_provider
+            main_privmsg_marker = self._main_privmsg_marker
+            multi_connection = self._settings.twitch_irc_connections > 1
 
             # 受信ループに関するコメント
             while not self._stop_event.is_set():
                 raw_line = await reader.readline()
                 if not raw_line:
-                    LOGGER.info("Twitch IRCの接続が切断されました。")
-                    return
-
-                # 受信行をデコードするコメント
+                    LOGGER.info("Twitch IRCの接続が切断されました(接続%s)。", connection_id)
+                    return False
+
+                # メインチャンネルのチャットは配信中だけデコードせずに数えるコメント
+                chat_rate = None
+                if chat_rate_provider is not None and main_privmsg_marker in raw_line:
+                    chat_rate = chat_rate_provider()
+
+                # 保存か集計に使う行だけ、複数接続のときに重複を除いて扱うコメント
+                if (archive is not None or chat_rate is not None) and (
+                    not multi_connection or self._is_first_delivery(raw_line, connection_id)
+                ):
+                    if archive is not None:
+                        archive(raw_line)
+                    if chat_rate is not None:
+                        chat_rate.record(time.time())
+
+                # 対象外ユーザーのコメントはデコード前に捨てるコメント
+                if not is_candidate_irc_line(raw_line, self._target_nicks_bytes):
+                    continue
+
+                # 受信行をデコードして解析するコメント
                 decoded_line = raw_line.decode("utf-8", errors="ignore").strip("\r\n")
-                await self._handle_irc_line(decoded_line, writer)
+                message = parse_irc_message(decoded_line)
+                if message is None:
+                    continue
+
+                # ログイン完了を記録するコメント
+                if message.command == "001":
+                    welcomed.set()
+                if not await self._handle_irc_line(message, writer):
+                    return True
+            return False
         finally:
-            # 接続のクローズ処理を行うコメント
+            # JOINの送信を止めて接続をクローズするコメント
+            if join_task is not None:
+                join_task.cancel()
+                await asyncio.gather(join_task, return_exceptions=True)
             writer.close()
             if hasattr(writer, "wait_closed"):
                 await writer.wait_closed()
 
-    # IRC行を処理する関数に関するコメント
-    async def _handle_irc_line(self, line: str, writer: asyncio.StreamWriter) -> None:
-        """IRCメッセージを処理して投稿対象ならキューに入れる。"""
-
-        # PINGに応答するコメント
-        if line.startswith("PING "):
-            await self._send_pong(line, writer)
-            return
+    # 全接続のうち最初に届いた行か判定する関数に関するコメント
+    def _is_first_delivery(self, raw_line: bytes, connection_id: int) -> bool:
+        """メッセージIDで初めて届いた行か判定し、IDのない制御行は最初の接続の分だけを扱う。"""
 
-        # タグを除去してPRIVMSGを解析するコメント
-        stripped_line = strip_irc_tags(line)
-        parsed = parse_privmsg(stripped_line)
-        if parsed is None:
-            return
+        # IDのない制御行は接続ごとに届くため接続番号で決めるコメント
+        line_id = extract_irc_message_id(raw_line)
+        if line_id is None:
+            return connection_id == 0
+        return self._received_message_ids.add(line_id.decode("ascii", errors="ignore"))
 
-        author, channel, message = parsed
-        if channel.lower() != self._settings.twitch_channel:
-            return
+    # IRCメッセージを処理する関数に関するコメント
+    async def _handle_irc_line(self, message: IRCMessage, writer: asyncio.StreamWriter) -> bool:
+        """IRCメッセージを処理し、接続を続ける場合はTrueを返す。"""
 
-        # 指定ユーザー以外のコメントは除外するコメント
-        if author.lower() != TARGET_TWITCH_USER_LOWER:
-            return
+        # PINGに応答するコメント
+        command = message.command
+        if command == "PING":
+            await self._send_pong(message, writer)
+            return True
+
+        # サーバーからの再接続要求に従うコメント
+        if command == "RECONNECT":
+            LOGGER.info("Twitch IRCから再接続要求を受信しました。")
+            return False
+
+        # サーバーからの通知を記録するコメント
+        if command == "NOTICE":
+            LOGGER.warning(
+                "Twitch IRCから通知を受信しました: %s (%s)",
+                message.trailing,
+                message.tag("msg-id", "-"),
+            )
+            return True
+
+        # PRIVMSG以外は無視するコメント
+        if command != "PRIVMSG":
+            return True
+
+        # 監視対象のチャンネルと投稿対象ユーザー以外は除外するコメント
+        channel = message.channel
+        author = message.nick
+        if channel is None or author is None:
+            return True
+        channel = channel.lower()
+        author = author.lower()
+        if channel not in self._channels or author not in self._target_users:
+            return True
+
+        # 別の接続で処理済みのコメントは除外するコメント
+        message_id = message.tag("id")
+        if message_id is not None and not self._seen_message_ids.add(message_id):
+            return True
 
         # メッセージ本文を整形するコメント
-        content = normalize_message_text(message)
+        content = normalize_message_text(message.trailing)
         if not content:
-            return
+            return True
 
-        # 投稿文を組み立ててキューに追加するコメント
-        tweet_text = build_tweet(content)
-        await self._poster.enqueue_text(tweet_text)
+        # 既定以外の発言者とチャンネルを出典として付けるコメント
+        author_label = None
+        if author != TARGET_TWITCH_USER_LOWER:
+            author_label = message.tag("display-name", author)
+        channel_label = channel if channel != self._settings.twitch_channel else None
+
+        # 連続したコメントはまとめてからチャットのレーンに追加するコメント
+        if self._coalescer is not None:
+            await self._coalescer.add(ChatComment(content, author_label, channel_label))
+        else:
+            await self._poster.enqueue_text(build_tweet(content, author_label, channel_label), X_LANE_CHAT)
+        if self._backpressured:
+            self._backpressured_posts += 1
+        return True
+
+    # チャンネルへの参加を行う関数に関するコメント
+    async def _join_channels(self, writer: asyncio.StreamWriter) -> None:
+        """JOINの回数制限を守りながら監視対象の全チャンネルに参加する。"""
+
+        # 参加待ちのチャンネルを順に処理するコメント
+        pending = list(self._settings.twitch_chat_channels)
+        while pending:
+            # 制限時間を過ぎた送信記録を捨てるコメント
+            now = time.monotonic()
+            while self._join_times and now - self._join_times[0] >= TWITCH_JOIN_WINDOW_SECONDS:
+                self._join_times.popleft()
+
+            # 枠が空くまで待機するコメント
+            available = TWITCH_JOIN_RATE_LIMIT - len(self._join_times)
+            if available <= 0:
+                await asyncio.sleep(TWITCH_JOIN_WINDOW_SECONDS - (now - self._join_times[0]))
+                continue
+
+            # 1行の長さに収まる分だけまとめて送るコメント
+            batch: List[str] = []
+            line_length = len("JOIN ")
+            while pending and len(batch) < available:
+                entry_length = len(pending[0]) + (2 if batch else 1)
+                if batch and line_length + entry_length > IRC_MAX_LINE_BYTES:
+                    break
+                batch.append(pending.pop(0))
+                line_length += entry_length
+            targets = ",".join(f"#{channel}" for channel in batch)
+            writer.write(f"JOIN {targets}\r\n".encode("utf-8"))
+            await writer.drain()
+            self._join_times.extend([now] * len(batch))
+            LOGGER.info("Twitchチャンネルに参加しました: %s", targets)
 
     # PINGへの応答を行う関数に関するコメント
-    async def _send_pong(self, line: str, writer: asyncio.StreamWriter) -> None:
+    async def _send_pong(self, message: IRCMessage, writer: asyncio.StreamWriter) -> None:
         """Twitch IRCのPINGにPONGで応答する。"""
 
-        # PINGの宛先を取得して返すコメント
-        payload = line.split(" ", 1)[1] if " " in line else ""
-        writer.write(f"PONG {payload}\r\n".encode("utf-8"))
+        # PINGの宛先をそのまま返すコメント
+        writer.write(f"PONG :{message.trailing}\r\n".encode("utf-8"))
         await writer.drain()
 
 
+# Twitch EventSubのWebSocket受信クラスに関するコメント
+class TwitchEventSubClient:
+    """EventSubのWebSocketで配信開始と終了の通知を受け取る。"""
+
+    # 初期化処理に関するコメント
+    def __init__(
+        self,
+        settings: Settings,
+        token_manager: TwitchTokenManager,
+        http_client: httpx.AsyncClient,
+        on_stream_online: Callable[[dict], Awaitable[None]],
+        on_stream_offline: Callable[[dict], Awaitable[None]],
+        on_disconnected: Callable[[], None],
+    ) -> None:
+        # 設定と依存関係を保持するコメント
+        self._settings = settings
+        self._token_manager = token_manager
+        self._http_client = http_client
+        self._on_stream_online = on_stream_online
+        self._on_stream_offline = on_stream_offline
+        self._on_disconnected = on_disconnected
+        self._broadcaster_user_id: Optional[str] = None
+        self._seen_message_ids: Deque[str] = deque(maxlen=EVENTSUB_SEEN_MESSAGE_IDS)
+        self._connected = False
+
+    # 接続状態を返すコメント
+    @property
+    def connected(self) -> bool:
+        """購読済みのセッションが有効かどうかを返す。"""
+
+        # 現在の接続状態を返すコメント
+        return self._connected
+
+    # 再接続しながら受信を続けるコメント
+    async def run(self) -> None:
+        """切断されても再接続しながら通知を受け取り続ける。"""
+
+        # 再接続ループに関するコメント
+        while True:
+            try:
+                await self._connect_and_listen()
+            except asyncio.CancelledError:
+                # キャンセル時はそのまま伝播させるコメント
+                raise
+            except Exception as exc:
+                LOGGER.exception("EventSub接続中に例外が発生しました: %s", exc)
+            finally:
+                self._set_connected(False)
+
+            # 再接続まで待機するコメント
+            await asyncio.sleep(EVENTSUB_RECONNECT_DELAY_SECONDS)
+
+    # 接続状態を更新するコメント
+    def _set_connected(self, connected: bool) -> None:
+        """接続状態を更新し、切断時は監視側に通知する。"""
+
+        # 切断に変わった場合のみ通知するコメント
+        was_connected = self._connected
+        self._connected = connected
+        if was_connected and not connected:
+            self._on_disconnected()
+
+    # 1つの接続を処理するコメント
+    async def _connect_and_listen(self) -> None:
+        """WebSocketに接続し、再接続指示があれば新しい接続に引き継ぐ。"""
+
+        # 依存ライブラリを遅延読み込みするコメント
+        import websockets
+
+        # 最初の接続では購読を登録するコメント
+        LOGGER.info("Twitch EventSubへ接続します: %s", self._settings.twitch_eventsub_ws_url)
+        websocket = await websockets.connect(self._settings.twitch_eventsub_ws_url)
+        subscribe = True
+        try:
+            while True:
+                reconnect_url = await self._listen(websocket, subscribe)
+                if reconnect_url is None:
+                    return
+
+                # 新しい接続を開いてから古い接続を閉じるコメント
+                next_websocket = await websockets.connect(reconnect_url)
+                await websocket.close()
+                websocket = next_websocket
+                subscribe = False
+        finally:
+            await websocket.close()
+
+    # メッセージを受信して処理するコメント
+    async def _listen(self, websocket: object, subscribe: bool) -> Optional[str]:
+        """切断まで受信し、再接続指示があれば接続先URLを返す。"""
+
+        # ウェルカムが届くまでの待機時間を設定するコメント
+        keepalive_seconds = EVENTSUB_DEFAULT_KEEPALIVE_SECONDS
+
+        # 受信ループに関するコメント
+        while True:
+            try:
+                raw_message = await asyncio.wait_for(
+                    websocket.recv(),
+                    timeout=keepalive_seconds + EVENTSUB_KEEPALIVE_GRACE_SECONDS,
+                )
+            except asyncio.TimeoutError:
+                LOGGER.warning("EventSubのキープアライブが途絶えたため再接続します。")
+                return None
+
+            # JSONを解析するコメント
+            try:
+                message = json.loads(raw_message)
+            except (TypeError, ValueError):
+                LOGGER.warning("EventSubの不正なメッセージを無視しました。")
+                continue
+            if not isinstance(message, dict):
+                continue
+            metadata = message.get("metadata") if isinstance(message.get("metadata"), dict) else {}
+            payload = message.get("payload") if isinstance(message.get("payload"), dict) else {}
+            message_type = metadata.get("message_type")
+
+            # 再送された通知は無視するコメント
+            message_id = metadata.get("message_id")
+            if isinstance(message_id, str) and message_id:
+                if message_id in self._seen_message_ids:
+                    continue
+                self._seen_message_ids.append(message_id)
+
+            # メッセージ種別ごとに処理するコメント
+            session = payload.get("session") if isinstance(payload.get("session"), dict) else {}
+            if message_type == "session_welcome":
+                keepalive_value = session.get("keepalive_timeout_seconds")
+                if isinstance(keepalive_value, (int, float)) and keepalive_value > 0:
+                    keepalive_seconds = float(keepalive_value)
+                session_id = session.get("id")
+                if not isinstance(session_id, str) or not session_id:
+                    raise ValueError("EventSubのセッションIDが取得できませんでした。")
+                if subscribe:
+                    await self._subscribe(session_id)
+                self._set_connected(True)
+                LOGGER.info("Twitch EventSubで配信開始と終了の監視を開始しました。")
+            elif message_type == "notification":
+                await self._dispatch_notification(metadata, payload)
+            elif message_type == "session_reconnect":
+                reconnect_url = session.get("reconnect_url")
+                if not isinstance(reconnect_url, str) or not reconnect_url:
+                    return None
+                LOGGER.info("EventSubの再接続指示を受け取りました。")
+                return reconnect_url
+            elif message_type == "revocation":
+                LOGGER.warning("EventSubの購読が取り消されたため再登録します。")
+                return None
+
+    # 配信開始と終了を購読するコメント
+    async def _subscribe(self, session_id: str) -> None:
+        """stream.onlineとstream.offlineを購読する。"""
+
+        # 配信者のユーザーIDを一度だけ解決するコメント
+        if self._broadcaster_user_id is None:
+            self._broadcaster_user_id = await self._token_manager.call_with_token(
+                lambda access_token: fetch_twitch_user_id(
+                    self._http_client,
+                    access_token,
+                    self._settings.twitch_client_id,
+                    self._settings.twitch_channel,
+                )
+            )
+        broadcaster_user_id = self._broadcaster_user_id
+
+        # イベント種別ごとに購読を登録するコメント
+        for event_type in ("stream.online", "stream.offline"):
+            await self._token_manager.call_with_token(
+                lambda access_token, event_type=event_type: create_twitch_eventsub_subscription(
+                    client=self._http_client,
+                    access_token=access_token,
+                    client_id=self._settings.twitch_client_id,
+                    endpoint=self._settings.twitch_eventsub_subscriptions_endpoint,
+                    session_id=session_id,
+                    event_type=event_type,
+                    broadcaster_user_id=broadcaster_user_id,
+                )
+            )
+
+    # 通知を監視側に渡すコメント
+    async def _dispatch_notification(self, metadata: dict, payload: dict) -> None:
+        """通知の種別に応じてコールバックを呼ぶ。"""
+
+        # イベント本体を取り出すコメント
+        event = payload.get("event") if isinstance(payload.get("event"), dict) else {}
+        subscription_type = metadata.get("subscription_type")
+
+        # 配信開始と終了を通知するコメント
+        if subscription_type == "stream.online":
+            await self._on_stream_online(event)
+        elif subscription_type == "stream.offline":
+            await self._on_stream_offline(event)
+
+
+# 監視ソースごとの周期設定を保持するデータクラスに関するコメント
+@dataclass(frozen=True)
+class PollSource:
+    """独立した周期で実行する監視ソースを表す。"""
+
+    # ログ表示用のソース名を保持するコメント
+    name: str
+    # 次回までの間隔秒数を返す関数を保持するコメント
+    interval: Callable[[], float]
+    # 通信の締め切り秒数を受け取る1回分の取得処理を保持するコメント
+    poll: Callable[[float], Awaitable[None]]
+    # 1回分の通信の締め切り秒数を保持するコメント
+    timeout_seconds: float
+    # 待機を打ち切って即時実行させるイベントを保持するコメント
+    wake_event: Optional[asyncio.Event] = None
+
+
 # Twitch配信の同接を監視するクラスに関するコメント
 class TwitchStreamMonitor:
     """Twitch配信の同接推移を記録して投稿する。"""
@@ -1612,20 +5634,47 @@ class TwitchStreamMonitor:
         settings: Settings,
         poster: XPoster,
         token_manager: TwitchTokenManager,
+        http_client: httpx.AsyncClient,
+        graph_renderer: GraphRenderer,
     ) -> None:
         # 設定と依存関係を保持するコメント
         self._settings = settings
         self._poster = poster
         self._token_manager = token_manager
+        self._http_client = http_client
+        self._graph_renderer = graph_renderer
+        self._summary_tasks: Set[asyncio.Task[None]] = set()
         self._stop_event = asyncio.Event()
         self._task: Optional[asyncio.Task[None]] = None
         self._lock = asyncio.Lock()
         self._session: Optional[StreamSession] = None
-        self._youtube_last_polled_at = 0.0
-        self._youtube_upcoming_last_polled_at = 0.0
+        self._youtube_snapshot: Optional[YouTubeSnapshot] = None
+        self._youtube_snapshot_lock = asyncio.Lock()
+        self._youtube_quota_ledger = YouTubeQuotaLedger(
+            Path(__file__).resolve().parent / YOUTUBE_QUOTA_LEDGER_FILENAME,
+            settings.youtube_daily_quota,
+        )
         self._youtube_upcoming_posted_ids = self._load_youtube_upcoming_cache()
         self._stream_history = self._load_stream_history_cache()
         self._monthly_stats_posted = self._load_monthly_stats_cache()
+        self._offline_since: Optional[float] = None
+        self._known_start_times: Dict[str, float] = {}
+        self._twitch_wake_event = asyncio.Event()
+        self._ended_stream_ids: Deque[str] = deque(maxlen=EVENTSUB_SEEN_MESSAGE_IDS)
+        self._eventsub_client: Optional[TwitchEventSubClient] = None
+        if settings.twitch_eventsub_enabled:
+            self._eventsub_client = TwitchEventSubClient(
+                settings=settings,
+                token_manager=token_manager,
+                http_client=http_client,
+                on_stream_online=self._on_eventsub_stream_online,
+                on_stream_offline=self._on_eventsub_stream_offline,
+                on_disconnected=self._twitch_wake_event.set,
+            )
+        self._start_minute_profile = build_start_minute_profile(
+            [item["started_at"] for item in self._stream_history],
+            time.time(),
+        )
 
     # 監視タスクを開始するコメント
     def start(self) -> None:
@@ -1651,40 +5700,204 @@ class TwitchStreamMonitor:
             return
         await self._task
 
+        # 作成中のサマリー投稿を取りこぼさないよう待つコメント
+        if self._summary_tasks:
+            await asyncio.gather(*self._summary_tasks, return_exceptions=True)
+
+        # 書き込み中のYouTubeクォータ記録を待つコメント
+        await self._youtube_quota_ledger.close()
+
+    # 配信中のチャット速度の記録先を返すコメント
+    def current_chat_rate(self) -> Optional[ChatRateCounter]:
+        """配信中ならセッションのチャット数カウンターを返す。"""
+
+        # 配信中でなければNoneを返すコメント
+        session = self._session
+        return session.chat_rate if session is not None else None
+
     # メインの監視ループに関するコメント
     async def _run(self) -> None:
-        """一定間隔で配信状態を確認する。"""
+        """監視ソースごとに独立したタスクで配信状態を確認する。"""
+
+        # ソースごとにタスクを起動するコメント
+        tasks = [
+            asyncio.create_task(self._run_source(source))
+            for source in self._build_poll_sources()
+        ]
+
+        # EventSubが有効なら通知の受信を並行して行うコメント
+        background_tasks = []
+        if self._eventsub_client is not None:
+            background_tasks.append(asyncio.create_task(self._eventsub_client.run()))
+
+        # 全ソースの終了を待ち、途中終了時は残りを止めるコメント
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks + background_tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, *background_tasks, return_exceptions=True)
+
+    # 監視ソースの一覧を組み立てるコメント
+    def _build_poll_sources(self) -> List[PollSource]:
+        """設定に応じて有効な監視ソースを返す。"""
+
+        # Twitch配信と月次統計は常に監視するコメント
+        sources = [
+            PollSource(
+                name="Twitch配信",
+                interval=self._next_twitch_poll_interval,
+                poll=self._poll_twitch_stream,
+                timeout_seconds=TWITCH_POLL_TIMEOUT_SECONDS,
+                wake_event=self._twitch_wake_event,
+            ),
+            PollSource(
+                name="月次配信統計",
+                interval=lambda: MONTHLY_STATS_CHECK_INTERVAL_SECONDS,
+                poll=self._poll_monthly_stats,
+                timeout_seconds=MONTHLY_STATS_POLL_TIMEOUT_SECONDS,
+            ),
+        ]
+
+        # YouTube連携が有効な場合のみYouTubeを監視するコメント
+        if self._is_youtube_enabled():
+            sources.append(
+                PollSource(
+                    name="YouTube配信",
+                    interval=lambda: self._settings.youtube_poll_interval_seconds,
+                    poll=self._poll_youtube_streams,
+                    timeout_seconds=YOUTUBE_POLL_TIMEOUT_SECONDS,
+                )
+            )
+            sources.append(
+                PollSource(
+                    name="YouTube配信予定",
+                    interval=lambda: self._settings.youtube_upcoming_poll_interval_seconds,
+                    poll=self._poll_youtube_upcoming,
+                    timeout_seconds=YOUTUBE_POLL_TIMEOUT_SECONDS,
+                )
+            )
+
+        return sources
+
+    # 1つの監視ソースを周期実行するコメント
+    async def _run_source(self, source: PollSource) -> None:
+        """ソース固有の周期と締め切りでポーリングを繰り返す。"""
+
+        # 最初の締め切りを現在時刻にするコメント
+        deadline = time.monotonic()
 
         # 監視ループを実行するコメント
         while not self._stop_event.is_set():
+            # 締め切りは通信だけに掛け、状態の更新や投稿の追加は途中で打ち切らないコメント
             try:
-                await self._poll_once()
+                await source.poll(source.timeout_seconds)
+            except asyncio.TimeoutError:
+                LOGGER.warning(
+                    "%sの取得が%s秒以内に完了しなかったため打ち切りました。",
+                    source.name,
+                    source.timeout_seconds,
+                )
             except Exception as exc:
-                LOGGER.exception("Twitch配信監視中に例外が発生しました: %s", exc)
-            await self._wait_for_next_poll()
+                LOGGER.exception("%sの監視中に例外が発生しました: %s", source.name, exc)
 
-    # 次のポーリングまで待機するコメント
-    async def _wait_for_next_poll(self) -> None:
-        """停止要求が来るまで待機する。"""
+            # 次の締め切りを計算し、遅れた場合は追いつこうとしないコメント
+            deadline += source.interval()
+            deadline = max(deadline, time.monotonic())
+            await self._wait_until(deadline, source.wake_event)
 
-        # 取得間隔を決定するコメント
-        poll_interval = self._settings.twitch_stream_poll_interval_seconds
-        if self._is_youtube_enabled():
-            poll_interval = min(
-                poll_interval,
-                self._settings.youtube_poll_interval_seconds,
-                self._settings.youtube_upcoming_poll_interval_seconds,
-            )
+    # 締め切りまで待機するコメント
+    async def _wait_until(self, deadline: float, wake_event: Optional[asyncio.Event]) -> None:
+        """締め切りか停止要求か即時実行要求まで待機する。"""
 
-        # 指定間隔または停止まで待機するコメント
-        try:
-            await asyncio.wait_for(
-                self._stop_event.wait(),
-                timeout=poll_interval,
-            )
-        except asyncio.TimeoutError:
+        # 残り時間がなければすぐに戻るコメント
+        timeout = deadline - time.monotonic()
+        if timeout <= 0:
+            return
+
+        # 即時実行要求がない場合は停止だけを待つコメント
+        if wake_event is None:
+            try:
+                await asyncio.wait_for(self._stop_event.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
             return
 
+        # 停止と即時実行要求のどちらかを待つコメント
+        waiters = [
+            asyncio.create_task(self._stop_event.wait()),
+            asyncio.create_task(wake_event.wait()),
+        ]
+        try:
+            await asyncio.wait(waiters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for waiter in waiters:
+                waiter.cancel()
+            await asyncio.gather(*waiters, return_exceptions=True)
+        wake_event.clear()
+
+    # Twitchの次回ポーリング間隔を決めるコメント
+    def _next_twitch_poll_interval(self) -> float:
+        """配信状況と開始見込みに応じてTwitchの取得間隔を返す。"""
+
+        # 配信中なら通常間隔で同接を取得するコメント
+        base_interval = self._settings.twitch_stream_poll_interval_seconds
+        if self._session is not None:
+            return base_interval
+
+        # EventSubで開始を検知できる間は突き合わせ用の間隔にするコメント
+        if self._eventsub_client is not None and self._eventsub_client.connected:
+            return EVENTSUB_OFFLINE_RESYNC_INTERVAL_SECONDS
+
+        # 適応モードでなければ通常間隔にするコメント
+        if not self._settings.twitch_adaptive_polling:
+            return base_interval
+
+        # 開始見込みの時間帯なら間隔を詰めるコメント
+        now = time.time()
+        hot_interval = min(base_interval, self._settings.twitch_hot_poll_interval_seconds)
+        seconds_until_hot = self._seconds_until_hot_window(now)
+        if seconds_until_hot <= 0:
+            return hot_interval
+
+        # オフラインが続くほど間隔を広げるコメント
+        offline_since = self._offline_since if self._offline_since is not None else now
+        backoff_interval = base_interval * (1 + (now - offline_since) / ADAPTIVE_BACKOFF_RAMP_SECONDS)
+        interval = max(
+            base_interval,
+            min(backoff_interval, self._settings.twitch_offline_max_poll_interval_seconds),
+        )
+
+        # 次の開始見込み時間帯を飛び越えないようにするコメント
+        return max(hot_interval, min(interval, seconds_until_hot))
+
+    # 次の開始見込み時間帯までの秒数を求めるコメント
+    def _seconds_until_hot_window(self, now: float) -> float:
+        """配信予定と過去の傾向から次の開始見込みまでの秒数を返す。"""
+
+        # 配信予定の前後幅を確認するコメント
+        seconds_until = math.inf
+        for scheduled_start in self._known_start_times.values():
+            window_start = scheduled_start - ADAPTIVE_START_LEAD_SECONDS
+            window_end = scheduled_start + ADAPTIVE_START_TRAIL_SECONDS
+            if window_start <= now <= window_end:
+                return 0.0
+            if now < window_start:
+                seconds_until = min(seconds_until, window_start - now)
+
+        # 過去の開始時刻の傾向を分単位で確認するコメント
+        now_local = datetime.fromtimestamp(now)
+        minute_of_day = now_local.hour * 60 + now_local.minute
+        if self._start_minute_profile[minute_of_day]:
+            return 0.0
+        seconds_into_minute = now_local.second + now_local.microsecond / 1_000_000
+        for offset in range(1, 1440):
+            if self._start_minute_profile[(minute_of_day + offset) % 1440]:
+                seconds_until = min(seconds_until, offset * 60 - seconds_into_minute)
+                break
+
+        return seconds_until
+
     # YouTube連携の有効判定を行うコメント
     def _is_youtube_enabled(self) -> bool:
         """YouTube連携が設定されているか判定する。"""
@@ -1827,99 +6040,45 @@ class TwitchStreamMonitor:
         except OSError:
             LOGGER.warning("YouTube配信予定キャッシュの保存に失敗しました。")
 
-    # YouTube配信情報を取得するコメント
-    async def _fetch_youtube_stream_infos(self, now: float) -> Dict[str, YouTubeStreamInfo]:
-        """必要に応じてYouTube配信情報を取得する。"""
-
-        # 取得結果を初期化するコメント
-        results: Dict[str, YouTubeStreamInfo] = {}
-
-        # 設定がなければ取得しないコメント
-        if not self._is_youtube_enabled():
-            return results
-
-        # 取得間隔を満たしていなければスキップするコメント
-        if (now - self._youtube_last_polled_at) < self._settings.youtube_poll_interval_seconds:
-            return results
-
-        # 最終取得時刻を更新するコメント
-        self._youtube_last_polled_at = now
-
-        # APIキーとチャンネルID群を取り出すコメント
-        api_key = self._settings.youtube_api_key
-        channel_ids = self._settings.youtube_channel_ids
-        if not api_key or not channel_ids:
-            return results
-
-        # チャンネルごとに取得タスクを作るコメント
-        tasks = []
-        for channel_id in channel_ids:
-            tasks.append(fetch_youtube_stream_info(api_key=api_key, channel_id=channel_id))
-
-        # 取得結果を待つコメント
-        try:
-            fetched = await asyncio.gather(*tasks, return_exceptions=True)
-        except Exception as exc:
-            LOGGER.exception("YouTube配信情報の取得に失敗しました: %s", exc)
-            return results
-
-        # チャンネルごとの結果を整理するコメント
-        for channel_id, result in zip(channel_ids, fetched):
-            if isinstance(result, Exception):
-                LOGGER.error("YouTube配信情報の取得に失敗しました: %s", result)
-                continue
-            if result is None:
-                continue
-            results[channel_id] = result
-
-        return results
-
-    # YouTube配信予定情報を取得するコメント
-    async def _fetch_youtube_upcoming_infos(self, now: float) -> Dict[str, YouTubeUpcomingInfo]:
-        """必要に応じてYouTube配信予定情報を取得する。"""
-
-        # 取得結果を初期化するコメント
-        results: Dict[str, YouTubeUpcomingInfo] = {}
-
-        # 設定がなければ取得しないコメント
-        if not self._is_youtube_enabled():
-            return results
-
-        # 取得間隔を満たしていなければスキップするコメント
-        if (now - self._youtube_upcoming_last_polled_at) < self._settings.youtube_upcoming_poll_interval_seconds:
-            return results
-
-        # 最終取得時刻を更新するコメント
-        self._youtube_upcoming_last_polled_at = now
-
-        # APIキーとチャンネルID群を取り出すコメント
-        api_key = self._settings.youtube_api_key
-        channel_ids = self._settings.youtube_channel_ids
-        if not api_key or not channel_ids:
-            return results
-
-        # チャンネルごとに取得タスクを作るコメント
-        tasks = []
-        for channel_id in channel_ids:
-            tasks.append(fetch_youtube_upcoming_info(api_key=api_key, channel_id=channel_id))
-
-        # 取得結果を待つコメント
-        try:
-            fetched = await asyncio.gather(*tasks, return_exceptions=True)
-        except Exception as exc:
-            LOGGER.exception("YouTube配信予定情報の取得に失敗しました: %s", exc)
-            return results
-
-        # チャンネルごとの結果を整理するコメント
-        for channel_id, result in zip(channel_ids, fetched):
-            if isinstance(result, Exception):
-                LOGGER.error("YouTube配信予定情報の取得に失敗しました: %s", result)
-                continue
-            if result is None:
-                continue
-            results[channel_id] = result
+    # YouTubeの配信状態スナップショットを取得するコメント
+    async def _get_youtube_snapshot(self, max_age: float, fetch_timeout: float) -> Optional[YouTubeSnapshot]:
+        """新しいスナップショットがあれば再利用し、なければまとめて取得する。"""
+
+        # 同時に取得しないようにロックするコメント
+        async with self._youtube_snapshot_lock:
+            # 指定より新しい取得結果があれば再利用するコメント
+            snapshot = self._youtube_snapshot
+            started_at = time.time()
+            reuse_age = max_age - YOUTUBE_SNAPSHOT_REUSE_MARGIN_SECONDS
+            if snapshot is not None and (started_at - snapshot.fetched_at) < reuse_age:
+                return snapshot
+
+            # APIキーとチャンネルID群を取り出すコメント
+            api_key = self._settings.youtube_api_key
+            channel_ids = self._settings.youtube_channel_ids
+            if not api_key or not channel_ids:
+                return None
+
+            # 全チャンネルの配信中と配信予定を締め切り付きでまとめて取得するコメント
+            stream_infos, upcoming_infos = await asyncio.wait_for(
+                fetch_youtube_channel_states(
+                    client=self._http_client,
+                    api_key=api_key,
+                    channel_ids=channel_ids,
+                    ledger=self._youtube_quota_ledger,
+                    source=self._settings.youtube_discovery_source,
+                    now=started_at,
+                ),
+                timeout=fetch_timeout,
+            )
 
-        return results
+            # 次回のポーリングと同じ基準になるよう取得開始時刻とともに保持するコメント
+            self._youtube_snapshot = YouTubeSnapshot(
+                fetched_at=started_at,
+                stream_infos=stream_infos,
+                upcoming_infos=upcoming_infos,
+            )
+            return self._youtube_snapshot
 
     # 配信履歴を追加するコメント
     def _record_stream_history(self, session: StreamSession, ended_at: float) -> None:
@@ -1952,6 +6111,12 @@ class TwitchStreamMonitor:
         # キャッシュを書き込むコメント
         self._save_stream_history_cache()
 
+        # 開始時刻の傾向を更新するコメント
+        self._start_minute_profile = build_start_minute_profile(
+            [item["started_at"] for item in self._stream_history],
+            time.time(),
+        )
+
     # 月次配信統計を投稿するコメント
     async def _maybe_post_monthly_stats(self, now: float) -> None:
         """月初めに先月の配信統計を投稿する。"""
@@ -1995,8 +6160,8 @@ class TwitchStreamMonitor:
             diff_seconds=total_seconds - prev_seconds,
         )
 
-        # 投稿をキューに追加するコメント
-        await self._poster.enqueue_text(message)
+        # 投稿を告知のレーンに追加するコメント
+        await self._poster.enqueue_text(message, X_LANE_ANNOUNCEMENT)
         self._monthly_stats_posted.add(previous_month_key)
         self._save_monthly_stats_cache()
 
@@ -2056,7 +6221,7 @@ class TwitchStreamMonitor:
 
             # 投稿文を作成するコメント
             message = build_youtube_upcoming_tweet(upcoming_info, now)
-            await self._poster.enqueue_text(message)
+            await self._poster.enqueue_text(message, X_LANE_ANNOUNCEMENT)
             self._youtube_upcoming_posted_ids.add(upcoming_info.video_id)
             posted_any = True
 
@@ -2064,48 +6229,133 @@ class TwitchStreamMonitor:
         if posted_any:
             self._save_youtube_upcoming_cache()
 
-    # 配信状態を1回確認するコメント
-    async def _poll_once(self) -> None:
-        """配信状態を取得し、同接を記録する。"""
+    # Twitch配信状態を1回確認するコメント
+    async def _poll_twitch_stream(self, fetch_timeout: float) -> None:
+        """Twitchの配信状態を取得し、同接を記録する。"""
+
+        # Twitch配信情報を締め切り付きで取得し、401なら一度だけトークンを更新するコメント
+        stream_info = await asyncio.wait_for(
+            self._token_manager.call_with_token(
+                lambda access_token: fetch_twitch_stream_info(
+                    client=self._http_client,
+                    access_token=access_token,
+                    client_id=self._settings.twitch_client_id,
+                    user_login=self._settings.twitch_channel,
+                )
+            ),
+            timeout=fetch_timeout,
+        )
+
+        # 取得完了時刻をサンプル時刻にするコメント
+        fetched_at = time.time()
+
+        # 配信中かどうかで処理を分岐するコメント
+        if stream_info is None:
+            await self._handle_stream_offline(fetched_at)
+        else:
+            await self._handle_stream_live(stream_info, fetched_at)
+
+    # YouTube配信状態を1回確認するコメント
+    async def _poll_youtube_streams(self, fetch_timeout: float) -> None:
+        """YouTubeの配信状態を取得し、配信中なら同接を記録する。"""
 
-        # アクセストークンを取得するコメント
-        access_token = await self._token_manager.get_access_token()
+        # 周期内の取得結果があれば再利用するコメント
+        snapshot = await self._get_youtube_snapshot(self._settings.youtube_poll_interval_seconds, fetch_timeout)
+        if snapshot is None:
+            return
+
+        # 取得時刻でYouTubeの同接サンプルを記録するコメント
+        await self._record_youtube_samples(snapshot.stream_infos, snapshot.fetched_at)
 
-        # Twitch配信情報を取得するコメント
-        stream_info = await fetch_twitch_stream_info(
-            access_token=access_token,
-            client_id=self._settings.twitch_client_id,
-            user_login=self._settings.twitch_channel,
+    # YouTube配信予定を1回確認するコメント
+    async def _poll_youtube_upcoming(self, fetch_timeout: float) -> None:
+        """YouTubeの配信予定を取得して告知する。"""
+
+        # 周期内の取得結果があれば再利用するコメント
+        snapshot = await self._get_youtube_snapshot(
+            self._settings.youtube_upcoming_poll_interval_seconds,
+            fetch_timeout,
         )
+        if snapshot is None:
+            return
 
-        # 現在時刻を取得するコメント
+        # 配信予定時刻を開始見込みとして覚えるコメント
         now = time.time()
+        for upcoming_info in snapshot.upcoming_infos.values():
+            self._known_start_times[upcoming_info.video_id] = upcoming_info.scheduled_start
+        self._known_start_times = {
+            video_id: scheduled_start
+            for video_id, scheduled_start in self._known_start_times.items()
+            if scheduled_start + ADAPTIVE_START_TRAIL_SECONDS >= now
+        }
 
-        # YouTube配信情報を必要に応じて取得するコメント
-        youtube_infos = await self._fetch_youtube_stream_infos(now)
+        # 未投稿の配信予定を告知するコメント
+        await self._post_youtube_upcoming_infos(snapshot.upcoming_infos, now)
 
-        # YouTube配信予定情報を取得して投稿するコメント
-        upcoming_infos = await self._fetch_youtube_upcoming_infos(now)
-        await self._post_youtube_upcoming_infos(upcoming_infos, now)
+    # 月次配信統計を1回確認するコメント
+    async def _poll_monthly_stats(self, fetch_timeout: float) -> None:
+        """月次配信統計を必要に応じて投稿する。"""
 
-        # 月次配信統計を必要に応じて投稿するコメント
-        await self._maybe_post_monthly_stats(now)
+        # 通信は行わないため締め切りは使わずに現在時刻で投稿要否を判定するコメント
+        await self._maybe_post_monthly_stats(time.time())
 
-        # 配信中かどうかで処理を分岐するコメント
-        if stream_info is None:
-            await self._handle_stream_offline(now)
-        else:
-            await self._handle_stream_live(stream_info, now, youtube_infos)
+    # EventSubの配信開始通知を処理するコメント
+    async def _on_eventsub_stream_online(self, event: dict) -> None:
+        """配信開始通知でセッションを開始し、同接取得を前倒しする。"""
+
+        # 配信IDと開始時刻を取り出すコメント
+        stream_id = event.get("id")
+        if not isinstance(stream_id, str) or not stream_id.strip():
+            LOGGER.warning("EventSubの配信開始通知に配信IDがありません。")
+            self._twitch_wake_event.set()
+            return
+        started_at_raw = event.get("started_at")
+        started_at = parse_iso_datetime(started_at_raw if isinstance(started_at_raw, str) else None)
+        now = time.time()
+
+        # 同接なしでセッションを開始するコメント
+        LOGGER.info("EventSubで配信開始を検知しました。")
+        await self._handle_stream_live(
+            TwitchStreamInfo(
+                stream_id=stream_id.strip(),
+                started_at=started_at if started_at is not None else now,
+                viewer_count=0,
+                title="",
+            ),
+            now,
+            record_sample=False,
+        )
+
+        # Helixで同接とタイトルをすぐに取得させるコメント
+        self._twitch_wake_event.set()
+
+    # EventSubの配信終了通知を処理するコメント
+    async def _on_eventsub_stream_offline(self, event: dict) -> None:
+        """配信終了通知ですぐにサマリーを投稿する。"""
+
+        # 反映が遅れたHelixの応答で再開しないよう終了済みIDを覚えるコメント
+        LOGGER.info("EventSubで配信終了を検知しました。")
+        async with self._lock:
+            if self._session is not None:
+                self._ended_stream_ids.append(self._session.stream_id)
+        await self._handle_stream_offline(time.time())
 
     # 配信中の処理に関するコメント
     async def _handle_stream_live(
         self,
         stream_info: TwitchStreamInfo,
         now: float,
-        youtube_infos: Dict[str, YouTubeStreamInfo],
+        record_sample: bool = True,
     ) -> None:
         """配信中の同接情報を記録する。"""
 
+        # EventSubで終了済みの配信は無視するコメント
+        if stream_info.stream_id in self._ended_stream_ids:
+            return
+
+        # オフライン状態を解除するコメント
+        self._offline_since = None
+
         # セッションの更新をロック内で行うコメント
         previous_session = None
         async with self._lock:
@@ -2131,15 +6381,38 @@ class TwitchStreamMonitor:
                     youtube_channels={},
                 )
 
+            # 通知時点で未取得だったタイトルを補うコメント
+            if stream_info.title:
+                self._session.title = stream_info.title
+
             # 同接サンプルを追加するコメント
-            self._session.samples.append(
-                ViewerSample(
-                    timestamp=now,
-                    viewer_count=stream_info.viewer_count,
+            if record_sample:
+                self._session.samples.append(
+                    ViewerSample(
+                        timestamp=now,
+                        viewer_count=stream_info.viewer_count,
+                    )
                 )
-            )
 
-            # YouTubeの同接サンプルを追加するコメント
+        # 配信IDが変わった場合は前セッションを投稿するコメント
+        if previous_session is not None:
+            self._start_session_summary(previous_session, now)
+
+    # YouTubeの同接サンプルを記録するコメント
+    async def _record_youtube_samples(
+        self,
+        youtube_infos: Dict[str, YouTubeStreamInfo],
+        fetched_at: float,
+    ) -> None:
+        """Twitch配信中のセッションにYouTubeの同接を追加する。"""
+
+        # セッションの更新をロック内で行うコメント
+        async with self._lock:
+            # Twitch配信中でなければ記録しないコメント
+            if self._session is None:
+                return
+
+            # チャンネルごとにサンプルを追加するコメント
             for channel_id, youtube_info in youtube_infos.items():
                 channel_session = self._session.youtube_channels.get(channel_id)
                 if channel_session is None or channel_session.video_id != youtube_info.video_id:
@@ -2156,21 +6429,26 @@ class TwitchStreamMonitor:
                     channel_session.title = youtube_info.title
                     channel_session.channel_title = youtube_info.channel_title
                     channel_session.started_at = youtube_info.started_at
+
+                # 再利用されたスナップショットで同じ時刻のサンプルを重ねないコメント
+                samples = channel_session.samples
+                if samples and samples[-1].timestamp >= fetched_at:
+                    continue
                 channel_session.samples.append(
                     ViewerSample(
-                        timestamp=now,
+                        timestamp=fetched_at,
                         viewer_count=youtube_info.viewer_count,
                     )
                 )
 
-        # 配信IDが変わった場合は前セッションを投稿するコメント
-        if previous_session is not None:
-            await self._post_session_summary(previous_session, now)
-
     # 配信終了時の処理に関するコメント
     async def _handle_stream_offline(self, now: float) -> None:
         """配信が終了した場合にグラフ投稿を行う。"""
 
+        # オフラインになった時刻を記録するコメント
+        if self._offline_since is None:
+            self._offline_since = now
+
         # セッションを取り出すコメント
         async with self._lock:
             session = self._session
@@ -2181,7 +6459,26 @@ class TwitchStreamMonitor:
             return
 
         # セッションのサマリーを投稿するコメント
-        await self._post_session_summary(session, now)
+        self._start_session_summary(session, now)
+
+    # サマリー投稿を別タスクで始める処理に関するコメント
+    def _start_session_summary(self, session: StreamSession, ended_at: float) -> None:
+        """監視の締め切りで打ち切られないよう、サマリー投稿を独立したタスクで実行する。"""
+
+        # 終了時に待てるよう実行中のタスクを保持するコメント
+        task = asyncio.create_task(self._run_session_summary(session, ended_at))
+        self._summary_tasks.add(task)
+        task.add_done_callback(self._summary_tasks.discard)
+
+    # サマリー投稿タスクの本体に関するコメント
+    async def _run_session_summary(self, session: StreamSession, ended_at: float) -> None:
+        """サマリーを投稿し、失敗してもログに残して監視を続ける。"""
+
+        # 例外をタスク内で記録するコメント
+        try:
+            await self._post_session_summary(session, ended_at)
+        except Exception as exc:
+            LOGGER.exception("配信のまとめの投稿に失敗しました: %s", exc)
 
     # セッションのサマリー投稿処理に関するコメント
     async def _post_session_summary(self, session: StreamSession, ended_at: float) -> None:
@@ -2190,8 +6487,12 @@ class TwitchStreamMonitor:
         # 配信履歴を記録するコメント
         self._record_stream_history(session, ended_at)
 
-        # YouTubeの系列データを整形するコメント
-        youtube_series: List[Tuple[str, Deque[ViewerSample]]] = []
+        # 描画プロセスに渡すよう系列データを数値配列にするコメント
+        twitch_series = build_graph_series(
+            f"[Twitch]{self._settings.twitch_channel}",
+            ((sample.timestamp, sample.viewer_count) for sample in session.samples),
+        )
+        youtube_series: List[GraphSeries] = []
         youtube_channel_ids = [
             channel_id
             for channel_id in session.youtube_channel_ids
@@ -2202,23 +6503,44 @@ class TwitchStreamMonitor:
             label = channel_session.channel_title or channel_id
             if not label:
                 label = f"YouTube{index}"
-            youtube_series.append((f"[YouTube]{label}", channel_session.samples))
+            youtube_series.append(
+                build_graph_series(
+                    f"[YouTube]{label}",
+                    ((sample.timestamp, sample.viewer_count) for sample in channel_session.samples),
+                )
+            )
+        chat_rate_series = build_graph_series("チャット数/分", session.chat_rate.series())
 
-        # グラフ画像を生成するコメント
+        # グラフ画像を別プロセスで生成するコメント
         graph_path = self._create_graph_path()
-        generate_viewer_graph(
-            session.samples,
-            graph_path,
-            session.title,
-            youtube_series if youtube_series else None,
-            twitch_label=f"[Twitch]{self._settings.twitch_channel}",
-        )
+        rendered = False
+        try:
+            rendered = await self._graph_renderer.render(
+                twitch_series,
+                graph_path,
+                session.title,
+                youtube_series if youtube_series else None,
+                chat_rate_series,
+            )
+        finally:
+            # 描画できなかった一時ファイルは中断時も削除するコメント
+            if not rendered:
+                try:
+                    os.remove(graph_path)
+                except OSError:
+                    pass
 
         # 投稿文を作成するコメント
         summary_text = build_stream_summary_tweet(session, ended_at)
 
+        # 描画できなければ画像なしでまとめを投稿するコメント
+        if not rendered:
+            LOGGER.warning("同接グラフなしで配信のまとめを投稿します。")
+            await self._poster.enqueue_text(summary_text, X_LANE_SUMMARY)
+            return
+
         # 画像付き投稿をキューに追加するコメント
-        await self._poster.enqueue_media(summary_text, graph_path, graph_path)
+        await self._poster.enqueue_media(summary_text, graph_path, graph_path, X_LANE_SUMMARY)
 
     # 一時ファイルのパスを作成するコメント
     def _create_graph_path(self) -> str:
@@ -2231,36 +6553,21 @@ class TwitchStreamMonitor:
 
 
 # X APIクライアント作成関数に関するコメント
-def create_x_client(settings: Settings) -> tweepy.Client:
-    """Xのクライアントを生成して返す。"""
+def create_x_client(settings: Settings, http_client: httpx.AsyncClient) -> AsyncXClient:
+    """共有のHTTPクライアントを使うXのクライアントを生成して返す。"""
 
-    # Tweepyのクライアントを構築するコメント
-    return tweepy.Client(
-        bearer_token=settings.x_bearer_token,
+    # OAuth 1.0aの認証情報と接続先を渡すコメント
+    return AsyncXClient(
+        http_client=http_client,
         consumer_key=settings.x_api_key,
         consumer_secret=settings.x_api_secret,
         access_token=settings.x_access_token,
-        access_token_secret=settings.x_access_secret,
-        wait_on_rate_limit=True,
+        access_secret=settings.x_access_secret,
+        api_base_url=settings.x_api_base_url,
+        upload_base_url=settings.x_upload_base_url,
     )
 
 
-# Xのメディア投稿用クライアントを作成する関数に関するコメント
-def create_x_media_client(settings: Settings) -> tweepy.API:
-    """Xのメディアアップロード用クライアントを生成する。"""
-
-    # OAuth1.0aの認証情報を作成するコメント
-    auth = tweepy.OAuth1UserHandler(
-        settings.x_api_key,
-        settings.x_api_secret,
-        settings.x_access_token,
-        settings.x_access_secret,
-    )
-
-    # TweepyのAPIクライアントを作成するコメント
-    return tweepy.API(auth, wait_on_rate_limit=True)
-
-
 # ログ設定を初期化する関数に関するコメント
 def setup_logging() -> None:
     """ログ設定を初期化する。"""
@@ -2276,53 +6583,119 @@ def setup_logging() -> None:
 async def run_bot(settings: Settings) -> None:
     """Botの起動と終了処理を非同期で行う。"""
 
-    # Xクライアントと投稿ワーカーを準備するコメント
-    x_client = create_x_client(settings)
-    x_media_client = create_x_media_client(settings)
-    poster = XPoster(
-        client=x_client,
-        media_client=x_media_client,
-        interval_seconds=settings.x_post_interval_seconds,
-        queue_size=settings.x_queue_size,
-        reply_setting=settings.x_reply_setting,
-        reply_mentions=settings.x_reply_mention_users,
-    )
-
-    # Twitchのトークン管理を準備するコメント
-    token_manager = TwitchTokenManager(
-        client_id=settings.twitch_client_id,
-        client_secret=settings.twitch_client_secret,
-        refresh_token=settings.twitch_refresh_token,
+    # 運用指標の集計を準備するコメント
+    metrics = MetricsRegistry(
+        Path(settings.metrics_path) if settings.metrics_path else None,
+        settings.metrics_write_interval_seconds,
     )
 
-    # Twitchのユーザー名を解決するコメント
+    # 全てのAPI呼び出しで共有するHTTPクライアントを準備するコメント
+    http_client = create_http_client(settings)
     try:
-        resolved_nick = await resolve_twitch_nick(settings, token_manager)
-    except Exception as exc:
-        LOGGER.exception("Twitchユーザー名解決に失敗しました: %s", exc)
-        raise
+        # 共有のHTTPクライアントで投稿するXクライアントと投稿ワーカーを準備するコメント
+        poster = XPoster(
+            client=create_x_client(settings, http_client),
+            rate_limiter=XPostRateLimiter(
+                interval_seconds=settings.x_post_interval_seconds,
+                burst=settings.x_post_burst,
+                daily_limit=settings.x_daily_post_limit,
+                daily_reserved=settings.x_daily_reserved_posts,
+                cache_path=Path(__file__).resolve().parent / X_POST_QUOTA_FILENAME,
+                metrics=metrics,
+            ),
+            queue_size=settings.x_queue_size,
+            reply_setting=settings.x_reply_setting,
+            reply_mentions=settings.x_reply_mention_users,
+            store=XPostJobStore(Path(settings.x_queue_db_path)),
+            media_dir=Path(settings.x_queue_db_path).resolve().parent / X_QUEUE_MEDIA_DIRNAME,
+            metrics=metrics,
+            max_attempts=settings.x_post_max_attempts,
+            dead_letter_path=Path(settings.x_dead_letter_path),
+            dedup=XPostDedupCache(
+                cache_path=Path(settings.x_queue_db_path).resolve().parent / X_POST_DEDUP_FILENAME,
+                ttl_seconds=settings.x_dedup_ttl_seconds,
+                max_entries=settings.x_dedup_max_entries,
+            )
+            if settings.x_dedup_enabled
+            else None,
+            dedup_merge_policy=settings.x_dedup_merge_policy,
+        )
 
-    # 投稿ワーカーを起動するコメント
-    poster.start()
+        # Twitchのトークン管理を準備するコメント
+        token_manager = TwitchTokenManager(
+            http_client=http_client,
+            client_id=settings.twitch_client_id,
+            client_secret=settings.twitch_client_secret,
+            refresh_token=settings.twitch_refresh_token,
+            cache_path=Path(__file__).resolve().parent / TWITCH_TOKEN_CACHE_FILENAME,
+        )
 
-    # Twitch IRCリスナーを起動するコメント
-    listener = TwitchIRCListener(settings, poster, token_manager, resolved_nick)
+        # Twitchのユーザー名を解決するコメント
+        try:
+            resolved_nick = await resolve_twitch_nick(settings, token_manager)
+        except Exception as exc:
+            LOGGER.exception("Twitchユーザー名解決に失敗しました: %s", exc)
+            raise
 
-    # Twitch配信監視を起動するコメント
-    stream_monitor = TwitchStreamMonitor(settings, poster, token_manager)
-    stream_monitor.start()
-    try:
-        await listener.run()
+        # トークンの先行更新と投稿ワーカーと指標の書き出しを起動するコメント
+        token_manager.start()
+        poster.start()
+        metrics.start()
+
+        # 設定されていればチャットアーカイブを起動するコメント
+        archiver: Optional[ChatArchiver] = None
+        if settings.chat_archive_dir:
+            archiver = ChatArchiver(Path(settings.chat_archive_dir), settings.chat_archive_segment_seconds)
+            archiver.start()
+
+        # 配信終了時の描画を待たせないよう描画プロセスを先に起動するコメント
+        graph_renderer = GraphRenderer(settings.graph_render_timeout_seconds)
+        graph_renderer.start()
+
+        # Twitch配信監視を起動するコメント
+        stream_monitor = TwitchStreamMonitor(settings, poster, token_manager, http_client, graph_renderer)
+        stream_monitor.start()
+
+        # 配信中のチャット速度も記録するTwitch IRCリスナーを起動するコメント
+        listener = TwitchIRCListener(
+            settings,
+            poster,
+            token_manager,
+            resolved_nick,
+            archiver,
+            stream_monitor.current_chat_rate,
+        )
+        try:
+            await listener.run()
+        finally:
+            # クリーンアップ処理を行うコメント
+            stream_monitor.stop()
+            await stream_monitor.close()
+            await graph_renderer.close()
+            if archiver is not None:
+                await archiver.close()
+            await poster.close()
+            await metrics.close()
+            await token_manager.close()
     finally:
-        # クリーンアップ処理を行うコメント
-        stream_monitor.stop()
-        await stream_monitor.close()
-        await poster.close()
+        # 共有HTTPクライアントの接続を閉じるコメント
+        await http_client.aclose()
 
 
 # メイン処理に関するコメント
 def main() -> None:
-    """設定を読み込みBotを起動する。"""
+    """設定を読み込みBotを起動するか、指定されたコマンドを実行する。"""
+
+    # コマンドライン引数を解析するコメント
+    parser = argparse.ArgumentParser(description="TwitchのチャットをXに投稿するBot")
+    parser.add_argument(
+        "command",
+        nargs="?",
+        default="run",
+        choices=["run", "redrive-dead-letters"],
+        help="run: Botを起動する / redrive-dead-letters: 退避した投稿を投稿キューに戻す",
+    )
+    args = parser.parse_args()
 
     # ログ初期化のコメント
     setup_logging()
@@ -2334,6 +6707,16 @@ def main() -> None:
         LOGGER.error("設定の読み込みに失敗しました: %s", exc)
         raise SystemExit(1) from exc
 
+    # 退避した投稿を戻すだけなら投稿キューを開いて終了するコメント
+    if args.command == "redrive-dead-letters":
+        store = XPostJobStore(Path(settings.x_queue_db_path))
+        try:
+            redriven = redrive_dead_letters(store, Path(settings.x_dead_letter_path))
+        finally:
+            store.close()
+        LOGGER.info("退避した投稿を投稿キューに戻しました: %s件", redriven)
+        return
+
     # 非同期処理を実行するコメント
     try:
         asyncio.run(run_bot(settings))
@@ -0,0 +1,137 @@
+"""同接グラフの描画中にイベントループが止まる時間を、直接描画と描画プロセスで比べる。"""
+
+# 標準ライブラリの読み込みに関するコメント
+import argparse
+import asyncio
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, List, Tuple
+
+# リポジトリ直下のmain.pyを読み込めるようにするコメント
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+
+# 合成した同接サンプルを作る関数に関するコメント
+def generate_viewer_points(count: int, seed: int = 0) -> List[Tuple[float, int]]:
+    """配信中の同接推移を模した時刻と同接数の組を返す。"""
+
+    # 乱数を固定して緩やかに増減させるコメント
+    rng = random.Random(seed)
+    started = time.time() - count * 5.0
+    viewers = 20000
+    points = []
+    for index in range(count):
+        viewers = max(0, viewers + rng.randint(-300, 320))
+        points.append((started + index * 5.0, viewers))
+    return points
+
+
+# イベントループの遅延を測る関数に関するコメント
+async def measure_loop_lag(
+    render: Callable[[], Awaitable[object]],
+    tick_seconds: float,
+) -> Tuple[float, float, float]:
+    """描画中に一定間隔で起きる処理の遅れを測り、最大と99パーセンタイルと描画秒数を返す。"""
+
+    # IRCの受信処理の代わりに一定間隔で起きる処理を動かすコメント
+    lags: List[float] = []
+    stop = asyncio.Event()
+
+    async def ticker() -> None:
+        while not stop.is_set():
+            expected = time.perf_counter() + tick_seconds
+            await asyncio.sleep(tick_seconds)
+            lags.append(max(0.0, time.perf_counter() - expected))
+
+    ticker_task = asyncio.create_task(ticker())
+    await asyncio.sleep(tick_seconds * 5)
+    lags.clear()
+
+    # 描画を実行して終わるまで測るコメント
+    started = time.perf_counter()
+    await render()
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await ticker_task
+
+    # 遅れを集計するコメント
+    ordered = sorted(lags) or [0.0]
+    p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+    return ordered[-1], p99, elapsed
+
+
+# コマンドライン引数を解析する関数に関するコメント
+def parse_args() -> argparse.Namespace:
+    """サンプル数と計測回数の指定を解析する。"""
+
+    # 引数の定義に関するコメント
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--points", type=int, default=5000, help="描画する同接サンプル数")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--tick", type=float, default=0.01, help="遅延を測る処理の間隔の秒数")
+    return parser.parse_args()
+
+
+# 計測処理に関するコメント
+async def run_benchmark(args: argparse.Namespace) -> None:
+    """直接描画と描画プロセスでのイベントループの遅れを表示する。"""
+
+    # Botの処理を読み込むコメント
+    import main as bot
+
+    # 描画する系列を用意するコメント
+    points = generate_viewer_points(args.points)
+    twitch_series = bot.build_graph_series("[Twitch]hikakin", points)
+    youtube_series = [bot.build_graph_series("[YouTube]HikakinTV", [(ts, count // 3) for ts, count in points])]
+    chat_rate_series = bot.build_graph_series(
+        "チャット数/分",
+        [(points[index][0], 600 + index % 200) for index in range(0, len(points), 12)],
+    )
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        output_path = str(Path(temp_dir) / "graph.png")
+
+        # 変更前と同じくイベントループ上で直接描画するコメント
+        async def render_inline() -> object:
+            bot.generate_viewer_graph(twitch_series, output_path, "bench", youtube_series, chat_rate_series)
+            return True
+
+        # 描画プロセスに任せるコメント
+        renderer = bot.GraphRenderer(bot.GRAPH_RENDER_TIMEOUT_SECONDS)
+        renderer.start()
+
+        async def render_in_pool() -> object:
+            rendered = await renderer.render(twitch_series, output_path, "bench", youtube_series, chat_rate_series)
+            if not rendered:
+                raise RuntimeError("描画プロセスでの描画に失敗しました。")
+            return rendered
+
+        # 事前準備の完了を待ってから交互に計測するコメント
+        await render_in_pool()
+        try:
+            for label, render in (("inline", render_inline), ("process", render_in_pool)):
+                for attempt in range(args.repeat):
+                    max_lag, p99_lag, elapsed = await measure_loop_lag(render, args.tick)
+                    print(
+                        f"{label:8s} #{attempt + 1}: 描画 {elapsed * 1000:8.1f} ms / "
+                        f"最大遅延 {max_lag * 1000:8.1f} ms / p99遅延 {p99_lag * 1000:6.1f} ms"
+                    )
+        finally:
+            await renderer.close()
+
+
+# メイン処理に関するコメント
+def main() -> None:
+    """計測を実行する。"""
+
+    # 非同期処理を実行するコメント
+    asyncio.run(run_benchmark(parse_args()))
+
+
+# エントリポイントの定義に関するコメント
+if __name__ == "__main__":
+    main()
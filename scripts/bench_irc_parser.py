@@ -0,0 +1,115 @@
+"""IRCv3パーサーと変更前の正規表現による解析の処理性能を比較する。"""
+
+# 標準ライブラリの読み込みに関するコメント
+import argparse
+import sys
+import time
+from pathlib import Path
+from typing import Callable, List, TypeVar
+
+# リポジトリ直下のmain.pyを読み込めるようにするコメント
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+from irc_corpus import LEGACY_PRIVMSG_PATTERN, handle_line_legacy, prepare_chat_corpus  # noqa: E402
+
+
+# 計測対象の行の型に関するコメント
+T = TypeVar("T")
+
+
+# 計測処理を行う関数に関するコメント
+def measure(lines: List[T], parser: Callable[[T], object], repeat: int) -> float:
+    """最良の試行での毎秒解析行数を返す。"""
+
+    # 複数回試行して最も速い結果を採用するコメント
+    best_seconds = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for line in lines:
+            parser(line)
+        best_seconds = min(best_seconds, time.perf_counter() - started)
+    return len(lines) / best_seconds
+
+
+# コマンドライン引数を解析する関数に関するコメント
+def parse_args() -> argparse.Namespace:
+    """コーパスと計測回数の指定を解析する。"""
+
+    # 引数の定義に関するコメント
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--corpus", help="1行1メッセージで記録した生の受信行ファイル")
+    parser.add_argument("--lines", type=int, default=200000)
+    parser.add_argument("--repeat", type=int, default=5)
+    return parser.parse_args()
+
+
+# メイン処理に関するコメント
+def main() -> None:
+    """変更前後の解析処理を同じコーパスで計測して表示する。"""
+
+    # Botの処理を読み込むコメント
+    import main as bot
+
+    # デコード済みの行を用意して解析処理だけを比べるコメント
+    args = parse_args()
+    raw_lines = prepare_chat_corpus(args.corpus, args.lines)
+    lines = [raw_line.decode("utf-8", errors="ignore").strip("\r\n") for raw_line in raw_lines]
+    channel = bot.TARGET_TWITCH_USER_LOWER
+
+    # 変更前の処理はタグを捨てて正規表現で解析するコメント
+    def legacy(line: str) -> object:
+        if line.startswith("@"):
+            parts = line.split(" ", 1)
+            line = parts[1] if len(parts) == 2 else ""
+        match = LEGACY_PRIVMSG_PATTERN.match(line)
+        if match is None:
+            return None
+        return match.group("user"), match.group("channel"), match.group("message")
+
+    # 新しい処理は送信者とチャンネルと本文を取り出すコメント
+    def tokenizer(line: str) -> object:
+        message = bot.parse_irc_message(line)
+        if message is None or message.command != "PRIVMSG":
+            return None
+        return message.nick, message.channel, message.trailing
+
+    # タグまで参照した場合の処理に関するコメント
+    def tokenizer_with_tags(line: str) -> object:
+        message = bot.parse_irc_message(line)
+        if message is None or message.command != "PRIVMSG":
+            return None
+        return message.nick, message.channel, message.trailing, message.tag("id"), message.tag("tmi-sent-ts")
+
+    # 受信処理全体として変更前の経路を再現するコメント
+    def legacy_ingest(raw_line: bytes) -> object:
+        return handle_line_legacy(raw_line, channel, channel)
+
+    # 絞り込みとIRCv3パーサーを組み合わせた現在の経路に関するコメント
+    def current_ingest(raw_line: bytes) -> object:
+        if not bot.is_candidate_irc_line(raw_line):
+            return None
+        return tokenizer_with_tags(raw_line.decode("utf-8", errors="ignore").strip("\r\n"))
+
+    # 結果が一致することを確認するコメント
+    for line in lines:
+        if legacy(line) != tokenizer(line):
+            raise SystemExit(f"解析結果が一致しません: {line}")
+
+    # 計測して結果を表示するコメント
+    legacy_rate = measure(lines, legacy, args.repeat)
+    tokenizer_rate = measure(lines, tokenizer, args.repeat)
+    tagged_rate = measure(lines, tokenizer_with_tags, args.repeat)
+    legacy_ingest_rate = measure(raw_lines, legacy_ingest, args.repeat)
+    current_ingest_rate = measure(raw_lines, current_ingest, args.repeat)
+    print(f"lines: {len(lines)}")
+    print(f"parse only, regex (tags dropped):       {legacy_rate:,.0f} lines/sec")
+    print(f"parse only, tokenizer:                  {tokenizer_rate:,.0f} lines/sec")
+    print(f"parse only, tokenizer + id/tmi-sent-ts: {tagged_rate:,.0f} lines/sec")
+    print(f"ingest, decode + regex:                 {legacy_ingest_rate:,.0f} lines/sec")
+    print(f"ingest, prefilter + tokenizer + tags:   {current_ingest_rate:,.0f} lines/sec")
+
+
+# エントリポイントの定義に関するコメント
+if __name__ == "__main__":
+    main()
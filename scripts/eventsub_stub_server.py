@@ -0,0 +1,298 @@
+"""記録済みのEventSubペイロードを配信するローカルの代替サーバー。"""
+
+# 標準ライブラリの読み込みに関するコメント
+import argparse
+import asyncio
+import json
+import sys
+import threading
+import types
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import List, Tuple
+
+# リポジトリ直下のmain.pyを読み込めるようにするコメント
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+# 既定の記録ファイルを定義するコメント
+DEFAULT_FIXTURE_PATH = Path(__file__).resolve().parent / "fixtures" / "eventsub_stream_events.jsonl"
+
+# 代替サーバーが返す配信者IDを定義するコメント
+STUB_BROADCASTER_USER_ID = "1337"
+
+
+# 記録済みメッセージを読み込む関数に関するコメント
+def load_recorded_messages(path: Path) -> List[Tuple[float, dict]]:
+    """JSONLから送信待ち秒数とメッセージの組を読み込む。"""
+
+    # 1行ずつ解析するコメント
+    messages = []
+    with path.open("r", encoding="utf-8") as file_handle:
+        for line in file_handle:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            messages.append((float(record.get("delay_seconds", 0.0)), record["message"]))
+    return messages
+
+
+# Helix APIの代替ハンドラーに関するコメント
+class StubHelixHandler(BaseHTTPRequestHandler):
+    """購読登録とユーザー取得だけを受け付ける。"""
+
+    # 登録された購読種別を保持するコメント
+    subscribed_types: List[str] = []
+
+    # 購読登録を受け付けるコメント
+    def do_POST(self) -> None:  # noqa: N802
+        """EventSubの購読登録に202で応答する。"""
+
+        # 本文を読み込むコメント
+        length = int(self.headers.get("Content-Length", "0"))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if not self.path.startswith("/eventsub/subscriptions"):
+            self._send_json(404, {"error": "Not Found"})
+            return
+
+        # 登録内容を記録して応答するコメント
+        StubHelixHandler.subscribed_types.append(str(body.get("type")))
+        self._send_json(
+            202,
+            {
+                "data": [
+                    {
+                        "id": str(uuid.uuid4()),
+                        "status": "enabled",
+                        "type": body.get("type"),
+                        "version": body.get("version"),
+                        "condition": body.get("condition"),
+                        "transport": body.get("transport"),
+                        "cost": 0,
+                    }
+                ],
+                "total": len(StubHelixHandler.subscribed_types),
+                "total_cost": 0,
+                "max_total_cost": 10,
+            },
+        )
+
+    # ユーザー取得を受け付けるコメント
+    def do_GET(self) -> None:  # noqa: N802
+        """ユーザー取得に固定の配信者IDで応答する。"""
+
+        # ユーザー取得以外は404にするコメント
+        if not self.path.startswith("/helix/users"):
+            self._send_json(404, {"error": "Not Found"})
+            return
+        self._send_json(200, {"data": [{"id": STUB_BROADCASTER_USER_ID, "login": "hikakin"}]})
+
+    # JSON応答を送るコメント
+    def _send_json(self, status: int, payload: dict) -> None:
+        """JSONを指定ステータスで返す。"""
+
+        # 本文を組み立てて送信するコメント
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    # アクセスログを抑制するコメント
+    def log_message(self, format: str, *args: object) -> None:  # noqa: A002
+        """標準エラーへのアクセスログを出さない。"""
+
+
+# Helix代替サーバーを別スレッドで起動する関数に関するコメント
+def start_http_stub(host: str, port: int) -> ThreadingHTTPServer:
+    """購読登録用のHTTPサーバーを起動して返す。"""
+
+    # デーモンスレッドで待ち受けるコメント
+    server = ThreadingHTTPServer((host, port), StubHelixHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+# EventSubの代替WebSocketサーバーを起動する関数に関するコメント
+async def start_eventsub_stub(
+    host: str,
+    port: int,
+    messages: List[Tuple[float, dict]],
+    keepalive_seconds: int,
+) -> object:
+    """接続ごとにウェルカムと記録済みメッセージを送るサーバーを起動する。"""
+
+    # 依存ライブラリを読み込むコメント
+    import websockets
+
+    # 接続ごとの送信処理に関するコメント
+    async def handler(websocket: object) -> None:
+        # ウェルカムメッセージを送るコメント
+        welcome = {
+            "metadata": {
+                "message_id": str(uuid.uuid4()),
+                "message_type": "session_welcome",
+                "message_timestamp": "2026-01-01T10:59:50.000000000Z",
+            },
+            "payload": {
+                "session": {
+                    "id": f"stub-{uuid.uuid4()}",
+                    "status": "connected",
+                    "connected_at": "2026-01-01T10:59:50.000000000Z",
+                    "keepalive_timeout_seconds": keepalive_seconds,
+                    "reconnect_url": None,
+                }
+            },
+        }
+        await websocket.send(json.dumps(welcome))
+
+        # 記録済みメッセージを順に送るコメント
+        for delay_seconds, message in messages:
+            await asyncio.sleep(delay_seconds)
+            await websocket.send(json.dumps(message))
+        await websocket.wait_closed()
+
+    return await websockets.serve(handler, host, port)
+
+
+# 代替サーバーとして待ち受ける処理に関するコメント
+async def run_serve(args: argparse.Namespace) -> None:
+    """Botから接続できるよう代替サーバーを起動し続ける。"""
+
+    # 記録済みメッセージを読み込んで起動するコメント
+    messages = load_recorded_messages(Path(args.fixture))
+    http_server = start_http_stub(args.host, args.http_port)
+    await start_eventsub_stub(args.host, args.ws_port, messages, args.keepalive_seconds)
+
+    # 接続先を案内するコメント
+    print(f"TWITCH_EVENTSUB_WS_URL=ws://{args.host}:{args.ws_port}/ws")
+    print(
+        "TWITCH_EVENTSUB_SUBSCRIPTIONS_ENDPOINT="
+        f"http://{args.host}:{http_server.server_address[1]}/eventsub/subscriptions"
+    )
+    await asyncio.Future()
+
+
+# 代替サーバーに対してEventSub受信クラスを検証する処理に関するコメント
+async def run_check(args: argparse.Namespace) -> int:
+    """TwitchEventSubClientが記録済み通知を正しく処理するか確認する。"""
+
+    # Botの依存ライブラリを読み込むコメント
+    import httpx
+
+    import main
+
+    # 空きポートで代替サーバーを起動するコメント
+    messages = load_recorded_messages(Path(args.fixture))
+    http_server = start_http_stub(args.host, 0)
+    http_port = http_server.server_address[1]
+    ws_server = await start_eventsub_stub(args.host, 0, messages, args.keepalive_seconds)
+    ws_port = list(ws_server.sockets)[0].getsockname()[1]
+
+    # Helixへの通信を代替サーバーに向けるコメント
+    class RedirectTransport(httpx.AsyncBaseTransport):
+        """全てのリクエストを代替サーバーに転送する。"""
+
+        def __init__(self) -> None:
+            self._transport = httpx.AsyncHTTPTransport()
+
+        async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+            request.url = request.url.copy_with(scheme="http", host=args.host, port=http_port)
+            return await self._transport.handle_async_request(request)
+
+    # 固定トークンを返す代替トークン管理に関するコメント
+    class StubTokenManager:
+        """代替サーバー用の固定トークンを返す。"""
+
+        async def get_access_token(self) -> str:
+            return "stub-token"
+
+        async def call_with_token(self, request: object) -> object:
+            return await request(await self.get_access_token())
+
+    # 受信したイベントを記録するコメント
+    received: List[Tuple[str, object]] = []
+    finished = asyncio.Event()
+
+    async def on_online(event: dict) -> None:
+        received.append(("stream.online", event.get("id")))
+
+    async def on_offline(event: dict) -> None:
+        received.append(("stream.offline", event.get("broadcaster_user_login")))
+        finished.set()
+
+    # EventSub受信クラスを起動するコメント
+    settings = types.SimpleNamespace(
+        twitch_channel="hikakin",
+        twitch_client_id="stub-client",
+        twitch_eventsub_ws_url=f"ws://{args.host}:{ws_port}/ws",
+        twitch_eventsub_subscriptions_endpoint=f"http://{args.host}:{http_port}/eventsub/subscriptions",
+    )
+    async with httpx.AsyncClient(transport=RedirectTransport()) as http_client:
+        client = main.TwitchEventSubClient(
+            settings=settings,
+            token_manager=StubTokenManager(),
+            http_client=http_client,
+            on_stream_online=on_online,
+            on_stream_offline=on_offline,
+            on_disconnected=lambda: None,
+        )
+        task = asyncio.create_task(client.run())
+        try:
+            await asyncio.wait_for(finished.wait(), timeout=args.timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            ws_server.close()
+            http_server.shutdown()
+
+    # 結果を判定して表示するコメント
+    expected = [("stream.online", "9001"), ("stream.offline", "hikakin")]
+    print(f"subscriptions: {StubHelixHandler.subscribed_types}")
+    print(f"received: {received}")
+    if received != expected or sorted(StubHelixHandler.subscribed_types) != [
+        "stream.offline",
+        "stream.online",
+    ]:
+        print("NG")
+        return 1
+    print("OK")
+    return 0
+
+
+# コマンドライン引数を解析する関数に関するコメント
+def parse_args() -> argparse.Namespace:
+    """サブコマンドと接続設定を解析する。"""
+
+    # 引数の定義に関するコメント
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("command", choices=["serve", "check"])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--ws-port", type=int, default=8080)
+    parser.add_argument("--http-port", type=int, default=8081)
+    parser.add_argument("--fixture", default=str(DEFAULT_FIXTURE_PATH))
+    parser.add_argument("--keepalive-seconds", type=int, default=10)
+    parser.add_argument("--timeout", type=float, default=20.0)
+    return parser.parse_args()
+
+
+# メイン処理に関するコメント
+def main() -> None:
+    """指定されたサブコマンドを実行する。"""
+
+    # サブコマンドで分岐するコメント
+    args = parse_args()
+    if args.command == "serve":
+        asyncio.run(run_serve(args))
+        return
+    raise SystemExit(asyncio.run(run_check(args)))
+
+
+# エントリポイントの定義に関するコメント
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""ベンチマークやリプレイで使うTwitch IRCの受信行コーパスを用意する。"""
+
+# 標準ライブラリの読み込みに関するコメント
+import random
+import re
+import uuid
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+# 生成するコメントの発言者数を定義するコメント
+SYNTHETIC_VIEWER_COUNT = 5000
+
+# 生成するコメント本文の候補を定義するコメント
+SYNTHETIC_MESSAGES = [
+    "ブンブンハローYouTube",
+    "きたああああ",
+    "ヒカキンさんこんばんは！",
+    "www",
+    "8888888888",
+    "初見です",
+    "今日も楽しみにしてました",
+    "セイキン来て",
+    "草",
+    "おつかれさまです",
+]
+
+# 対象ユーザーのIDを定義するコメント
+SYNTHETIC_TARGET_USER_ID = "1337"
+
+# 変更前のPRIVMSG解析用の正規表現を再現するコメント
+LEGACY_PRIVMSG_PATTERN = re.compile(
+    r"^:(?P<user>[^!]+)![^ ]+ PRIVMSG #(?P<channel>[^ ]+) :(?P<message>.*)$"
+)
+
+
+# 変更前の1行分の処理を再現する関数に関するコメント
+def handle_line_legacy(raw_line: bytes, channel: str, target_user: str) -> Optional[Tuple[str, str, str]]:
+    """デコードしてタグを除去し正規表現で解析する。"""
+
+    # 受信行を必ずデコードするコメント
+    line = raw_line.decode("utf-8", errors="ignore").strip("\r\n")
+    if line.startswith("PING "):
+        return None
+
+    # タグを除去して解析するコメント
+    if line.startswith("@"):
+        parts = line.split(" ", 1)
+        line = parts[1] if len(parts) == 2 else ""
+    match = LEGACY_PRIVMSG_PATTERN.match(line)
+    if not match:
+        return None
+    author, message_channel, message = match.group("user"), match.group("channel"), match.group("message")
+    if message_channel.lower() != channel or author.lower() != target_user:
+        return None
+    return author, message_channel, message
+
+
+# 受信行を1行組み立てる関数に関するコメント
+def build_privmsg_line(
+    login: str,
+    user_id: str,
+    channel: str,
+    message: str,
+    sent_ts: int,
+    message_id: Optional[str] = None,
+    with_tags: bool = True,
+) -> bytes:
+    """Twitchが送るタグ付きPRIVMSGと同じ形式の1行を返す。"""
+
+    # IRCv3タグを組み立てるコメント
+    message_id = message_id or str(uuid.uuid4())
+    prefix = f":{login}!{login}@{login}.tmi.twitch.tv PRIVMSG #{channel} :{message}\r\n"
+    if not with_tags:
+        return prefix.encode("utf-8")
+    tags = (
+        "@badge-info=;badges=;client-nonce=;color=#1E90FF;"
+        f"display-name={login};emotes=;first-msg=0;flags=;id={message_id};mod=0;"
+        f"returning-chatter=0;room-id={SYNTHETIC_TARGET_USER_ID};subscriber=0;"
+        f"tmi-sent-ts={sent_ts};turbo=0;user-id={user_id};user-type="
+    )
+    return f"{tags} {prefix}".encode("utf-8")
+
+
+# 合成コーパスを生成する関数に関するコメント
+def generate_chat_corpus(
+    line_count: int,
+    target_login: str = "hikakin",
+    channel: str = "hikakin",
+    target_ratio: float = 0.001,
+    ping_ratio: float = 0.0005,
+    seed: int = 0,
+) -> List[bytes]:
+    """混雑したチャンネルを模した受信行の一覧を返す。"""
+
+    # 乱数を固定して再現性を持たせるコメント
+    rng = random.Random(seed)
+    sent_ts = 1767225600000
+    lines: List[bytes] = []
+
+    # 行の種類を確率で決めて生成するコメント
+    for _ in range(line_count):
+        sent_ts += rng.randint(1, 40)
+        roll = rng.random()
+        if roll < ping_ratio:
+            lines.append(b"PING :tmi.twitch.tv\r\n")
+            continue
+        if roll < ping_ratio + target_ratio:
+            login = target_login
+            user_id = SYNTHETIC_TARGET_USER_ID
+        else:
+            viewer = rng.randrange(SYNTHETIC_VIEWER_COUNT)
+            login = f"viewer{viewer}"
+            user_id = str(100000 + viewer)
+        message = rng.choice(SYNTHETIC_MESSAGES)
+        message_id = str(uuid.UUID(int=rng.getrandbits(128), version=4))
+        lines.append(build_privmsg_line(login, user_id, channel, message, sent_ts, message_id))
+    return lines
+
+
+# 記録済みコーパスを読み込む関数に関するコメント
+def load_chat_corpus(path: Path) -> List[bytes]:
+    """1行1メッセージで保存された生の受信行を読み込む。"""
+
+    # 改行コードを揃えて読み込むコメント
+    with path.open("rb") as file_handle:
+        return [line.rstrip(b"\r\n") + b"\r\n" for line in file_handle if line.strip()]
+
+
+# 引数に応じてコーパスを用意する関数に関するコメント
+def prepare_chat_corpus(corpus_path: Optional[str], line_count: int, seed: int = 0) -> List[bytes]:
+    """記録ファイルがあれば読み込み、なければ合成コーパスを返す。"""
+
+    # 記録ファイルを優先するコメント
+    if corpus_path:
+        return load_chat_corpus(Path(corpus_path))
+    return generate_chat_corpus(line_count, seed=seed)
@@ -0,0 +1,417 @@
+"""記録済みのチャットを再生するローカルのTwitch IRC代替サーバーと負荷計測。"""
+
+# 標準ライブラリの読み込みに関するコメント
+import argparse
+import asyncio
+import re
+import sys
+import time
+import types
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+# リポジトリ直下のmain.pyを読み込めるようにするコメント
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+from irc_corpus import prepare_chat_corpus  # noqa: E402
+
+# 遅延計測用に対象コメントへ付ける目印の書式に関するコメント
+REPLAY_MARKER_PATTERN = re.compile(r"\[replay:(\d+)\]")
+
+# イベントループの遅延を計測する間隔に関するコメント
+LOOP_LAG_PROBE_SECONDS = 0.01
+
+
+# 受信行から送信時刻のタグを取り出す関数に関するコメント
+def extract_sent_ts(raw_line: bytes) -> Optional[int]:
+    """tmi-sent-tsタグのミリ秒を返す。"""
+
+    # タグ部分だけを探すコメント
+    if not raw_line.startswith(b"@"):
+        return None
+    tags_end = raw_line.find(b" ")
+    start = raw_line.find(b"tmi-sent-ts=", 0, tags_end)
+    if start < 0:
+        return None
+    start += len(b"tmi-sent-ts=")
+    end = raw_line.find(b";", start, tags_end)
+    value = raw_line[start:tags_end if end < 0 else end]
+    return int(value) if value.isdigit() else None
+
+
+# 再生予定を組み立てる関数に関するコメント
+def build_schedule(
+    lines: List[bytes],
+    speed: float,
+    target_nicks: Set[bytes],
+) -> Tuple[List[Tuple[float, bytes, Optional[int]]], int]:
+    """送信までの秒数と行と目印番号の一覧を返す。"""
+
+    # 先頭行の送信時刻を基準にするコメント
+    schedule: List[Tuple[float, bytes, Optional[int]]] = []
+    base_ts: Optional[int] = None
+    offset = 0.0
+    marker_count = 0
+    for raw_line in lines:
+        sent_ts = extract_sent_ts(raw_line)
+        if sent_ts is not None:
+            base_ts = sent_ts if base_ts is None else base_ts
+            if speed > 0:
+                offset = (sent_ts - base_ts) / 1000.0 / speed
+
+        # 対象ユーザーの発言には遅延計測用の目印を付けるコメント
+        marker: Optional[int] = None
+        prefix_start = raw_line.find(b" ") + 1 if raw_line.startswith(b"@") else 0
+        nick_end = raw_line.find(b"!", prefix_start)
+        if b" PRIVMSG #" in raw_line and raw_line[prefix_start + 1:nick_end] in target_nicks:
+            marker = marker_count
+            marker_count += 1
+            raw_line = raw_line.rstrip(b"\r\n") + f" [replay:{marker}]\r\n".encode("utf-8")
+        schedule.append((offset, raw_line, marker))
+    return schedule, marker_count
+
+
+# 代替サーバーの状態を保持するクラスに関するコメント
+class ReplayHub:
+    """接続中のクライアントに記録済みの行を配信する。"""
+
+    # 初期化処理に関するコメント
+    def __init__(self, args: argparse.Namespace, schedule: List[Tuple[float, bytes, Optional[int]]]) -> None:
+        # 再生条件と接続中のクライアントを保持するコメント
+        self._args = args
+        self._schedule = schedule
+        self._clients: Dict[int, asyncio.StreamWriter] = {}
+        self._next_client_id = 0
+        self.joined = asyncio.Event()
+        self.finished = asyncio.Event()
+
+        # 計測値を保持するコメント
+        self.marker_sent_at: Dict[int, float] = {}
+        self.lines_sent = 0
+        self.started_at = 0.0
+        self.finished_at = 0.0
+        self.connections = 0
+        self.pong_latencies: List[float] = []
+        self._ping_sent_at: Optional[float] = None
+
+    # クライアント接続を処理するコメント
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """ログインとJOINに応答し、切断まで受信を続ける。"""
+
+        # 接続を登録するコメント
+        client_id = self._next_client_id
+        self._next_client_id += 1
+        self.connections += 1
+        try:
+            while True:
+                raw_line = await reader.readline()
+                if not raw_line:
+                    return
+                line = raw_line.decode("utf-8", errors="ignore").strip("\r\n")
+
+                # ログイン関連のコマンドに応答するコメント
+                if line.startswith("CAP REQ"):
+                    capabilities = line.split(":", 1)[1] if ":" in line else ""
+                    writer.write(f":tmi.twitch.tv CAP * ACK :{capabilities}\r\n".encode("utf-8"))
+                elif line.startswith("NICK "):
+                    nick = line[5:]
+                    writer.write(f":tmi.twitch.tv 001 {nick} :Welcome, GLHF!\r\n".encode("utf-8"))
+                elif line.startswith("JOIN "):
+                    self._clients[client_id] = writer
+                    self.joined.set()
+                elif line.startswith("PONG") and self._ping_sent_at is not None:
+                    self.pong_latencies.append(time.perf_counter() - self._ping_sent_at)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            return
+        finally:
+            self._clients.pop(client_id, None)
+            writer.close()
+
+    # 全クライアントに1行を送るコメント
+    async def broadcast(self, raw_line: bytes) -> None:
+        """接続中の全クライアントに同じ行を送る。"""
+
+        # 切断済みのクライアントは配信対象から外すコメント
+        for client_id, writer in list(self._clients.items()):
+            if writer.is_closing():
+                self._clients.pop(client_id, None)
+                continue
+            writer.write(raw_line)
+            try:
+                await writer.drain()
+            except ConnectionError:
+                self._clients.pop(client_id, None)
+
+    # 障害を注入するコメント
+    def _inject_fault(self, command: str) -> None:
+        """最も古い接続に再接続要求または切断を送る。"""
+
+        # 対象の接続を選ぶコメント
+        if not self._clients:
+            return
+        client_id = min(self._clients)
+        writer = self._clients.pop(client_id)
+
+        # 再接続要求は通知してから閉じ、切断は即座に閉じるコメント
+        if command == "reconnect":
+            writer.write(b":tmi.twitch.tv RECONNECT\r\n")
+            writer.close()
+            return
+        writer.transport.abort()
+
+    # PINGを定期的に送る処理に関するコメント
+    async def ping_loop(self) -> None:
+        """指定間隔でPINGを送りPONGまでの時間を記録する。"""
+
+        # 再生中だけ送るコメント
+        while not self.finished.is_set():
+            await asyncio.sleep(self._args.ping_interval)
+            self._ping_sent_at = time.perf_counter()
+            await self.broadcast(b"PING :tmi.twitch.tv\r\n")
+
+    # 記録済みの行を再生する処理に関するコメント
+    async def replay(self) -> None:
+        """最初のJOINを待ってから予定どおりに全行を配信する。"""
+
+        # 最初のJOINを待つコメント
+        await self.joined.wait()
+        ping_task = asyncio.create_task(self.ping_loop()) if self._args.ping_interval > 0 else None
+        self.started_at = time.perf_counter()
+
+        # 予定時刻まで待ちながら配信するコメント
+        for index, (offset, raw_line, marker) in enumerate(self._schedule, start=1):
+            delay = self.started_at + offset - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if marker is not None:
+                self.marker_sent_at[marker] = time.perf_counter()
+            await self.broadcast(raw_line)
+            self.lines_sent += 1
+
+            # 指定行数ごとに障害を注入するコメント
+            if self._args.reconnect_every and index % self._args.reconnect_every == 0:
+                self._inject_fault("reconnect")
+            if self._args.disconnect_every and index % self._args.disconnect_every == 0:
+                self._inject_fault("disconnect")
+
+        # 再生の完了を記録するコメント
+        self.finished_at = time.perf_counter()
+        self.finished.set()
+        if ping_task is not None:
+            ping_task.cancel()
+            await asyncio.gather(ping_task, return_exceptions=True)
+
+
+# 投稿キューへの追加時刻を記録する代替ポスターに関するコメント
+class RecordingPoster:
+    """enqueue_textの呼び出し時刻を目印番号ごとに記録する。"""
+
+    # 初期化処理に関するコメント
+    def __init__(self) -> None:
+        # 目印番号ごとの追加時刻と重複数を保持するコメント
+        self.enqueued_at: Dict[int, float] = {}
+        self.duplicates = 0
+
+        # 記録用のため背圧は発生させないコメント
+        self.backpressured = False
+
+    # 背圧の通知先の登録を受け付けるコメント
+    def add_backpressure_callback(self, callback: Callable[[bool], None]) -> None:
+        """記録用のため通知先は保持しない。"""
+
+    # 投稿キューへの追加を記録するコメント
+    async def enqueue_text(self, text: str, lane: str = "chat", reply_texts: Tuple[str, ...] = ()) -> None:
+        """まとめ投稿も含めて目印番号を取り出し、追加時刻を記録する。"""
+
+        # 目印のない投稿は記録しないコメント
+        enqueued_at = time.perf_counter()
+        for body in (text, *reply_texts):
+            for match in REPLAY_MARKER_PATTERN.finditer(body):
+                marker = int(match.group(1))
+                if marker in self.enqueued_at:
+                    self.duplicates += 1
+                    continue
+                self.enqueued_at[marker] = enqueued_at
+
+
+# 固定トークンを返す代替トークン管理に関するコメント
+class StubTokenManager:
+    """代替サーバー用の固定トークンを返す。"""
+
+    # アクセストークンを返すコメント
+    async def get_access_token(self) -> str:
+        """固定のアクセストークンを返す。"""
+
+        # 代替サーバーは認証しないため固定値を返すコメント
+        return "replay-token"
+
+
+# イベントループの遅延を計測する処理に関するコメント
+async def probe_loop_lag(samples: List[float], stop_event: asyncio.Event) -> None:
+    """短い待機の超過時間をループ遅延として記録する。"""
+
+    # 停止まで繰り返し計測するコメント
+    while not stop_event.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(LOOP_LAG_PROBE_SECONDS)
+        samples.append(time.perf_counter() - started - LOOP_LAG_PROBE_SECONDS)
+
+
+# パーセンタイルを計算する関数に関するコメント
+def percentile(values: List[float], ratio: float) -> float:
+    """昇順に並べた値から指定割合の位置の値を返す。"""
+
+    # 値がなければ0を返すコメント
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * ratio))]
+
+
+# 再生予定を用意する関数に関するコメント
+def prepare_schedule(args: argparse.Namespace) -> Tuple[List[Tuple[float, bytes, Optional[int]]], int]:
+    """コーパスを読み込み再生予定に変換する。"""
+
+    # 対象ユーザーの発言に目印を付けて予定を作るコメント
+    lines = prepare_chat_corpus(args.corpus, args.lines)
+    target_nicks = {user.strip().lower().encode("utf-8") for user in args.target_users.split(",")}
+    return build_schedule(lines, args.speed, target_nicks)
+
+
+# 代替サーバーとして待ち受ける処理に関するコメント
+async def run_serve(args: argparse.Namespace) -> None:
+    """Botから接続できるよう代替サーバーを起動して再生を続ける。"""
+
+    # 代替サーバーを起動するコメント
+    schedule, marker_count = prepare_schedule(args)
+    hub = ReplayHub(args, schedule)
+    server = await asyncio.start_server(hub.handle_client, args.host, args.port)
+    port = server.sockets[0].getsockname()[1]
+
+    # 接続先を案内するコメント
+    print(f"TWITCH_SERVER={args.host}")
+    print(f"TWITCH_PORT={port}")
+    print("TWITCH_USE_TLS=false")
+    print(f"replaying {len(schedule)} lines ({marker_count} target comments) at {args.speed}x")
+
+    # 再生が終わったら結果を表示するコメント
+    async with server:
+        await hub.replay()
+        elapsed = hub.finished_at - hub.started_at
+        print(f"replayed {hub.lines_sent} lines in {elapsed:.1f}s over {hub.connections} connections")
+
+
+# 同一プロセスでリスナーを起動して負荷を計測する処理に関するコメント
+async def run_load(args: argparse.Namespace) -> None:
+    """TwitchIRCListenerに再生を流し込み処理性能を計測する。"""
+
+    # Botの処理を読み込むコメント
+    import main
+
+    # 代替サーバーを起動するコメント
+    schedule, marker_count = prepare_schedule(args)
+    hub = ReplayHub(args, schedule)
+    server = await asyncio.start_server(hub.handle_client, args.host, 0)
+    port = server.sockets[0].getsockname()[1]
+
+    # リスナーを代替サーバーに向けて起動するコメント
+    target_users = tuple(user.strip().lower() for user in args.target_users.split(","))
+    settings = types.SimpleNamespace(
+        twitch_channel=args.channel,
+        twitch_chat_channels=(args.channel,),
+        twitch_target_users=target_users,
+        twitch_irc_connections=args.connections,
+        twitch_server=args.host,
+        twitch_port=port,
+        twitch_use_tls=False,
+        chat_coalesce_enabled=False,
+    )
+    poster = RecordingPoster()
+    listener = main.TwitchIRCListener(settings, poster, StubTokenManager(), "replay_bot")
+    lag_samples: List[float] = []
+    lag_stop = asyncio.Event()
+    lag_task = asyncio.create_task(probe_loop_lag(lag_samples, lag_stop))
+    listener_task = asyncio.create_task(listener.run())
+
+    # 再生を終えて残りの処理を待つコメント
+    async with server:
+        await hub.replay()
+        settle_deadline = time.perf_counter() + args.settle_seconds
+        while len(poster.enqueued_at) < marker_count and time.perf_counter() < settle_deadline:
+            await asyncio.sleep(0.05)
+        processed_at = max(poster.enqueued_at.values(), default=hub.finished_at)
+
+        # 後始末を行うコメント
+        listener.stop()
+        lag_stop.set()
+        listener_task.cancel()
+        await asyncio.gather(listener_task, lag_task, return_exceptions=True)
+
+    # 結果を表示するコメント
+    latencies = [
+        poster.enqueued_at[marker] - hub.marker_sent_at[marker]
+        for marker in poster.enqueued_at
+        if marker in hub.marker_sent_at
+    ]
+    elapsed = max(hub.finished_at, processed_at) - hub.started_at
+    print(f"lines: {hub.lines_sent} over {hub.connections} connections ({args.connections} configured)")
+    print(f"sustained: {hub.lines_sent / elapsed:,.0f} lines/sec ({elapsed:.2f}s)")
+    print(
+        "loop lag: "
+        f"p50 {percentile(lag_samples, 0.5) * 1000:.2f}ms / "
+        f"p99 {percentile(lag_samples, 0.99) * 1000:.2f}ms / "
+        f"max {max(lag_samples, default=0.0) * 1000:.2f}ms"
+    )
+    print(
+        "enqueue latency: "
+        f"p50 {percentile(latencies, 0.5) * 1000:.2f}ms / "
+        f"p99 {percentile(latencies, 0.99) * 1000:.2f}ms / "
+        f"max {max(latencies, default=0.0) * 1000:.2f}ms"
+    )
+    if hub.pong_latencies:
+        print(f"pong latency: max {max(hub.pong_latencies) * 1000:.2f}ms ({len(hub.pong_latencies)} pings)")
+    print(
+        f"target comments: {len(poster.enqueued_at)}/{marker_count} enqueued, "
+        f"{marker_count - len(poster.enqueued_at)} lost, {poster.duplicates} duplicated"
+    )
+
+
+# コマンドライン引数を解析する関数に関するコメント
+def parse_args() -> argparse.Namespace:
+    """サブコマンドと再生条件を解析する。"""
+
+    # 引数の定義に関するコメント
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("command", choices=["serve", "load"])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6667)
+    parser.add_argument("--corpus", help="1行1メッセージで記録したタグ付きの受信行ファイル")
+    parser.add_argument("--lines", type=int, default=100000)
+    parser.add_argument("--speed", type=float, default=1.0, help="実時間に対する倍率。0以下なら待たずに送る")
+    parser.add_argument("--channel", default="hikakin")
+    parser.add_argument("--target-users", default="hikakin")
+    parser.add_argument("--connections", type=int, default=1)
+    parser.add_argument("--ping-interval", type=float, default=0.0)
+    parser.add_argument("--reconnect-every", type=int, default=0, help="指定行数ごとにRECONNECTを送る")
+    parser.add_argument("--disconnect-every", type=int, default=0, help="指定行数ごとに接続を切断する")
+    parser.add_argument("--settle-seconds", type=float, default=10.0)
+    return parser.parse_args()
+
+
+# メイン処理に関するコメント
+def main() -> None:
+    """指定されたサブコマンドを実行する。"""
+
+    # サブコマンドで分岐するコメント
+    args = parse_args()
+    if args.command == "serve":
+        asyncio.run(run_serve(args))
+        return
+    asyncio.run(run_load(args))
+
+
+# エントリポイントの定義に関するコメント
+if __name__ == "__main__":
+    main()
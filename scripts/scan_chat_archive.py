@@ -0,0 +1,64 @@
+"""チャットアーカイブから指定期間の受信行を取り出す。"""
+
+# 標準ライブラリの読み込みに関するコメント
+import argparse
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+# リポジトリ直下のmain.pyを読み込めるようにするコメント
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+
+# 日時の引数をミリ秒に変換する関数に関するコメント
+def parse_time_ms(value: str) -> int:
+    """ISO 8601形式またはUNIXミリ秒の文字列をUNIXミリ秒に変換する。"""
+
+    # 数値ならそのまま使うコメント
+    if value.isdigit():
+        return int(value)
+
+    # タイムゾーンがなければUTCとして扱うコメント
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp() * 1000)
+
+
+# コマンドライン引数を解析する関数に関するコメント
+def parse_args() -> argparse.Namespace:
+    """保存先と期間の指定を解析する。"""
+
+    # 引数の定義に関するコメント
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("archive_dir")
+    parser.add_argument("--start", required=True, help="ISO 8601形式またはUNIXミリ秒")
+    parser.add_argument("--end", required=True, help="ISO 8601形式またはUNIXミリ秒")
+    parser.add_argument("--raw", action="store_true", help="受信時刻を付けずに受信行だけを出力する")
+    return parser.parse_args()
+
+
+# メイン処理に関するコメント
+def main() -> None:
+    """期間内の受信行を標準出力に書き出す。"""
+
+    # Botの処理を読み込むコメント
+    import main as bot
+
+    # 期間内の行を順に出力するコメント
+    args = parse_args()
+    output = sys.stdout.buffer
+    for received_ms, raw_line in bot.scan_chat_archive(
+        Path(args.archive_dir),
+        parse_time_ms(args.start),
+        parse_time_ms(args.end),
+    ):
+        if not args.raw:
+            output.write(b"%d " % received_ms)
+        output.write(raw_line + b"\n")
+
+
+# エントリポイントの定義に関するコメント
+if __name__ == "__main__":
+    main()
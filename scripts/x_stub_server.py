@@ -0,0 +1,498 @@
+"""X APIの投稿とメディアアップロードを模したローカルの代替サーバー。"""
+
+# 標準ライブラリの読み込みに関するコメント
+import argparse
+import asyncio
+import json
+import random
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+from email.parser import BytesParser
+from email.policy import default as default_policy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+# リポジトリ直下のmain.pyを読み込めるようにするコメント
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+# 代替サーバーが受け付ける認証情報を定義するコメント
+STUB_CONSUMER_KEY = "stub-consumer-key"
+STUB_CONSUMER_SECRET = "stub-consumer-secret"
+STUB_ACCESS_TOKEN = "stub-access-token"
+STUB_ACCESS_SECRET = "stub-access-secret"
+
+# 15分枠と24時間枠の既定の投稿上限を定義するコメント
+STUB_WINDOW_LIMIT = 50
+STUB_DAILY_LIMIT = 100
+
+
+# Authorizationヘッダーを解析する関数に関するコメント
+def parse_oauth_header(value: str) -> Dict[str, str]:
+    """OAuthのAuthorizationヘッダーを項目ごとの辞書にする。"""
+
+    # 接頭辞を外して項目に分けるコメント
+    if not value.startswith("OAuth "):
+        return {}
+    params = {}
+    for item in value[len("OAuth ") :].split(","):
+        key, _, quoted = item.strip().partition("=")
+        params[urllib.parse.unquote(key)] = urllib.parse.unquote(quoted.strip('"'))
+    return params
+
+
+# X APIの代替ハンドラーに関するコメント
+class StubXHandler(BaseHTTPRequestHandler):
+    """署名を検証したうえで投稿とメディアアップロードに応答する。"""
+
+    # サーバー全体で共有する状態を保持するコメント
+    lock = threading.Lock()
+    window_limit = STUB_WINDOW_LIMIT
+    window_remaining = STUB_WINDOW_LIMIT
+    window_reset_at = 0
+    daily_remaining = STUB_DAILY_LIMIT
+    tweets: List[dict] = []
+    media_sessions: Dict[str, dict] = {}
+    uploaded_media: Dict[str, int] = {}
+    rejected_signatures = 0
+    next_media_id = 1000
+    upload_delay_seconds = 0.0
+    failure_rate = 0.0
+
+    # メディアIDを払い出すコメント
+    @classmethod
+    def issue_media_id(cls) -> str:
+        """重複しないメディアIDを文字列で返す。"""
+
+        # 連番で払い出すコメント
+        cls.next_media_id += 1
+        return str(cls.next_media_id)
+
+    # POSTを受け付けるコメント
+    def do_POST(self) -> None:  # noqa: N802
+        """投稿作成とメディアアップロードに振り分ける。"""
+
+        # 本文を読み込んで署名を検証するコメント
+        length = int(self.headers.get("Content-Length", "0"))
+        body = self.rfile.read(length)
+        path = urllib.parse.urlsplit(self.path).path
+        if not self._verify_signature(body):
+            return
+        if path == "/2/tweets":
+            self._handle_create_tweet(body)
+            return
+        if path == "/1.1/media/upload.json":
+            time.sleep(StubXHandler.upload_delay_seconds)
+            self._handle_upload(body)
+            return
+        self._send_json(404, {"title": "Not Found"})
+
+    # GETを受け付けるコメント
+    def do_GET(self) -> None:  # noqa: N802
+        """メディアの処理状況の確認に応答する。"""
+
+        # 分割アップロードのSTATUSだけを受け付けるコメント
+        if not self._verify_signature(b""):
+            return
+        query = dict(urllib.parse.parse_qsl(urllib.parse.urlsplit(self.path).query))
+        if query.get("command") != "STATUS" or query.get("media_id") not in StubXHandler.uploaded_media:
+            self._send_json(404, {"title": "Not Found"})
+            return
+        self._send_json(200, {"media_id_string": query["media_id"], "processing_info": {"state": "succeeded"}})
+
+    # 投稿作成の処理に関するコメント
+    def _handle_create_tweet(self, body: bytes) -> None:
+        """上限内なら投稿を記録し、上限超過なら429で応答する。"""
+
+        # 枠を更新してから残数を確認するコメント
+        payload = json.loads(body or b"{}")
+        with StubXHandler.lock:
+            now = int(time.time())
+            if now >= StubXHandler.window_reset_at:
+                StubXHandler.window_reset_at = now + 900
+                StubXHandler.window_remaining = StubXHandler.window_limit
+            if StubXHandler.window_remaining <= 0 or StubXHandler.daily_remaining <= 0:
+                self._send_json(429, {"title": "Too Many Requests"}, self._limit_headers())
+                return
+
+            # 一時的な障害を指定した割合で再現するコメント
+            if random.random() < StubXHandler.failure_rate:
+                self._send_json(503, {"title": "Service Unavailable"})
+                return
+
+            # 同じ本文の投稿は本番と同じ403で拒否するコメント
+            if any(tweet.get("text") == payload.get("text") for tweet in StubXHandler.tweets):
+                self._send_json(
+                    403,
+                    {
+                        "title": "Forbidden",
+                        "detail": "You are not allowed to create a Tweet with duplicate content.",
+                    },
+                )
+                return
+
+            # 添付メディアが実在するか確認するコメント
+            media_ids = payload.get("media", {}).get("media_ids", [])
+            if any(media_id not in StubXHandler.uploaded_media for media_id in media_ids):
+                self._send_json(400, {"title": "Invalid Request", "detail": "unknown media id"})
+                return
+
+            # 投稿を記録して残数を減らすコメント
+            StubXHandler.window_remaining -= 1
+            StubXHandler.daily_remaining -= 1
+            tweet_id = str(len(StubXHandler.tweets) + 1)
+            StubXHandler.tweets.append({"id": tweet_id, **payload})
+            headers = self._limit_headers()
+        self._send_json(201, {"data": {"id": tweet_id, "text": payload.get("text", "")}}, headers)
+
+    # メディアアップロードの処理に関するコメント
+    def _handle_upload(self, body: bytes) -> None:
+        """一括アップロードと分割アップロードの各段階に応答する。"""
+
+        # フォームとマルチパートの両方から値を取り出すコメント
+        fields, media = self._parse_upload_body(body)
+        command = fields.get("command")
+        with StubXHandler.lock:
+            # 一括アップロードに応答するコメント
+            if command is None:
+                if media is None:
+                    self._send_json(400, {"error": "media is required"})
+                    return
+                media_id = StubXHandler.issue_media_id()
+                StubXHandler.uploaded_media[media_id] = len(media)
+                self._send_json(200, {"media_id": int(media_id), "media_id_string": media_id, "size": len(media)})
+                return
+
+            # 分割アップロードの開始に応答するコメント
+            if command == "INIT":
+                media_id = StubXHandler.issue_media_id()
+                StubXHandler.media_sessions[media_id] = {
+                    "total_bytes": int(fields.get("total_bytes", "0")),
+                    "segments": {},
+                }
+                self._send_json(
+                    202,
+                    {"media_id": int(media_id), "media_id_string": media_id, "expires_after_secs": 86400},
+                )
+                return
+
+            # 分割データの受信に応答するコメント
+            session = StubXHandler.media_sessions.get(fields.get("media_id", ""))
+            if session is None:
+                self._send_json(400, {"error": "unknown media id"})
+                return
+            if command == "APPEND" and media is not None:
+                session["segments"][int(fields.get("segment_index", "0"))] = len(media)
+                self._send_empty(204)
+                return
+
+            # 連続した分割データが揃っていれば完了にするコメント
+            if command == "FINALIZE":
+                segments = session["segments"]
+                received = sum(segments.values())
+                if sorted(segments) != list(range(len(segments))) or received != session["total_bytes"]:
+                    self._send_json(400, {"error": "segments are incomplete"})
+                    return
+                media_id = fields["media_id"]
+                del StubXHandler.media_sessions[media_id]
+                StubXHandler.uploaded_media[media_id] = received
+                self._send_json(200, {"media_id": int(media_id), "media_id_string": media_id, "size": received})
+                return
+        self._send_json(400, {"error": "unsupported command"})
+
+    # アップロードの本文を解析するコメント
+    def _parse_upload_body(self, body: bytes) -> Tuple[Dict[str, str], Optional[bytes]]:
+        """フォームの値とメディアのバイト列を取り出す。"""
+
+        # URLエンコードのフォームならそのまま解析するコメント
+        content_type = self.headers.get("Content-Type", "")
+        if content_type.startswith("application/x-www-form-urlencoded"):
+            return dict(urllib.parse.parse_qsl(body.decode("utf-8"))), None
+
+        # マルチパートは部分ごとに取り出すコメント
+        message = BytesParser(policy=default_policy).parsebytes(
+            f"Content-Type: {content_type}\r\n\r\n".encode("utf-8") + body
+        )
+        fields: Dict[str, str] = {}
+        media: Optional[bytes] = None
+        for part in message.iter_parts():
+            name = part.get_param("name", header="content-disposition")
+            payload = part.get_payload(decode=True) or b""
+            if name == "media":
+                media = payload
+            elif name:
+                fields[name] = payload.decode("utf-8")
+        return fields, media
+
+    # 署名を検証するコメント
+    def _verify_signature(self, body: bytes) -> bool:
+        """クエリとURLエンコードのフォームを含めて署名を計算し直して照合する。"""
+
+        # Botの署名処理を読み込むコメント
+        import main
+
+        # 署名対象の値を集めるコメント
+        oauth_params = parse_oauth_header(self.headers.get("Authorization", ""))
+        signature = oauth_params.pop("oauth_signature", "")
+        split_url = urllib.parse.urlsplit(self.path)
+        params = dict(urllib.parse.parse_qsl(split_url.query))
+        if self.headers.get("Content-Type", "").startswith("application/x-www-form-urlencoded"):
+            params.update(urllib.parse.parse_qsl(body.decode("utf-8")))
+        params.update(oauth_params)
+
+        # 計算し直した署名と比べるコメント
+        expected = main.build_oauth1_signature(
+            self.command,
+            f"http://{self.headers.get('Host')}{split_url.path}",
+            params,
+            STUB_CONSUMER_SECRET,
+            STUB_ACCESS_SECRET,
+        )
+        if (
+            oauth_params.get("oauth_consumer_key") != STUB_CONSUMER_KEY
+            or oauth_params.get("oauth_token") != STUB_ACCESS_TOKEN
+            or signature != expected
+        ):
+            with StubXHandler.lock:
+                StubXHandler.rejected_signatures += 1
+            self._send_json(401, {"title": "Unauthorized", "detail": "invalid signature"})
+            return False
+        return True
+
+    # 上限のヘッダーを作るコメント
+    def _limit_headers(self) -> Dict[str, str]:
+        """15分枠と24時間枠の残数ヘッダーを返す。"""
+
+        # X APIと同じ名前で返すコメント
+        return {
+            "x-rate-limit-limit": str(StubXHandler.window_limit),
+            "x-rate-limit-remaining": str(max(0, StubXHandler.window_remaining)),
+            "x-rate-limit-reset": str(StubXHandler.window_reset_at),
+            "x-user-limit-24hour-limit": str(STUB_DAILY_LIMIT),
+            "x-user-limit-24hour-remaining": str(max(0, StubXHandler.daily_remaining)),
+            "x-user-limit-24hour-reset": str(int(time.time()) + 86400),
+        }
+
+    # JSON応答を送るコメント
+    def _send_json(self, status: int, payload: dict, headers: Optional[Dict[str, str]] = None) -> None:
+        """JSONを指定ステータスとヘッダーで返す。"""
+
+        # 本文を組み立てて送信するコメント
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    # 本文のない応答を送るコメント
+    def _send_empty(self, status: int) -> None:
+        """本文なしで指定ステータスを返す。"""
+
+        # ヘッダーだけ送るコメント
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    # アクセスログを抑制するコメント
+    def log_message(self, format: str, *args: object) -> None:  # noqa: A002
+        """標準エラーへのアクセスログを出さない。"""
+
+
+# 代替サーバーを別スレッドで起動する関数に関するコメント
+def start_x_stub(
+    host: str,
+    port: int,
+    window_limit: int,
+    upload_delay_seconds: float = 0.0,
+    failure_rate: float = 0.0,
+) -> ThreadingHTTPServer:
+    """X APIの代替サーバーを起動して返す。"""
+
+    # 15分枠の上限とアップロードの遅延と障害の割合を設定してデーモンスレッドで待ち受けるコメント
+    StubXHandler.upload_delay_seconds = upload_delay_seconds
+    StubXHandler.failure_rate = failure_rate
+    StubXHandler.window_limit = window_limit
+    StubXHandler.window_remaining = window_limit
+    server = ThreadingHTTPServer((host, port), StubXHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+# 代替サーバーとして待ち受ける処理に関するコメント
+def run_serve(args: argparse.Namespace) -> None:
+    """Botから接続できるよう代替サーバーを起動し続ける。"""
+
+    # 起動して接続先と認証情報を案内するコメント
+    server = start_x_stub(args.host, args.port, args.window_limit, args.upload_delay, args.fail_rate)
+    base_url = f"http://{args.host}:{server.server_address[1]}"
+    print(f"X_API_BASE_URL={base_url}")
+    print(f"X_UPLOAD_BASE_URL={base_url}")
+    print(f"X_API_KEY={STUB_CONSUMER_KEY}")
+    print(f"X_API_SECRET={STUB_CONSUMER_SECRET}")
+    print(f"X_ACCESS_TOKEN={STUB_ACCESS_TOKEN}")
+    print(f"X_ACCESS_SECRET={STUB_ACCESS_SECRET}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+# 代替サーバーに対してXクライアントを検証する処理に関するコメント
+async def run_check(args: argparse.Namespace) -> int:
+    """AsyncXClientの投稿、返信、アップロード、上限超過の扱いを確認する。"""
+
+    # Botの依存ライブラリを読み込むコメント
+    import httpx
+
+    import main
+
+    # 空きポートで代替サーバーを起動するコメント
+    server = start_x_stub(args.host, 0, args.window_limit)
+    base_url = f"http://{args.host}:{server.server_address[1]}"
+    failures: List[str] = []
+
+    # 検証結果を記録する関数に関するコメント
+    def expect(condition: bool, label: str) -> None:
+        print(f"{'OK' if condition else 'NG'}: {label}")
+        if not condition:
+            failures.append(label)
+
+    async with httpx.AsyncClient() as http_client:
+        client = main.AsyncXClient(
+            http_client,
+            STUB_CONSUMER_KEY,
+            STUB_CONSUMER_SECRET,
+            STUB_ACCESS_TOKEN,
+            STUB_ACCESS_SECRET,
+            api_base_url=base_url,
+            upload_base_url=base_url,
+        )
+
+        # テキスト投稿と返信を確認するコメント
+        first = await client.create_tweet("stub post", reply_settings="following")
+        reply = await client.create_tweet("stub reply", in_reply_to_tweet_id=first.tweet_id)
+        expect(first.headers.get("x-rate-limit-remaining") is not None, "投稿の応答ヘッダーに残数が含まれる")
+        expect(
+            StubXHandler.tweets[-1].get("reply") == {"in_reply_to_tweet_id": first.tweet_id}
+            and reply.tweet_id != first.tweet_id,
+            "返信が直前の投稿に繋がる",
+        )
+        expect(StubXHandler.tweets[0].get("reply_settings") == "following", "返信設定が送られる")
+
+        # 重複投稿と一時的な障害の分類を確認するコメント
+        duplicate: Optional[main.XAPIError] = None
+        try:
+            await client.create_tweet("stub post")
+        except main.XAPIError as exc:
+            duplicate = exc
+        expect(
+            duplicate is not None and main.classify_x_error(duplicate) == main.X_ERROR_DUPLICATE,
+            "同じ本文の投稿が重複として分類される",
+        )
+        StubXHandler.failure_rate = 1.0
+        unavailable: Optional[main.XAPIError] = None
+        try:
+            await client.create_tweet("stub unavailable")
+        except main.XAPIError as exc:
+            unavailable = exc
+        StubXHandler.failure_rate = 0.0
+        expect(
+            unavailable is not None and main.classify_x_error(unavailable) == main.X_ERROR_RETRYABLE,
+            "503が再試行可能として分類される",
+        )
+
+        # 一括と分割のアップロードを確認するコメント
+        with tempfile.TemporaryDirectory() as temp_dir:
+            small_path = Path(temp_dir) / "graph.png"
+            small_path.write_bytes(b"\x89PNG\r\n\x1a\n" + b"0" * 2048)
+            large_path = Path(temp_dir) / "large.png"
+            large_path.write_bytes(b"\x89PNG\r\n\x1a\n" + b"1" * (main.X_MEDIA_CHUNK_BYTES * 2 + 512))
+            small_id = (await client.upload_media(str(small_path))).media_id
+            large_id = (await client.upload_media(str(large_path))).media_id
+        expect(StubXHandler.uploaded_media.get(small_id) == 2056, "一括アップロードでメディアIDが返る")
+        expect(
+            StubXHandler.uploaded_media.get(large_id) == main.X_MEDIA_CHUNK_BYTES * 2 + 520,
+            "分割アップロードで全てのデータが揃う",
+        )
+        await client.create_tweet("stub media", media_ids=[small_id, large_id])
+        expect(StubXHandler.tweets[-1].get("media") == {"media_ids": [small_id, large_id]}, "メディア付きで投稿できる")
+
+        # 上限超過が応答ヘッダー付きの例外になるか確認するコメント
+        rate_limited: Optional[main.XAPIError] = None
+        try:
+            for index in range(args.window_limit + 1):
+                await client.create_tweet(f"stub flood {index}")
+        except main.XAPIError as exc:
+            rate_limited = exc
+        expect(
+            rate_limited is not None
+            and rate_limited.status_code == 429
+            and rate_limited.headers.get("x-rate-limit-reset") is not None,
+            "上限超過が429と更新時刻付きで送出される",
+        )
+
+        # 誤った鍵の署名が拒否されるか確認するコメント
+        wrong_client = main.AsyncXClient(
+            http_client,
+            STUB_CONSUMER_KEY,
+            "wrong-secret",
+            STUB_ACCESS_TOKEN,
+            STUB_ACCESS_SECRET,
+            api_base_url=base_url,
+            upload_base_url=base_url,
+        )
+        rejected: Optional[main.XAPIError] = None
+        try:
+            await wrong_client.create_tweet("stub wrong signature")
+        except main.XAPIError as exc:
+            rejected = exc
+        expect(
+            rejected is not None and main.classify_x_error(rejected) == main.X_ERROR_AUTH,
+            "誤った署名は401になり認証エラーとして分類される",
+        )
+        expect(StubXHandler.rejected_signatures == 1, "正しい署名は全て受理される")
+
+    # 結果を表示するコメント
+    server.shutdown()
+    print(f"tweets: {len(StubXHandler.tweets)} / media: {len(StubXHandler.uploaded_media)}")
+    return 1 if failures else 0
+
+
+# コマンドライン引数を解析する関数に関するコメント
+def parse_args() -> argparse.Namespace:
+    """サブコマンドと接続設定を解析する。"""
+
+    # 引数の定義に関するコメント
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("command", choices=["serve", "check"])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8082)
+    parser.add_argument("--window-limit", type=int, default=STUB_WINDOW_LIMIT)
+    parser.add_argument("--upload-delay", type=float, default=0.0, help="アップロード1回ごとに遅らせる秒数")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="投稿を503で失敗させる割合 (0.0から1.0)")
+    return parser.parse_args()
+
+
+# メイン処理に関するコメント
+def main() -> None:
+    """指定されたサブコマンドを実行する。"""
+
+    # サブコマンドで分岐するコメント
+    args = parse_args()
+    if args.command == "serve":
+        run_serve(args)
+        return
+    raise SystemExit(asyncio.run(run_check(args)))
+
+
+# エントリポイントの定義に関するコメント
+if __name__ == "__main__":
+    main()